@@ -9,7 +9,20 @@ from .wrap_optimizers import (
     NeorlWrapper,
     NEORL_getbounds,
     create_NEORL_funwrap,
-
+    run_es_batched,
+    EvalCache,
+    EvalHistory,
+    MultiObjectiveWrapper,
 )
 
-from .discretization_error import est_discretization_err
\ No newline at end of file
+from .pool import CasePool, init_ray
+
+from .discretization_error import est_discretization_err, adaptive_grid_refinement
+from .bayes_opt import run_bayesian_optimization, GaussianProcess
+
+from .pareto import pareto_mask, pareto_front_nd, nondominated_sort, pareto_front_chunked, crowding_distance
+from .nsga import run_nsga2
+from .mlmc import estimate_unc_mlmc
+from .results_io import load_results, write_results, input_dtypes, ResultArrays, open_result_arrays
+from .results_store import ResultsStore
+from .parameter_space import ParameterSpace
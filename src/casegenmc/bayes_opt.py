@@ -0,0 +1,248 @@
+import numpy as np
+import pandas as pd
+from scipy.linalg import cho_factor, cho_solve
+from scipy.optimize import minimize
+from scipy.stats import norm
+
+from casegenmc.core import run_cases
+from casegenmc.wrap_optimizers import ScipyWrapper, FailSafeModel, get_scipy_bounds
+
+
+class GaussianProcess:
+    """
+    Gaussian-process regressor with an ARD Matern 5/2 kernel, written with NumPy/SciPy only.
+
+    Targets are standardized internally. Hyperparameters (length scales, signal variance, noise)
+    are fit by maximizing the log marginal likelihood.
+    """
+
+    def __init__(self, n_restarts=3, rng=None):
+        self.n_restarts = n_restarts
+        self.rng = np.random.default_rng(rng)
+        self.theta = None
+
+    @staticmethod
+    def kernel(A, B, theta):
+        d = A.shape[1]
+        ls, s2 = np.exp(theta[:d]), np.exp(theta[d])
+        diff = (A[:, None, :] - B[None, :, :]) / ls
+        r = np.sqrt(np.sum(diff ** 2, axis=-1))
+        sr = np.sqrt(5.0) * r
+        return s2 * (1.0 + sr + sr ** 2 / 3.0) * np.exp(-sr)
+
+    def neg_log_likelihood(self, theta, X, y):
+        noise = np.exp(theta[-1])
+        K = self.kernel(X, X, theta) + (noise + 1e-10) * np.eye(len(X))
+        try:
+            L = cho_factor(K, lower=True)
+        except np.linalg.LinAlgError:
+            return 1e25
+        alpha = cho_solve(L, y)
+        return 0.5 * y @ alpha + np.sum(np.log(np.diag(L[0]))) + 0.5 * len(X) * np.log(2 * np.pi)
+
+    def fit(self, X, y):
+        X = np.asarray(X, dtype=float)
+        y = np.asarray(y, dtype=float)
+        self.y_mean = y.mean()
+        self.y_std = y.std() if y.std() > 0 else 1.0
+        ys = (y - self.y_mean) / self.y_std
+
+        d = X.shape[1]
+        bounds = [(np.log(1e-2), np.log(1e2))] * d + [(np.log(1e-2), np.log(1e2)), (np.log(1e-8), np.log(1.0))]
+        starts = [np.r_[np.zeros(d), 0.0, np.log(1e-4)]]
+        if self.theta is not None:
+            starts.append(self.theta)
+        for _ in range(self.n_restarts):
+            starts.append(np.array([self.rng.uniform(lo, hi) for lo, hi in bounds]))
+
+        best = None
+        for theta0 in starts:
+            res = minimize(self.neg_log_likelihood, theta0, args=(X, ys), method="L-BFGS-B", bounds=bounds)
+            if best is None or res.fun < best.fun:
+                best = res
+        self.theta = best.x
+        self.condition(X, y)
+        return self
+
+    def condition(self, X, y):
+        """Conditions on (X, y) with the current hyperparameters, without refitting them."""
+        self.X = np.asarray(X, dtype=float)
+        ys = (np.asarray(y, dtype=float) - self.y_mean) / self.y_std
+        K = self.kernel(self.X, self.X, self.theta) + (np.exp(self.theta[-1]) + 1e-10) * np.eye(len(self.X))
+        self.L = cho_factor(K, lower=True)
+        self.alpha = cho_solve(self.L, ys)
+        return self
+
+    def predict(self, Xs):
+        Xs = np.asarray(Xs, dtype=float)
+        Ks = self.kernel(Xs, self.X, self.theta)
+        mean = Ks @ self.alpha
+        v = cho_solve(self.L, Ks.T)
+        var = np.exp(self.theta[self.X.shape[1]]) - np.sum(Ks * v.T, axis=1)
+        std = np.sqrt(np.maximum(var, 1e-12))
+        return mean * self.y_std + self.y_mean, std * self.y_std
+
+
+def expected_improvement(mean, std, y_best, xi=0.01):
+    """Expected improvement below y_best (minimization)."""
+    imp = y_best - mean - xi
+    z = imp / std
+    return imp * norm.cdf(z) + std * norm.pdf(z)
+
+
+class MixedSpace:
+    """
+    Maps optimizer vectors (the get_scipy_bounds layout: continuous values and option indices)
+    to GP features: continuous coordinates scaled to [0, 1], categoricals one-hot encoded.
+    """
+
+    def __init__(self, bounds, cat_map):
+        self.bounds = np.asarray(bounds, dtype=float)
+        self.cat_map = cat_map
+        self.d = len(bounds)
+        self.cont = [i for i in range(self.d) if i not in cat_map]
+
+    def random(self, n, rng):
+        """Latin hypercube sample of n optimizer vectors, shape (n, d)."""
+        u = (rng.permuted(np.tile(np.arange(n), (self.d, 1)), axis=1).T + rng.random((n, self.d))) / n
+        X = self.bounds[:, 0] + u * (self.bounds[:, 1] - self.bounds[:, 0])
+        return self.snap(X)
+
+    def perturb(self, X, n, rng, scale=0.05, p_flip=0.2):
+        """n local perturbations around the rows of X."""
+        X = X[rng.integers(0, len(X), n)].copy()
+        width = self.bounds[:, 1] - self.bounds[:, 0]
+        X[:, self.cont] += rng.normal(0, scale, (n, len(self.cont))) * width[self.cont]
+        for i, options in self.cat_map.items():
+            flip = rng.random(n) < p_flip
+            X[flip, i] = rng.integers(0, len(options), flip.sum())
+        return self.snap(np.clip(X, self.bounds[:, 0], self.bounds[:, 1]))
+
+    def snap(self, X):
+        for i, options in self.cat_map.items():
+            X[:, i] = np.clip(np.rint(X[:, i]), 0, len(options) - 1)
+        return X
+
+    def features(self, X):
+        X = np.atleast_2d(X)
+        width = self.bounds[:, 1] - self.bounds[:, 0]
+        width = np.where(width > 0, width, 1.0)
+        cols = []
+        for i in range(self.d):
+            if i in self.cat_map:
+                cols.append(np.eye(len(self.cat_map[i]))[X[:, i].astype(int)])
+            else:
+                cols.append(((X[:, i] - self.bounds[i, 0]) / width[i])[:, None])
+        return np.hstack(cols)
+
+
+def run_bayesian_optimization(model, variable_inputs, value_key, fixed_inputs=None, mode="minimize", n_init=None,
+                              n_iter=20, q=4, n_candidates=2000, xi=0.01, parallel=False, num_cpus=None,
+                              pool=None, vectorized=False, seed=None, verbose=True):
+    """
+    Sample-efficient optimization for expensive models with a Gaussian-process surrogate.
+
+    Bounds and options come from variable_inputs the same way get_scipy_bounds reads them, so mixed
+    continuous and categorical inputs are supported. Each iteration fits the GP and proposes a batch
+    of q points by expected improvement with the kriging-believer heuristic. The batch is evaluated
+    in one run_cases call, so the parallel backends (Ray, a CasePool, or a vectorized model) stay busy.
+
+    Parameters
+    ----------
+    model : function
+        The model function to evaluate.
+    variable_inputs : dict
+        Input stack entries of the parameters to optimize.
+    value_key : str
+        Output key to optimize.
+    fixed_inputs : dict, optional
+        Constant parameters.
+    mode : str, optional
+        'minimize' (default) or 'maximize'.
+    n_init : int, optional
+        Size of the initial Latin hypercube design. Defaults to max(2 * n_params, q).
+    n_iter : int, optional
+        Number of batches after the initial design.
+    q : int, optional
+        Points per batch.
+    n_candidates : int, optional
+        Number of random and local candidates scored by the acquisition function per batch point.
+    xi : float, optional
+        Exploration margin of expected improvement.
+    parallel, num_cpus, pool, vectorized :
+        run_cases settings for evaluating each batch.
+    seed : int, optional
+        Random seed.
+
+    Returns
+    -------
+    dict with "x_best" (best case dict), "y_best" (its value_key) and "out" (DataFrame of every
+    evaluated case in run_cases layout, with a "bo_iteration" column).
+    """
+    rng = np.random.default_rng(seed)
+    fixed_inputs = fixed_inputs if fixed_inputs is not None else {}
+    bounds, cat_map = get_scipy_bounds(variable_inputs)
+    space = MixedSpace(bounds, cat_map)
+    decoder = ScipyWrapper(model, value_key, list(variable_inputs), fixed_inputs, cat_map=cat_map, mode=mode)
+    sign = decoder.sign
+
+    if n_init is None:
+        n_init = max(2 * space.d, q)
+
+    X_all, y_all, history = [], [], []
+
+    def evaluate(X, iteration):
+        cases = decoder.decode_population(X.T)
+        out = run_cases(cases, model if vectorized else FailSafeModel(model), parallel=parallel,
+                        num_cpus=num_cpus, pool=pool, vectorized=vectorized, verbose=False)["out"]
+        out["bo_iteration"] = iteration
+        history.append(out)
+        if value_key in out.columns:
+            y = pd.to_numeric(out[value_key], errors="coerce").to_numpy(dtype=float) * sign
+        else:
+            y = np.full(len(out), np.nan)
+        X_all.extend(X)
+        y_all.extend(y)
+
+    evaluate(space.random(n_init, rng), 0)
+
+    gp = GaussianProcess(rng=rng)
+    for it in range(1, n_iter + 1):
+        X = np.asarray(X_all)
+        y = np.asarray(y_all)
+        ok = ~np.isnan(y)
+        if ok.sum() < 2:
+            evaluate(space.random(q, rng), it)
+            continue
+
+        # Failed cases get the worst observed value, so the search moves away from them
+        y_fit = np.where(ok, y, np.nanmax(y))
+        F = space.features(X)
+        gp.fit(F, y_fit)
+        y_best = y_fit.min()
+
+        batch = []
+        F_cond, y_cond = F, y_fit
+        for _ in range(q):
+            cands = np.vstack([space.random(n_candidates // 2, rng),
+                               space.perturb(X[np.argsort(y_fit)[:5]], n_candidates // 2, rng)])
+            mean, std = gp.predict(space.features(cands))
+            ei = expected_improvement(mean, std, y_best, xi=xi)
+            pick = cands[np.argmax(ei)]
+            batch.append(pick)
+
+            # Kriging believer: pretend the GP mean was observed and condition on it
+            f_pick = space.features(pick)
+            F_cond = np.vstack([F_cond, f_pick])
+            y_cond = np.append(y_cond, gp.predict(f_pick)[0])
+            gp.condition(F_cond, y_cond)
+
+        evaluate(np.asarray(batch), it)
+        if verbose:
+            print(f"BO iteration {it}: best {value_key} = {np.nanmin(y_all) * sign}")
+
+    out = pd.concat(history, ignore_index=True)
+    y = np.asarray(y_all)
+    i_best = int(np.nanargmin(y))
+    x_best = decoder.decode(X_all[i_best])
+    return {"x_best": x_best, "y_best": y[i_best] * sign, "out": out}
@@ -1,4 +1,5 @@
 import copy
+import tempfile
 
 import numpy as np
 import pandas as pd
@@ -7,6 +8,12 @@ from os.path import join as pjoin
 from scipy.stats import uniform, norm, lognorm
 from tqdm import tqdm
 from casegenmc.plotting_base import *
+from casegenmc.plot_render import PlotRenderer, get_plot_renderer, wait_for_plots
+from casegenmc.plot_cache import PlotCache, get_plot_cache
+from casegenmc.results_store import ResultsStore, case_key
+from casegenmc.results_io import load_results, ResultArrays
+from casegenmc.parameter_space import ParameterSpace
+from casegenmc.pool import init_ray
 import itertools
 import casegenmc.tex_plots as tex_plots
 
@@ -23,13 +30,19 @@ except ImportError:
 
 def init_casegenmc( setup_tex=False, texfonts=True, fontsize=8, figsize=(6, 6)
 ):
+    """
+    Sets up the plotting style.
 
+    :param setup_tex: True for LaTeX-rendered Computer Modern text, "mathtext" for the same look drawn
+        by matplotlib without LaTeX (much faster for large plot sets), False for matplotlib defaults.
+    """
 
     tex_plots.TEX_PLOTS = setup_tex
 
     if setup_tex:
         try:
-            tex_plots.setup_tex_plots(texfonts=texfonts, fontsize=fontsize, figsize=figsize)
+            tex_plots.setup_tex_plots(texfonts=texfonts, fontsize=fontsize, figsize=figsize,
+                                      usetex=setup_tex != "mathtext")
         except:
             print("tex fonts not found, skipping")
 
@@ -213,125 +226,490 @@ def worker_task(index, case, model):
     return index, model(case)
 
 
-def run_cases(inputs, model, output_stats=False, parallel=False, num_cpus=None, batch_size=None):
+class ColumnBuffer:
     """
-    Robust run_cases that works even if Ray is not installed.
+    Accumulates per-case result dicts into one list per output key, indexed by case.
+
+    Cases may arrive in any order (e.g. from Ray). Keys missing from a case are left as NaN.
+    """
+
+    def __init__(self, n_cases):
+        self.n_cases = n_cases
+        self.columns = {}
+
+    def add(self, index, res):
+        for k, v in res.items():
+            col = self.columns.get(k)
+            if col is None:
+                col = self.columns[k] = [np.nan] * self.n_cases
+            col[index] = v
+
+    def add_block(self, indices, columns):
+        """Adds a dict of output columns whose rows belong to the cases in `indices`."""
+        for k, vals in columns.items():
+            col = self.columns.get(k)
+            if col is None:
+                col = self.columns[k] = [np.nan] * self.n_cases
+            for i, v in zip(indices, vals):
+                col[i] = v
+
+
+def join_outputs(inputs_df, outputs):
+    """
+    Joins a dict of output columns onto the input DataFrame. Outputs that share a name with an
+    input replace it in place, as the model result takes precedence.
+    """
+    df = inputs_df.reset_index(drop=True)
+    new_cols = {k: v for k, v in outputs.items() if k not in df.columns}
+    df = pd.concat([df, pd.DataFrame(new_cols, index=df.index)], axis=1)
+    for k, v in outputs.items():
+        if k not in new_cols:
+            df[k] = v
+    return df
+
+
+def unique_output_file(data_out_dir, prefix="outputs", suffix=".csv"):
+    """
+    Creates an empty, uniquely named output file and returns its path. The name keeps the
+    timestamp for readability, and the file is created atomically so concurrent runs never collide.
     """
-    data_out_dir = "./data"
     if not os.path.exists(data_out_dir):
-        os.makedirs(data_out_dir)
+        os.makedirs(data_out_dir, exist_ok=True)
 
     timestamp = time.strftime("%Y%m%d-%H%M%S")
-    output_file = pjoin(data_out_dir, f"outputs_{timestamp}.csv")
+    fd, output_file = tempfile.mkstemp(prefix=f"{prefix}_{timestamp}_", suffix=suffix, dir=data_out_dir)
+    os.close(fd)
+    return output_file
+
+
+def iter_case_batches(cases_list, model, parallel=False, num_cpus=None, batch_size=None, verbose=True, pool=None,
+                      ray_address=None, ray_options=None, max_in_flight=None):
+    """
+    Evaluates the cases and yields batches of (index, result_dict) tuples as they finish.
+    Uses a persistent CasePool if given (its model is used), otherwise Ray when parallel=True, and
+    falls back to serial execution if Ray is not installed.
+
+    With Ray, the model is put in the object store once and every case is one task with the
+    resources of ray_options. At most max_in_flight tasks are submitted at a time (all by default);
+    finished results are collected in completion order, whichever node ran them, and handed on as
+    soon as batch_size of them are in, so the writer keeps up with the cluster.
+    """
+    if pool is not None:
+        if verbose:
+            print(f"Launching {len(cases_list)} cases on a {pool.backend} pool of {pool.n_workers} workers...")
+        step = batch_size if batch_size else max(len(cases_list), 1)
+        for start in range(0, len(cases_list), step):
+            chunk = cases_list[start:start + step]
+            yield list(zip(range(start, start + len(chunk)), pool.map(chunk)))
+        return
+
+    if parallel and ray is None:
+        print("WARNING: 'parallel=True' requested but 'ray' is not installed.")
+        print("Falling back to serial execution.")
+        parallel = False
+
+    if parallel:
+        init_ray(num_cpus, ray_address)
+
+        # We convert the plain python function to a Ray remote function strictly at runtime
+        remote_worker = ray.remote(worker_task).options(**(ray_options or {}))
+        model_ref = ray.put(model)
+
+        if verbose:
+            where = f"the Ray cluster at {ray_address}" if ray_address else \
+                f"{num_cpus if num_cpus else 'all'} cores"
+            print(f"Launching {len(cases_list)} tasks on {where}...")
+
+        if batch_size is None:
+            batch_size = len(cases_list)
+        window = max_in_flight if max_in_flight else len(cases_list)
+        submitted = 0
+
+        def submit(k):
+            nonlocal submitted
+            stop = min(submitted + k, len(cases_list))
+            new = [remote_worker.remote(i, cases_list[i], model_ref) for i in range(submitted, stop)]
+            submitted = stop
+            return new
+
+        futures = submit(window)
+        ready = []
+        while futures:
+            # block for one result, then take every other one that is already done
+            done, futures = ray.wait(futures, num_returns=1)
+            if futures:
+                more, futures = ray.wait(futures, num_returns=len(futures), timeout=0)
+                done += more
+            ready += done
+            futures += submit(len(done))
+            while len(ready) >= batch_size or (ready and not futures):
+                yield ray.get(ready[:batch_size])
+                ready = ready[batch_size:]
+    else:
+        if verbose:
+            print("Running in serial mode...")
+        eff_batch_size = batch_size if batch_size else 1000  # Default buffer for serial
+        batch = []
+        for i, case in enumerate(cases_list):
+            batch.append(worker_task(i, case, model))
+            if len(batch) >= eff_batch_size:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
+
+
+def iter_pool_column_batches(inputs_df, pool, batch_size=None, verbose=True):
+    """
+    Evaluates the rows of inputs_df on a CasePool column-wise (CasePool.map_columns, through shared
+    memory for a pool with shared_memory=True) and yields (indices, dict of output columns).
+    """
+    n_cases = len(inputs_df)
+    if verbose:
+        print(f"Launching {n_cases} cases on a {pool.backend} pool of {pool.n_workers} workers (shared memory)...")
+    step = batch_size if batch_size else max(n_cases, 1)
+    for start in range(0, n_cases, step):
+        stop = min(start + step, n_cases)
+        part = inputs_df.iloc[start:stop]
+        yield list(range(start, stop)), pool.map_columns({k: part[k] for k in part.columns})
+
+
+def batch_to_columns(batch_results):
+    """Converts a batch of (index, result_dict) tuples to (indices, dict of output columns)."""
+    cols = ColumnBuffer(len(batch_results))
+    for j, (_, res) in enumerate(batch_results):
+        cols.add(j, res)
+    return [idx for idx, _ in batch_results], cols.columns
+
+
+def model_inputs(inputs_df, category_codes=False):
+    """
+    The input columns as the model gets them. Categorical columns are decoded to their values when
+    the cases are built (to_dict / to_numpy); with category_codes=True they are passed as integer
+    codes into their categories instead (see ParameterSpace.categories).
+    """
+    if not category_codes:
+        return inputs_df
+    codes = {c: inputs_df[c].cat.codes for c in inputs_df.columns
+             if isinstance(inputs_df[c].dtype, pd.CategoricalDtype)}
+    return inputs_df.assign(**codes) if codes else inputs_df
+
+
+def iter_vectorized_batches(inputs_df, model, batch_size=None):
+    """
+    Calls a vectorized model once per batch with a dict of input column arrays and yields
+    (indices, dict of output columns). Scalar outputs are broadcast to the batch.
+    """
+    n_cases = len(inputs_df)
+    step = batch_size if batch_size else max(n_cases, 1)
+    columns = {k: inputs_df[k].to_numpy() for k in inputs_df.columns}
+
+    for start in range(0, n_cases, step):
+        stop = min(start + step, n_cases)
+        res = model({k: v[start:stop] for k, v in columns.items()})
+        out = {k: np.broadcast_to(np.asarray(v), (stop - start,)).tolist() for k, v in res.items()}
+        yield list(range(start, stop)), out
 
+
+def run_cases(inputs, model, output_stats=False, parallel=False, num_cpus=None, batch_size=None,
+              save_to_file=False, data_out_dir="./data", vectorized=False, verbose=True, pool=None, store=None,
+              campaign=None, reuse_stored=False, category_codes=False, memmap_dir=None, memmap_dtype="float64",
+              ray_address=None, ray_options=None, max_in_flight=None):
+    """
+    Robust run_cases that works even if Ray is not installed.
+
+    Results are accumulated in memory, column by column, and returned directly. Nothing is written
+    to disk unless save_to_file=True, in which case batches are appended to a uniquely named
+    ./data/outputs_<timestamp>_<random>.csv as they finish.
+
+    Parameters
+    ----------
+    inputs : list of dict or pd.DataFrame
+        Cases to evaluate.
+    model : function
+        Model taking a case dict and returning a dict of outputs.
+    output_stats : bool, optional
+        Also return the summary statistics of the outputs.
+    parallel, num_cpus, batch_size :
+        Ray settings. batch_size is also the number of rows per file write.
+    save_to_file : bool, optional
+        Stream the results to a CSV file in data_out_dir. Default is False.
+    data_out_dir : str, optional
+        Folder for the CSV output when save_to_file=True.
+    vectorized : bool, optional
+        The model accepts a dict of input arrays and returns a dict of output arrays. It is called
+        once per batch (once in total if batch_size is None) instead of once per case.
+    verbose : bool, optional
+        Print progress messages. Default is True.
+    pool : CasePool, optional
+        Persistent worker pool to evaluate the cases on instead of Ray. The pool's own model is used.
+        DataFrame inputs go to a pool made with shared_memory=True column-wise, without building
+        and pickling case dicts (see CasePool.map_columns).
+    store : ResultsStore, optional
+        Append every finished batch to this results store.
+    campaign : str, optional
+        Campaign name of the stored cases. Default run_<timestamp>.
+    reuse_stored : bool, str or list of str, optional
+        Look the cases up in the store first and only run the ones not found; the stored outputs
+        of the others are returned (and recorded under this campaign too, once). True looks in
+        this campaign only, so outputs of another model with the same input names are not picked
+        up; a campaign name or a list of names looks in those campaigns instead.
+    category_codes : bool, optional
+        Pass categorical (pd.Categorical) inputs to the model as integer codes instead of their
+        values. The returned DataFrame keeps the categorical columns either way.
+    memmap_dir : str, optional
+        Write the numeric outputs straight into preallocated memory-mapped arrays (one per output)
+        in this run directory, by case index (see ResultArrays). If the directory holds a run of
+        the same cases, only the cases not done yet are run. Other outputs are pickled next to them.
+        open_result_arrays(memmap_dir) reads the arrays, also while the run is going.
+    memmap_dtype : str, optional
+        "float64" or "float32" for the memory-mapped outputs.
+    ray_address : str, optional
+        With parallel=True, connect to this existing Ray cluster ("auto", "ray://head:10001" or
+        "head:6379") instead of starting a local instance. RAY_ADDRESS is used if set.
+    ray_options : dict, optional
+        Resources of each case task, passed to .options(), e.g. {"num_cpus": 2, "memory": 4e9,
+        "resources": {"solver": 1}}. Custom resources keep the cases on the nodes that have them.
+    max_in_flight : int, optional
+        Maximum number of case tasks submitted to Ray at a time. Default all cases at once.
+
+    Returns
+    -------
+    dict with "out" (DataFrame of inputs and outputs), "out_stats" and "file_path" (None if in memory),
+    and "arrays" (the ResultArrays) with memmap_dir.
+    """
     start_time = time.time()
 
     # Normalize inputs
+    shared_pool = pool is not None and pool.shared_memory and isinstance(inputs, pd.DataFrame) and not vectorized
     if isinstance(inputs, pd.DataFrame):
-        cases_list = inputs.to_dict('records')
         inputs_df = inputs.copy().reset_index(drop=True)
+        cases_list = None if vectorized or shared_pool else model_inputs(inputs_df, category_codes).to_dict('records')
     elif isinstance(inputs, list):
         cases_list = inputs
         inputs_df = pd.DataFrame(inputs)
     else:
         raise ValueError("Inputs must be a list of dicts or a pandas DataFrame.")
 
-    # --- 3. Parallel Logic Check ---
-    if parallel:
-        if ray is None:
-            print("WARNING: 'parallel=True' requested but 'ray' is not installed.")
-            print("Falling back to serial execution.")
-            parallel = False
-        else:
-            # Ray is available, proceed with setup
-            if not ray.is_initialized():
-                ray.init(num_cpus=num_cpus)
-
-            # --- DYNAMIC REMOTING ---
-            # We convert the plain python function to a Ray remote function strictly at runtime
-            remote_worker = ray.remote(worker_task)
-
-            print(f"Launching {len(cases_list)} tasks on {num_cpus if num_cpus else 'all'} cores...")
-
-            # Use the dynamic 'remote_worker' instead of the function name directly
-            futures = [remote_worker.remote(i, case, model) for i, case in enumerate(cases_list)]
-
-            if batch_size is None:
-                batch_size = len(cases_list)
-
-            header_written = False
-
-            # Batch Loop
-            while futures:
-                done_futures, futures = ray.wait(futures, num_returns=min(batch_size, len(futures)))
-                batch_results = ray.get(done_futures)
-
-                batch_rows = []
-                for idx, res in batch_results:
-                    input_row = inputs_df.iloc[[idx]].to_dict('records')[0]
-                    batch_rows.append({**input_row, **res})
-
-                batch_df = pd.DataFrame(batch_rows)
-                mode = 'a' if header_written else 'w'
-                header = not header_written
-                batch_df.to_csv(output_file, mode=mode, header=header, index=False)
-                header_written = True
-
-                print(f"Batch processed: {len(batch_rows)} items written.")
-                del batch_results, batch_df, batch_rows
-
-    # --- 4. Serial Fallback ---
-    # This runs if parallel=False OR if Ray was missing
-    if not parallel:
-        print("Running in serial mode...")
-        # We can still use batch writing in serial to save memory
-        header_written = False
-        buffer = []
-        eff_batch_size = batch_size if batch_size else 1000  # Default buffer for serial
+    n_cases = len(inputs_df)
+
+    if store is not None:
+        if campaign is None:
+            campaign = time.strftime("run_%Y%m%d-%H%M%S")
+        if reuse_stored is not False and reuse_stored is not None:
+            reuse_from = campaign if reuse_stored is True else reuse_stored
+            return run_cases_reusing_store(inputs_df, model, store, campaign, reuse_from=reuse_from,
+                                           output_stats=output_stats,
+                                           parallel=parallel, num_cpus=num_cpus, batch_size=batch_size,
+                                           save_to_file=save_to_file, data_out_dir=data_out_dir,
+                                           vectorized=vectorized, verbose=verbose, pool=pool,
+                                           category_codes=category_codes, ray_address=ray_address,
+                                           ray_options=ray_options, max_in_flight=max_in_flight)
+
+    output_file = unique_output_file(data_out_dir) if save_to_file else None
+
+    arrays = None
+    todo = np.arange(n_cases)
+    if memmap_dir is not None and n_cases:
+        arrays = ResultArrays.open_or_create(memmap_dir, inputs_df, dtype=memmap_dtype, verbose=verbose)
+        todo = np.flatnonzero(~arrays.done)
+        if verbose and len(todo) < n_cases:
+            print(f"{n_cases - len(todo)} of {n_cases} cases already done in {memmap_dir}")
+        if cases_list is not None:
+            cases_list = [cases_list[i] for i in todo]
+
+    if vectorized:
+        batches = iter_vectorized_batches(model_inputs(inputs_df.iloc[todo], category_codes), model,
+                                          batch_size=batch_size)
+    elif shared_pool:
+        batches = iter_pool_column_batches(model_inputs(inputs_df.iloc[todo], category_codes), pool,
+                                           batch_size=batch_size, verbose=verbose)
+    else:
+        batches = (batch_to_columns(b) for b in iter_case_batches(
+            cases_list, model, parallel=parallel, num_cpus=num_cpus, batch_size=batch_size, verbose=verbose,
+            pool=pool, ray_address=ray_address, ray_options=ray_options, max_in_flight=max_in_flight))
+
+    # If user wanted batching to a file, assume they might not want the huge DF back
+    keep_in_memory = not (save_to_file and batch_size and n_cases > 10000)
+    buffer = ColumnBuffer(n_cases)
+    header_written = False
+
+    for batch_idx, batch_cols in batches:
+        batch_idx = todo[batch_idx]
+        if save_to_file or store is not None:
+            batch_df = join_outputs(inputs_df.iloc[batch_idx], batch_cols)
+        if arrays is not None:
+            arrays.write(batch_idx, batch_cols)
+            arrays.mark_done(batch_idx)
+        elif keep_in_memory:
+            buffer.add_block(batch_idx, batch_cols)
+
+        if store is not None:
+            store.append(batch_df, campaign, list(inputs_df.columns))
+
+        if save_to_file:
+            batch_df.to_csv(output_file, mode='a' if header_written else 'w', header=not header_written,
+                            index=False)
+            header_written = True
+            if (parallel or pool is not None) and verbose:
+                print(f"Batch processed: {len(batch_idx)} items written.")
+
+    if verbose:
+        print(f"--- Finished in {(time.time() - start_time):.2f}s ---")
+
+    if keep_in_memory:
+        outputs = arrays.output_columns() if arrays is not None else buffer.columns
+        full_df = join_outputs(inputs_df, outputs)
+    else:
+        full_df = None
 
-        for i, case in enumerate(cases_list):
-            # Run the plain function directly
-            _, res = worker_task(i, case, model)
-
-            input_row = inputs_df.iloc[[i]].to_dict('records')[0]
-            buffer.append({**input_row, **res})
-
-            if len(buffer) >= eff_batch_size:
-                batch_df = pd.DataFrame(buffer)
-                mode = 'a' if header_written else 'w'
-                header = not header_written
-                batch_df.to_csv(output_file, mode=mode, header=header, index=False)
-                header_written = True
-                buffer = []  # Clear memory
-
-        # Write remaining
-        if buffer:
-            batch_df = pd.DataFrame(buffer)
-            mode = 'a' if header_written else 'w'
-            header = not header_written
-            batch_df.to_csv(output_file, mode=mode, header=header, index=False)
-
-    print(f"--- Finished in {(time.time() - start_time):.2f}s ---")
-
-    # --- 5. Return Logic ---
-    # (Same as before: try to load file if it fits in memory, else return path)
+    out_stats = None
     if output_stats:
         try:
-            full_df = pd.read_csv(output_file)
+            if full_df is None:
+                full_df = pd.read_csv(output_file)
             out_stats = calculate_stats(full_df)
         except MemoryError:
             print("Output too large for stats.")
             full_df = None
-            out_stats = None
+
+    res = {"out": full_df, "out_stats": out_stats, "file_path": output_file}
+    if arrays is not None:
+        res["arrays"] = arrays
+    return res
+
+
+def run_missing_cases(inputs_df, found, reused_outputs, model, output_stats=False, save_to_file=False,
+                      verbose=True, store=None, campaign=None, **run_kwargs):
+    """
+    Runs the cases of inputs_df where found is False and merges them, in the order of inputs_df,
+    with the rows where found is True, whose outputs are given in reused_outputs (one row per
+    found case). Reused rows are recorded in the store too, if one is given, unless the campaign
+    already holds them.
+    """
+    reused = join_outputs(inputs_df[found], {k: reused_outputs[k].tolist() for k in reused_outputs.columns})
+    if store is not None and len(reused):
+        recorded, _ = store.lookup(inputs_df[found], campaign=campaign, columns=[])
+        store.append(reused[~recorded], campaign, list(inputs_df.columns))
+
+    file_path = None
+    if found.all():
+        out = reused
     else:
-        # If user wanted batching, assume they might not want the huge DF back
-        if batch_size and len(cases_list) > 10000:
-            full_df = None
-        else:
-            full_df = pd.read_csv(output_file)
-        out_stats = None
+        res = run_cases(inputs_df[~found], model, save_to_file=save_to_file, verbose=verbose, store=store,
+                        campaign=campaign, **run_kwargs)
+        file_path = res["file_path"]
+        if res["out"] is None:  # streamed to file only
+            return {"out": None, "out_stats": None, "file_path": file_path}
+        position = np.concatenate([np.flatnonzero(found), np.flatnonzero(~found)])
+        out = pd.concat([reused, res["out"]], ignore_index=True)
+        out = out.iloc[np.argsort(position, kind="stable")].reset_index(drop=True)
+    if save_to_file:
+        file_path = file_path or unique_output_file(run_kwargs.get("data_out_dir", "./data"))
+        out.to_csv(file_path, index=False)
+
+    out_stats = calculate_stats(out) if output_stats else None
+    return {"out": out, "out_stats": out_stats, "file_path": file_path}
+
+
+def run_cases_reusing_store(inputs_df, model, store, campaign, verbose=True, reuse_from=None, **run_kwargs):
+    """
+    run_cases(..., store=store, reuse_stored=True): cases already stored under the campaign(s)
+    reuse_from (default `campaign`) are not run again. Their stored outputs are recorded under
+    `campaign` and merged with the new results.
+    """
+    found, stored = store.lookup(inputs_df, campaign=campaign if reuse_from is None else reuse_from)
+    if verbose:
+        print(f"{int(found.sum())} of {len(inputs_df)} cases found in the results store")
 
-    return {"out": full_df, "out_stats": out_stats, "file_path": output_file}
+    # outputs of other models in the same store are all missing for these cases
+    stored = stored[found].dropna(axis=1, how="all")
+    return run_missing_cases(inputs_df, found, stored, model, verbose=verbose, store=store, campaign=campaign,
+                             **run_kwargs)
+
+
+def match_cases(inputs_df, previous_inputs, tol=None):
+    """
+    Row position in previous_inputs of each case of inputs_df, or -1 where there is none, matched
+    on the columns of inputs_df. Exact by default (1 and 1.0 match). With tol, numeric inputs match
+    within tol of each other (largest difference over the inputs) and the others exactly.
+    """
+    columns = list(inputs_df.columns)
+    match = np.full(len(inputs_df), -1)
+    if len(previous_inputs) == 0 or any(c not in previous_inputs.columns for c in columns):
+        return match
+    previous_inputs = previous_inputs[columns].reset_index(drop=True)
+
+    numeric = [c for c in columns if tol is not None
+               and pd.api.types.is_numeric_dtype(inputs_df[c]) and not pd.api.types.is_bool_dtype(inputs_df[c])
+               and pd.api.types.is_numeric_dtype(previous_inputs[c])]
+    other = [c for c in columns if c not in numeric]
+
+    # exact match on the non-tolerance columns (all of them if tol is None)
+    new_keys = [case_key(c) for c in inputs_df[other].to_dict("records")]
+    old_keys = [case_key(c) for c in previous_inputs[other].to_dict("records")]
+    if not numeric:
+        last = {k: i for i, k in enumerate(old_keys)}
+        return np.array([last.get(k, -1) for k in new_keys], dtype=int)
+
+    from scipy.spatial import cKDTree
+
+    old_groups = pd.Series(np.arange(len(old_keys))).groupby(old_keys).indices
+    new_groups = pd.Series(np.arange(len(new_keys))).groupby(new_keys).indices
+    X_old = previous_inputs[numeric].to_numpy(dtype=float)
+    X_new = inputs_df[numeric].to_numpy(dtype=float)
+    for key, rows in new_groups.items():
+        old_rows = old_groups.get(key)
+        if old_rows is None:
+            continue
+        dist, j = cKDTree(X_old[old_rows]).query(X_new[rows], p=np.inf, distance_upper_bound=tol * (1 + 1e-12))
+        hit = np.isfinite(dist)
+        match[rows[hit]] = old_rows[j[hit]]
+    return match
+
+
+def run_cases_incremental(inputs, model, previous, tol=None, verbose=True, **run_kwargs):
+    """
+    Runs only the cases that are not in a previous run and merges them with the previous results.
+
+    Meant for re-running a grid after widening a range or adding an option: the points the old
+    and new grids share are taken from the previous outputs, the rest are evaluated, and the result
+    has the layout of run_cases over all of `inputs`.
+
+    Parameters
+    ----------
+    inputs : list of dict or pd.DataFrame
+        The new case set.
+    model : function
+        The model function.
+    previous : pd.DataFrame or str
+        Previous run_cases output (inputs and outputs), or the path of its outputs file / analysis
+        folder (see load_results). If the file does not exist every case is run.
+    tol : float, optional
+        Numeric inputs within tol of a previous case count as that case. Default exact match.
+    run_kwargs :
+        Passed on to run_cases.
+
+    Returns
+    -------
+    dict as run_cases.
+    """
+    inputs_df = pd.DataFrame(inputs).reset_index(drop=True)
+    if isinstance(previous, (str, os.PathLike)):
+        try:
+            previous = load_results(previous)
+        except FileNotFoundError:
+            previous = None
+    if previous is None:
+        return run_cases(inputs_df, model, verbose=verbose, **run_kwargs)
+
+    match = match_cases(inputs_df, previous, tol=tol)
+    found = match >= 0
+    if verbose:
+        print(f"{int(found.sum())} of {len(inputs_df)} cases reused from the previous run")
+    outputs = previous.drop(columns=[c for c in inputs_df.columns if c in previous.columns])
+    reused_outputs = outputs.iloc[match[found]].reset_index(drop=True)
+    return run_missing_cases(inputs_df, found, reused_outputs, model, verbose=verbose, **run_kwargs)
 
 
 def calculate_stats(df):
@@ -457,8 +835,8 @@ def generate_samples(par_space0, type="unc", n=1000, par_to_sample=None, grid_n=
 
     Parameters
     ----------
-    par_space : dict
-        Dictionary specifying the parameter space.
+    par_space : dict or ParameterSpace
+        Processed input stack, or its compiled ParameterSpace (faster when sampled repeatedly).
     type : str, optional
         Type of sampling to perform. Must be one of:
         - "unc": Samples based on the uncertainty type and range specified for each parameter in par_space. It will use the "unc_frac" to calculate the std of the distribution. If "unc_frac" is not specified, it will use "unc"
@@ -485,118 +863,8 @@ def generate_samples(par_space0, type="unc", n=1000, par_to_sample=None, grid_n=
 
     """
 
-    if isinstance(par_to_sample, str):
-        par_to_sample = [par_to_sample]
-
-    if par_to_sample is None:
-        par_to_sample = par_space0.keys()
-
-    par_space = {k: v for k, v in par_space0.items() if k in par_to_sample}
-
-    if type not in ["unc", "uniform", "grid", "extremes"]:
-        raise ValueError(
-            f"Invalid type: {type}. Must be one of 'unc', 'uniform', 'grid', or 'extremes'."
-        )
-
-    par_space_ds = {}
-
-    if type == "unc":
-
-        for k, v in par_space.items():
-            if "unc_frac" in v and v["unc_frac"] is not None:
-                unc_local = v["unc_frac"] * v["mean"]
-            else:
-                unc_local = v["unc"]
-
-            if "options" in v:
-                par_space_ds[k] = np.random.choice(v["range"], p=v["prob"], size=n)
-            elif "range" in v:
-                if v["unc_type"] == "normal":
-                    par_space_ds[k] = np.random.normal(v["mean"], unc_local, size=n)
-                elif v["unc_type"] == "uniform":
-                    par_space_ds[k] = np.random.uniform(
-                        v["range"][0], v["range"][1], size=n
-                    )
-                elif v["unc_type"] == "exponential":
-                    lamda_exp = 1 / v["mean"]
-                    par_space_ds[k] = np.random.exponential(lamda_exp, size=n)
-                elif v["unc_type"] == "lognormal":
-                    mean_log = np.log(
-                        v["mean"] ** 2 / np.sqrt(unc_local**2 + v["mean"] ** 2)
-                    )
-                    sigma_log = np.sqrt(np.log(unc_local**2 / v["mean"] ** 2 + 1))
-
-                    par_space_ds[k] = np.random.lognormal(mean_log, sigma_log, size=n)
-            else:
-                raise ValueError("par_space needs a range or options.")
-
-    elif type == "uniform":
-        for k, v in par_space.items():
-            if "options" in v:
-                par_space_ds[k] = np.random.choice(v["range"], size=n)
-            elif "range" in v:
-                par_space_ds[k] = np.random.uniform(
-                    v["range"][0], v["range"][1], size=n
-                )
-
-    elif type == "grid" or type == "extremes":
-        par_space_sets = {}
-        if grid_n is None:
-            # Estimate grid points for each parameter
-            option_ns = [len(v["range"]) for v in par_space.values() if "options" in v]
-            grid_ns = [v["grid_n"] for v in par_space.values() if "grid_n" in v]
-            
-            grid_range_0 = [1 for v in par_space.values() if len(v["range"]) == 1 and 'options' not in v]
-
-            n_dimensions = len(par_space)
-            n_dim_left = (
-                n_dimensions - len(option_ns) - len(grid_ns) - len(grid_range_0)
-            )
-            # no range dims
-            grid_n = max(
-                2,
-                round(
-                    (n / (np.prod(option_ns) * np.prod(grid_ns))) ** (1 / n_dim_left)
-                ),
-            )
-            grid_n = int(grid_n)
-
-        for k, v in par_space.items():
-            if "options" in v:
-                par_space_sets[k] = v["range"]
-            else:
-                if type == "extremes":
-                    par_space_sets[k] = np.unique(np.append(v["range"], v["mean"]))
-                else:
-                    if "grid_n" in v:
-                        grid_n_k = v["grid_n"]
-                    if v["range"][0] == v["range"][1]:
-                        grid_n_k = 1
-                    else:
-                        grid_n_k = grid_n
-
-                    par_space_sets[k] = np.linspace(
-                        v["range"][0], v["range"][1], grid_n_k
-                    )
-
-        par_space_ds = generate_combos(par_space_sets, type="")
-
-    # add the other parameters that were not sampled
-    for k, v in par_space0.items():
-        if k not in par_to_sample:
-            par_space_ds[k] = v["mean"]
-
-    # if grid, add ref case at the first row
-    if type == "grid":
-        ref = {k: v["mean"] for k, v in par_space0.items()}
-        ref = pd.DataFrame.from_dict(ref, orient="index").T
-
-        par_space_ds = pd.concat([ref, par_space_ds], ignore_index=True).reset_index(
-            drop=True
-        )
-
-    # Convert the dictionary of samples to a DataFrame
-    df_samples = pd.DataFrame.from_dict(par_space_ds)
+    space = par_space0 if isinstance(par_space0, ParameterSpace) else ParameterSpace(par_space0)
+    df_samples = space.sample(type=type, n=n, par_to_sample=par_to_sample, grid_n=grid_n)
 
     return df_samples
 
@@ -619,6 +887,18 @@ def run_analysis(
         parallel : bool = False,
         num_cpus: object = None,
         batch_size: object = None,
+        grid_variable: object = None,
+        plot_workers: object = None,
+        async_plots: bool = False,
+        plot_cache: object = False,
+        store: object = None,
+        campaign: object = None,
+        incremental: bool = False,
+        incremental_tol: object = None,
+        category_codes: bool = False,
+        memmap_results: bool = False,
+        ray_address: object = None,
+        ray_options: object = None,
 ) -> object:
     """
     Run various analyses on the model based on the input stack.
@@ -637,6 +917,7 @@ def run_analysis(
             "estimate": Runs the model with the mean values of the input parameters.
             "estimate_unc": Runs the model with sampled input parameters based on their uncertainty distributions.
             "estimate_unc_extreme_combos": Runs the model with combinations of extreme values of the input parameters.
+            "estimate_unc_mlmc": Multilevel Monte Carlo version of "estimate_unc" using grid_variable as the level.
             "sensitivity_analysis_unc": Performs sensitivity analysis by varying each parameter individually based on its uncertainty distribution.
             "sensitivity_analysis_range": Performs sensitivity analysis by varying each parameter individually over its entire range.
             "sensitivity_analysis_2D": Performs 2D sensitivity analysis by varying two parameters simultaneously over a grid.
@@ -657,6 +938,34 @@ def run_analysis(
         Folder to save analysis outputs. Default is "analysis".
     plotting : bool, optional
         Whether to generate plots for the analyses. Default is False.
+    grid_variable : str or list of str, optional
+        Grid size input used as the level of "estimate_unc_mlmc".
+    plot_workers : int, optional
+        Draw the figures in this many worker processes (Agg backend) instead of one after the other.
+    async_plots : bool, optional
+        Return as soon as the data is saved and keep drawing in the background (implies worker
+        processes). Call wait_for_plots() to block until the figures are done.
+    plot_cache : bool, str or PlotCache, optional
+        Reuse figures whose data, parameters and style are unchanged since the last render. True keeps
+        the cache in <data_folder>/.plot_cache; a path or a PlotCache selects another location.
+    store : ResultsStore, optional
+        Also record every evaluated case in this results store, one campaign per analysis folder
+        ("<campaign>/<analysis folder>").
+    campaign : str, optional
+        Campaign name prefix for the store. Default run_<timestamp>.
+    incremental : bool, optional
+        Reuse the cases of each analysis folder's previous outputs.csv and only run the new ones
+        (see run_cases_incremental), e.g. after widening a range of a grid analysis.
+    incremental_tol : float, optional
+        Tolerance of the incremental match of numeric inputs. Default exact.
+    category_codes : bool, optional
+        The model takes string options as integer codes into their "options" list (see run_cases).
+    memmap_results : bool, optional
+        Write the numeric outputs of each analysis into memory-mapped arrays in
+        <data_folder>/.arrays/<analysis folder> (see run_cases memmap_dir). A rerun with the same
+        cases resumes there, running only the cases that did not finish.
+    ray_address, ray_options : optional
+        With parallel=True, the Ray cluster to run on and the resources of each case task (see run_cases).
 
     Returns
     -------
@@ -679,6 +988,7 @@ def run_analysis(
             "estimate",
             "estimate_unc",
             "estimate_unc_extreme_combos",
+            "estimate_unc_mlmc",
             "sensitivity_analysis_unc",
             "sensitivity_analysis_range",
             "sensitivity_analysis_2D",
@@ -692,9 +1002,28 @@ def run_analysis(
     if type(par_output) is str:
         par_output = [par_output]
 
+    renderer = None
+    if plotting and (plot_workers or async_plots):
+        renderer = get_plot_renderer(plot_workers)
+    plot_cache = get_plot_cache(plot_cache, data_folder) if plotting else None
+    if store is not None and campaign is None:
+        campaign = time.strftime("run_%Y%m%d-%H%M%S")
+
+    def run_analysis_cases(cases, folder_name, **kwargs):
+        kwargs.update(parallel=parallel, num_cpus=num_cpus, batch_size=batch_size, store=store,
+                      campaign=f"{campaign}/{folder_name}" if store is not None else None,
+                      category_codes=category_codes, ray_address=ray_address, ray_options=ray_options,
+                      memmap_dir=os.path.join(data_folder, ".arrays", folder_name) if memmap_results else None)
+        if incremental:
+            # read before create_dir clears the folder
+            previous = os.path.join(data_folder, folder_name, "outputs.csv")
+            return run_cases_incremental(cases, model, previous, tol=incremental_tol, **kwargs)
+        return run_cases(cases, model, **kwargs)
+
     # straight estimate.
-    cases = [{k: v["mean"] for k, v in input_stack.items()}]
-    res_0 = run_cases(cases, model)
+    cases = ParameterSpace(input_stack).reference_case()
+    res_0 = run_cases(cases, model, store=store, campaign=f"{campaign}/estimate" if store is not None else None,
+                      category_codes=category_codes)
     if save_results:
         create_dir(os.path.join(data_folder, "estimate"))
         res_0["out"].to_csv(
@@ -706,7 +1035,7 @@ def run_analysis(
 
     if "estimate_unc" in analyses:
         cases = generate_samples(input_stack, n=n_samples, type="unc")
-        res = run_cases(cases, model, output_stats=True, parallel=parallel, num_cpus=num_cpus, batch_size=batch_size)
+        res = run_analysis_cases(cases, "estimate_unc", output_stats=True)
 
         if save_results:
             create_dir(os.path.join(data_folder, "estimate_unc"))
@@ -727,11 +1056,13 @@ def run_analysis(
                 parz_list=par_output,
                 data_folder=os.path.join(data_folder, "estimate_unc"),
                 df0=res_0["out"],
+                renderer=renderer,
+                cache=plot_cache,
             )
 
     if "estimate_unc_extreme_combos" in analyses:
         cases = generate_samples(input_stack, n=n_samples, type="extremes")
-        res = run_cases(cases, model, output_stats=True, parallel=parallel, num_cpus=num_cpus, batch_size=batch_size)
+        res = run_analysis_cases(cases, "estimate_unc_extreme_combos", output_stats=True)
         if save_results:
             create_dir(os.path.join(data_folder, "estimate_unc_extreme_combos"))
 
@@ -744,12 +1075,33 @@ def run_analysis(
                 index=False,
             )
 
+    if "estimate_unc_mlmc" in analyses:
+        from casegenmc.mlmc import estimate_unc_mlmc
+
+        if grid_variable is None:
+            raise ValueError("estimate_unc_mlmc requires grid_variable.")
+        res = estimate_unc_mlmc(model, input_stack, grid_variable, parallel=parallel, num_cpus=num_cpus,
+                                batch_size=batch_size, ray_address=ray_address, ray_options=ray_options)
+        if save_results:
+            create_dir(os.path.join(data_folder, "estimate_unc_mlmc"))
+            res["out"].to_csv(
+                os.path.join(data_folder, "estimate_unc_mlmc", "outputs.csv"),
+                index=False,
+            )
+            res["out_stats"].to_csv(
+                os.path.join(data_folder, "estimate_unc_mlmc", "output_stats.csv"),
+            )
+            res["levels"].to_csv(
+                os.path.join(data_folder, "estimate_unc_mlmc", "levels.csv"),
+                index=False,
+            )
+
     if "sensitivity_analysis_unc" in analyses:
         for par_i in par_sensitivity:
             cases = generate_samples(
                 input_stack, n=n_samples, type="unc", par_to_sample=par_i
             )
-            res = run_cases(cases, model, output_stats=True, parallel=parallel, num_cpus=num_cpus, batch_size=batch_size)
+            res = run_analysis_cases(cases, f"sensitivity_analysis_unc_{clean_fld_name(par_i)}", output_stats=True)
             if save_results:
                 d_ifolder = os.path.join(data_folder, f"sensitivity_analysis_unc_{clean_fld_name(par_i)}")
                 create_dir(d_ifolder)
@@ -769,6 +1121,8 @@ def run_analysis(
                     parz_list=par_output,
                     data_folder=d_ifolder,
                     df0=res_0["out"],
+                    renderer=renderer,
+                    cache=plot_cache,
                 )
 
     if "sensitivity_analysis_range" in analyses:
@@ -781,7 +1135,7 @@ def run_analysis(
             cases = generate_samples(
                 input_stack, n=n_samples, type="grid", par_to_sample=par_i
             )
-            res = run_cases(cases, model, output_stats=True, parallel=parallel, num_cpus=num_cpus, batch_size=batch_size)
+            res = run_analysis_cases(cases, f"sensitivity_analysis_range_{clean_fld_name(par_i)}", output_stats=True)
             d_ifolder = os.path.join(data_folder, f"sensitivity_analysis_range_{clean_fld_name(par_i)}")
             if save_results:
                 create_dir(d_ifolder)
@@ -804,6 +1158,8 @@ def run_analysis(
                     parz_list=par_output,
                     data_folder=d_ifolder,
                     df0=res_0["out"],
+                    renderer=renderer,
+                    cache=plot_cache,
                 )
 
     if "sensitivity_analysis_2D" in analyses:
@@ -811,7 +1167,7 @@ def run_analysis(
             input_stack, n=n_samples, type="grid", par_to_sample=par_grid_xy
         )
 
-        res = run_cases(cases, model, output_stats=True, parallel=parallel, num_cpus=num_cpus, batch_size=batch_size)
+        res = run_analysis_cases(cases, "sensitivity_analysis_2D", output_stats=True)
         create_dir(os.path.join(data_folder, "sensitivity_analysis_2D"))
         res["out"].to_csv(
             os.path.join(data_folder, "sensitivity_analysis_2D", "outputs.csv"),
@@ -828,11 +1184,13 @@ def run_analysis(
                 par=list(par_grid_xy),
                 parz_list=par_output,
                 data_folder=os.path.join(data_folder, "sensitivity_analysis_2D"),
+                renderer=renderer,
+                cache=plot_cache,
             )
 
     if "regular_grid" in analyses:
         cases = generate_samples(input_stack, n=n_samples, type="grid")
-        res = run_cases(cases, model, parallel=parallel, num_cpus=num_cpus, batch_size=batch_size)
+        res = run_analysis_cases(cases, "regular_grid")
         create_dir(os.path.join(data_folder, "regular_grid"))
         res["out"].to_csv(
             os.path.join(data_folder, "regular_grid", "outputs.csv"), index=False
@@ -843,11 +1201,13 @@ def run_analysis(
                 par=list(input_stack.keys()),
                 parz_list=par_output,
                 data_folder=os.path.join(data_folder, "regular_grid"),
+                renderer=renderer,
+                cache=plot_cache,
             )
 
     if "random_uniform_grid" in analyses:
         cases = generate_samples(input_stack, n=n_samples, type="uniform")
-        res = run_cases(cases, model, parallel=parallel, num_cpus=num_cpus, batch_size=batch_size)
+        res = run_analysis_cases(cases, "random_uniform_grid")
         create_dir(os.path.join(data_folder, "random_uniform_grid"))
         res["out"].to_csv(
             os.path.join(data_folder, "random_uniform_grid", "outputs.csv"), index=False
@@ -858,6 +1218,8 @@ def run_analysis(
                 par=list(input_stack.keys()),
                 parz_list=par_output,
                 data_folder=os.path.join(data_folder, "random_uniform_grid"),
+                renderer=renderer,
+                cache=plot_cache,
             )
 
     if "GA" in analyses:
@@ -898,6 +1260,9 @@ def run_analysis(
 
         print(indices)
 
+    if renderer is not None and not async_plots:
+        renderer.wait()
+
     if len(analyses) == 1:
 
         res["out_no_unc"] = res_0["out"]
@@ -909,6 +1274,9 @@ def run_analysis(
 def create_model_wrap(model,input_stack, value_key, n_samples=100, lamda_w=1, analysis="estimate_unc"):
     """
     Wrap a model to find uncertainty, which is added to the outputs for all the variables.
+
+    Runs the full run_analysis for every call. For optimization loops use create_robust_model_wrap,
+    which reuses one set of random draws and keeps everything in memory.
     """
 
     # analysis needs to be either estimate_unc, estimate_unc_extreme_combos
@@ -946,7 +1314,122 @@ def create_model_wrap(model,input_stack, value_key, n_samples=100, lamda_w=1, an
     return model_w_unc
 
 
-def prep_model_for_NEORL(model, input_stack, value_key):
+def draw_common_random_numbers(input_stack, n, rng=None):
+    """
+    Draws the standardized random numbers behind an "unc" sample of the input stack: standard
+    normals for normal/lognormal, standard exponentials, and uniforms on [0, 1) for uniform and choice.
+    They are scaled to a parameter's mean and uncertainty later, so the same draws can be reused
+    for any set of means. input_stack may be a dict or a ParameterSpace.
+    """
+    space = input_stack if isinstance(input_stack, ParameterSpace) else ParameterSpace(input_stack)
+    return space.draw_crn(n, rng)
+
+
+def scale_common_random_numbers(input_stack, crn, n, means=None):
+    """
+    Turns common random numbers into input samples, using the distributions of generate_samples
+    with type="unc". `means` overrides the mean of some parameters. A uniform parameter keeps its range
+    width and is shifted with its mean. An overridden choice parameter is held at the given option.
+    input_stack may be a dict or a ParameterSpace.
+
+    Returns a dict of input arrays of length n.
+    """
+    space = input_stack if isinstance(input_stack, ParameterSpace) else ParameterSpace(input_stack)
+    return space.scale_crn(crn, n, means)
+
+
+class RobustModelWrap:
+    """
+    Uncertainty-aware objective for optimizers, a fast replacement for create_model_wrap.
+
+    A fixed set of common random numbers is drawn once and reused for every call, so the objective
+    is deterministic and smooth in the inputs. Each call scales the draws to the new means, evaluates
+    the inner samples in memory (vectorized, or through run_cases' parallel backend) and returns the
+    same keys as create_model_wrap: "<output>_mean", "<output>_std", "<output>_min", "<output>_max",
+    "<output>_lambda" and "<output>_sharpe". The input stack is never modified.
+    """
+
+    def __init__(self, model, input_stack, value_key=None, n_samples=100, lamda_w=1, analysis="estimate_unc",
+                 vectorized=False, parallel=False, num_cpus=None, batch_size=None, seed=None):
+        """
+        :param model: The model function to evaluate.
+        :param input_stack: Processed input stack (see process_input_stack).
+        :param value_key: Output key or list of keys to compute statistics for. None for all numeric columns.
+        :param n_samples: Number of inner samples per call.
+        :param lamda_w: Risk weight in lambda = mean - lamda_w * std**2.
+        :param analysis: "estimate_unc" (common random numbers) or "estimate_unc_extreme_combos".
+        :param vectorized: The model accepts and returns dicts of arrays (see run_cases).
+        :param parallel: Evaluate the inner samples with Ray through run_cases.
+        :param seed: Seed for the common random numbers.
+        """
+        if analysis not in ["estimate_unc", "estimate_unc_extreme_combos"]:
+            raise ValueError("analysis must be either estimate_unc or estimate_unc_extreme_combos")
+
+        self.model = model
+        self.input_stack = copy.deepcopy(input_stack)
+        self.value_key = [value_key] if isinstance(value_key, str) else value_key
+        self.n_samples = n_samples
+        self.lamda_w = lamda_w
+        self.analysis = analysis
+        self.vectorized = vectorized
+        self.parallel = parallel
+        self.num_cpus = num_cpus
+        self.batch_size = batch_size
+        self.space = ParameterSpace(self.input_stack)
+
+        if analysis == "estimate_unc":
+            self.crn = draw_common_random_numbers(self.space, n_samples, rng=seed)
+        else:
+            self.crn = None
+
+    def samples(self, x):
+        """Returns the DataFrame of inner samples for the means in x."""
+        if self.analysis == "estimate_unc":
+            return pd.DataFrame(scale_common_random_numbers(self.space, self.crn, self.n_samples, means=x))
+
+        shifted = {k: {**v, "mean": x.get(k, v["mean"])} for k, v in self.input_stack.items()}
+        return generate_samples(shifted, type="extremes")
+
+    def stats(self, df):
+        """Mean, std, min, max, lambda and sharpe of the numeric output columns."""
+        if self.value_key is not None:
+            df = df[self.value_key]
+        df = df.select_dtypes(include="number")
+        vals = df.to_numpy(dtype=float)
+
+        with np.errstate(divide="ignore", invalid="ignore"):
+            mean = np.nanmean(vals, axis=0)
+            std = np.nanstd(vals, axis=0, ddof=1)
+            stats = {
+                "mean": mean,
+                "std": std,
+                "min": np.nanmin(vals, axis=0),
+                "max": np.nanmax(vals, axis=0),
+                "lambda": mean - self.lamda_w * std ** 2,
+                "sharpe": mean / std,
+            }
+
+        model_out = {}
+        for j, col in enumerate(df.columns):
+            for name, arr in stats.items():
+                model_out[f"{col}_{name}"] = float(arr[j])
+        return model_out
+
+    def __call__(self, x):
+        res = run_cases(self.samples(x), self.model, parallel=self.parallel, num_cpus=self.num_cpus,
+                        batch_size=self.batch_size, vectorized=self.vectorized, verbose=False)
+        return self.stats(res["out"])
+
+
+def create_robust_model_wrap(model, input_stack, value_key=None, n_samples=100, lamda_w=1, analysis="estimate_unc",
+                             **kwargs):
+    return RobustModelWrap(model, input_stack, value_key=value_key, n_samples=n_samples, lamda_w=lamda_w,
+                           analysis=analysis, **kwargs)
+
+
+def prep_model_for_NEORL(model, input_stack, value_key, **kwargs):
+    from casegenmc.wrap_optimizers import create_NEORL_funwrap, NEORL_getbounds
+
     # split input stack into fixed and variable, based on if unc is 0 or if range is length 1
     fixed_inputs = {
         k: v["mean"] for k, v in input_stack.items() if len(v["range"]) == 1
@@ -958,6 +1441,7 @@ def prep_model_for_NEORL(model, input_stack, value_key):
         value_key=value_key,
         variable_inputs=variable_inputs.keys(),
         fixed_inputs=fixed_inputs,
+        **kwargs,
     )
 
     BOUNDS = NEORL_getbounds(variable_inputs)
@@ -965,12 +1449,29 @@ def prep_model_for_NEORL(model, input_stack, value_key):
     return NEORL_model, BOUNDS
 
 
-def run_NEORL(model, input_stack, value_key):
+def run_NEORL(model, input_stack, value_key, **kwargs):
+    """
+    Optimizes value_key with NEORL's ES (maximizes unless mode="minimize" is passed). kwargs go to
+    NeorlWrapper (mode, cache, pool, history, ...).
+
+    NEORL's ncores subprocesses evaluate copies of the wrapper, which hold no pool and record into
+    copies of the history. With a pool or a history the same ES is therefore run generation by
+    generation in this process (run_es_batched): each generation's individuals are evaluated in one
+    call, on the pool's workers, or with run_cases(parallel=True) without a pool.
+    """
+    from casegenmc.wrap_optimizers import run_es_batched
+
+    if kwargs.get("pool") is None and kwargs.get("history") is not None:
+        kwargs.setdefault("parallel", True)
+    NEORL_model, BOUNDS = prep_model_for_NEORL(model, input_stack, value_key, **kwargs)
+
+    if kwargs.get("pool") is not None or kwargs.get("history") is not None:
+        return run_es_batched(NEORL_model, BOUNDS, lambda_=60, mu=30, cxpb=0.7, mutpb=0.2, ngen=200, seed=1)
 
-    NEORL_model, BOUNDS = prep_model_for_NEORL(model, input_stack, value_key)
+    from neorl import ES
 
-    es = ES(mode='min', fit=NEORL_model, cxmode='blend', bounds=BOUNDS, 
-                 lambda_=60, mu=30, cxpb=0.7, mutpb=0.2,ncores=8, seed=1)
+    es = ES(mode='min', fit=NEORL_model, cxmode='blend', bounds=BOUNDS,
+                 lambda_=60, mu=30, cxpb=0.7, mutpb=0.2, ncores=8, seed=1)
     x_es, y_es, es_hist=es.evolute(ngen=200, verbose=True)
 
     return x_es, y_es, es_hist
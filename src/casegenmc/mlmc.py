@@ -0,0 +1,202 @@
+import time
+
+import numpy as np
+import pandas as pd
+
+from casegenmc.core import run_cases, draw_common_random_numbers, scale_common_random_numbers
+from casegenmc.parameter_space import ParameterSpace
+from casegenmc.discretization_error import grid_levels
+
+
+def mlmc_level_cases(input_stack, grid_h, level, n, rng):
+    """
+    Coupled cases of one MLMC level: n random input samples, each run on the level's grid and, for
+    level > 0, on the next coarser grid with the same random inputs. Returns a DataFrame with the
+    fine runs first and the coarse runs after them.
+    """
+    crn = draw_common_random_numbers(input_stack, n, rng)
+    base = pd.DataFrame(scale_common_random_numbers(input_stack, crn, n))
+    fine = base.assign(**{var: h[level] for var, h in grid_h.items()})
+    if level == 0:
+        return fine
+    coarse = base.assign(**{var: h[level - 1] for var, h in grid_h.items()})
+    return pd.concat([fine, coarse], ignore_index=True)
+
+
+def mlmc_stats(samples, key_variables):
+    """
+    MLMC estimates of the mean and standard deviation of every key variable, by telescoping the
+    first and second moments over the levels. The standard error of the mean comes from the
+    variances of the level corrections. min/max are taken from the finest level's runs.
+    """
+    rows = {}
+    for k in key_variables:
+        mean, m2, se2 = 0.0, 0.0, 0.0
+        for s in samples:
+            f, c = s["fine"][k], s["coarse"][k]
+            y = f - c
+            mean += np.nanmean(y)
+            m2 += np.nanmean(f ** 2 - c ** 2)
+            se2 += np.nanvar(y, ddof=1) / np.sum(~np.isnan(y))
+        finest = samples[-1]["fine"][k]
+        rows[k] = {"mean": mean, "std": np.sqrt(max(m2 - mean ** 2, 0.0)), "min": np.nanmin(finest),
+                   "max": np.nanmax(finest), "mean_se": np.sqrt(se2)}
+    return pd.DataFrame.from_dict(rows, orient="index")
+
+
+def optimal_samples(V, C, eps2=None, budget=None):
+    """
+    MLMC sample counts per level from level variances V and costs C: the counts minimizing cost for
+    an estimator variance eps2, or minimizing variance for a total cost budget.
+    """
+    V, C = np.asarray(V, dtype=float), np.asarray(C, dtype=float)
+    total = np.sum(np.sqrt(V * C))
+    if budget is not None:
+        return np.floor(budget * np.sqrt(V / C) / total).astype(int)
+    return np.ceil(np.sqrt(V / C) * total / eps2).astype(int)
+
+
+def estimate_unc_mlmc(model, input_stack, grid_variable, key_variables=None, grid_sizes=None, n_levels=3,
+                      refinement_factor=2.0, n_pilot=50, target_rmse=None, rel_tol=0.01, budget=None, cost=None,
+                      parallel=False, num_cpus=None, batch_size=None, pool=None, vectorized=False, seed=None,
+                      verbose=True, ray_address=None, ray_options=None):
+    """
+    Multilevel Monte Carlo version of the estimate_unc analysis, using a grid size input as the level.
+
+    Level 0 is the coarsest grid and the last level is the finest (the value in input_stack, or the
+    smallest of grid_sizes). Level l estimates E[P_l - P_(l-1)] with coupled samples: the same random
+    inputs are run on both grids, so the correction has a small variance and needs few of the
+    expensive fine runs. A pilot of n_pilot samples per level measures the variances and costs, from
+    which the sample count per level is chosen (Giles' MLMC allocation). Each stage runs in one
+    run_cases call per level, so the usual parallel backends apply.
+
+    Parameters
+    ----------
+    model : function
+        The model function to evaluate.
+    input_stack : dict
+        Processed input stack (see process_input_stack). The grid variable is not sampled.
+    grid_variable : str or list of str
+        Grid size key(s), refined together, as in est_discretization_err.
+    key_variables : list of str, optional
+        Outputs to estimate. Default all numeric outputs.
+    grid_sizes : list of float or dict, optional
+        Grid sizes of the levels (any order). If None, n_levels sizes are made from the value in
+        input_stack (the finest) and refinement_factor.
+    n_levels : int, optional
+        Number of levels when grid_sizes is None. Default is 3.
+    refinement_factor : float, optional
+        Ratio between consecutive grid sizes when grid_sizes is None. Default is 2.0.
+    n_pilot : int, optional
+        Pilot samples per level. Default is 50.
+    target_rmse : float or dict, optional
+        Target standard error of the mean, per key variable if a dict.
+    rel_tol : float, optional
+        Used if target_rmse and budget are None: the target is rel_tol times the pilot mean. Default 0.01.
+    budget : float, optional
+        Total cost (in the units of `cost`) instead of a target error.
+    cost : list of float, optional
+        Cost of one sample per level (coupled pair for l > 0). Default is the measured wall time of the pilot.
+    parallel, num_cpus, batch_size, pool, vectorized, ray_address, ray_options :
+        run_cases settings.
+    seed : int, optional
+        Random seed.
+
+    Returns
+    -------
+    dict with "out_stats" (mean, std, min, max and mean_se per key variable, in the layout of
+    estimate_unc's out_stats), "levels" (grid sizes, sample counts, variances and costs per level),
+    "out" (every run, with "mlmc_level" and "mlmc_grid" columns) and "cost_ratio" (MLMC cost over
+    the cost of plain Monte Carlo on the finest grid with the same standard error).
+    """
+    rng = np.random.default_rng(seed)
+    grid_variables = [grid_variable] if isinstance(grid_variable, str) else list(grid_variable)
+    if grid_sizes is not None and not isinstance(grid_sizes, dict):
+        grid_sizes = sorted(grid_sizes)
+    levels = grid_levels(input_stack, grid_variables, grid_sizes, refinement_factor, n_levels=n_levels,
+                         min_levels=2)
+    grid_h = {var: h[::-1] for var, h in levels.items()}  # coarse to fine
+    L = len(grid_h[grid_variables[0]])
+    sample_space = ParameterSpace({k: v for k, v in input_stack.items() if k not in grid_variables})
+    run_kwargs = dict(parallel=parallel, num_cpus=num_cpus, batch_size=batch_size, pool=pool,
+                      vectorized=vectorized, verbose=False, ray_address=ray_address, ray_options=ray_options)
+
+    samples = [{"fine": {}, "coarse": {}, "n": 0} for _ in range(L)]
+    runs = []
+    measured_cost = np.zeros(L)
+
+    def add_samples(level, n):
+        cases = mlmc_level_cases(sample_space, grid_h, level, n, rng)
+        t0 = time.time()
+        out = run_cases(cases, model, **run_kwargs)["out"]
+        elapsed = time.time() - t0
+
+        nonlocal key_variables
+        if key_variables is None:
+            key_variables = [c for c in out.columns if c not in cases.columns
+                             and pd.api.types.is_numeric_dtype(out[c])]
+        grid = np.repeat(["fine", "coarse"], n)[:len(out)]
+        runs.append(out.assign(mlmc_level=level, mlmc_grid=grid))
+
+        s = samples[level]
+        for k in key_variables:
+            vals = pd.to_numeric(out[k], errors="coerce").to_numpy(dtype=float)
+            f, c = vals[:n], (vals[n:] if level > 0 else np.zeros(n))
+            s["fine"][k] = np.concatenate([s["fine"].get(k, []), f])
+            s["coarse"][k] = np.concatenate([s["coarse"].get(k, []), c])
+        s["n"] += n
+        return elapsed / n
+
+    # 1. Pilot: variance and cost per level
+    for level in range(L):
+        measured_cost[level] = add_samples(level, n_pilot)
+    C = np.asarray(cost, dtype=float) if cost is not None else np.maximum(measured_cost, 1e-12)
+
+    pilot = mlmc_stats(samples, key_variables)
+    V = {k: np.array([np.nanvar(s["fine"][k] - s["coarse"][k], ddof=1) for s in samples]) for k in key_variables}
+
+    # 2. Optimal sample counts; the largest over the key variables
+    if budget is not None:
+        var_p = {k: max(pilot.loc[k, "std"] ** 2, 1e-300) for k in key_variables}
+        V_norm = sum(V[k] / var_p[k] for k in key_variables)
+        N = optimal_samples(np.maximum(V_norm, 1e-300), C, budget=budget)
+    else:
+        N = np.zeros(L, dtype=int)
+        for k in key_variables:
+            if target_rmse is None:
+                eps = rel_tol * abs(pilot.loc[k, "mean"])
+            else:
+                eps = target_rmse[k] if isinstance(target_rmse, dict) else target_rmse
+            if eps > 0:
+                N = np.maximum(N, optimal_samples(np.maximum(V[k], 1e-300), C, eps2=eps ** 2))
+
+    if verbose:
+        print(f"MLMC levels {[float(h) for h in grid_h[grid_variables[0]]]}: samples {[int(n) for n in N]}")
+
+    # 3. Top up each level to its sample count
+    for level in range(L):
+        extra = N[level] - samples[level]["n"]
+        if extra > 0:
+            add_samples(level, int(extra))
+
+    out_stats = mlmc_stats(samples, key_variables)
+    n_run = np.array([s["n"] for s in samples])
+    level_info = pd.DataFrame({
+        **{var: h for var, h in grid_h.items()},
+        "n_samples": n_run,
+        "cost": C,
+        **{f"var_{k}": [np.nanvar(s["fine"][k] - s["coarse"][k], ddof=1) for s in samples] for k in key_variables},
+    })
+
+    # Plain MC on the finest grid needs var(P_L) / se^2 samples of cost ~C[-1] for the same error
+    mlmc_cost = np.sum(n_run * C)
+    mc_cost = max(np.nanvar(samples[-1]["fine"][k], ddof=1) / max(out_stats.loc[k, "mean_se"] ** 2, 1e-300)
+                  for k in key_variables) * C[-1]
+    cost_ratio = mlmc_cost / mc_cost if mc_cost > 0 else np.nan
+
+    if verbose:
+        print(out_stats)
+        print(f"MLMC cost is {cost_ratio:.3g} of plain Monte Carlo on the finest grid")
+
+    return {"out_stats": out_stats, "levels": level_info, "out": pd.concat(runs, ignore_index=True),
+            "cost_ratio": cost_ratio}
@@ -0,0 +1,186 @@
+import numpy as np
+import pandas as pd
+
+from casegenmc.bayes_opt import MixedSpace
+from casegenmc.pareto import nondominated_sort, crowding_distance, pareto_mask
+from casegenmc.wrap_optimizers import MultiObjectiveWrapper, get_scipy_bounds
+
+
+def sbx_crossover(P1, P2, space, rng, eta=15, p_crossover=0.9):
+    """
+    Simulated binary crossover on the continuous coordinates and uniform crossover on the
+    categorical ones. P1 and P2 are parent arrays (n, d); returns two child arrays.
+    """
+    C1, C2 = P1.copy(), P2.copy()
+    n = len(P1)
+    mate = (rng.random(n) < p_crossover)[:, None]
+
+    u = rng.random(P1.shape)
+    beta = np.where(u <= 0.5, (2 * u) ** (1 / (eta + 1)), (1 / (2 * (1 - u))) ** (1 / (eta + 1)))
+    swap = mate & (rng.random(P1.shape) < 0.5)
+    cont = np.zeros(space.d, dtype=bool)
+    cont[space.cont] = True
+
+    do_sbx = swap & cont
+    c1 = 0.5 * ((1 + beta) * P1 + (1 - beta) * P2)
+    c2 = 0.5 * ((1 - beta) * P1 + (1 + beta) * P2)
+    C1 = np.where(do_sbx, c1, C1)
+    C2 = np.where(do_sbx, c2, C2)
+
+    do_swap = swap & ~cont
+    C1 = np.where(do_swap, P2, C1)
+    C2 = np.where(do_swap, P1, C2)
+    return C1, C2
+
+
+def polynomial_mutation(X, space, rng, eta=20, p_mutation=None):
+    """
+    Polynomial mutation of the continuous coordinates and random reset of the categorical ones,
+    each coordinate with probability p_mutation (default 1 / n_params).
+    """
+    X = X.copy()
+    p_mutation = 1.0 / space.d if p_mutation is None else p_mutation
+    lb, ub = space.bounds[:, 0], space.bounds[:, 1]
+
+    u = rng.random(X.shape)
+    delta = np.where(u < 0.5, (2 * u) ** (1 / (eta + 1)) - 1, 1 - (2 * (1 - u)) ** (1 / (eta + 1)))
+    mutate = rng.random(X.shape) < p_mutation
+    for i in space.cont:
+        X[mutate[:, i], i] += delta[mutate[:, i], i] * (ub[i] - lb[i])
+    for i, options in space.cat_map.items():
+        X[mutate[:, i], i] = rng.integers(0, len(options), mutate[:, i].sum())
+    return space.snap(np.clip(X, lb, ub))
+
+
+def rank_and_crowding(F):
+    """Non-dominated rank and crowding distance (within its front) of every row of F."""
+    ranks = nondominated_sort(F)
+    crowd = np.zeros(len(F))
+    for r in np.unique(ranks):
+        idx = np.flatnonzero(ranks == r)
+        crowd[idx] = crowding_distance(F[idx])
+    return ranks, crowd
+
+
+def tournament(ranks, crowd, n, rng):
+    """Binary tournament on (rank, crowding distance). Returns n selected indices."""
+    a = rng.integers(0, len(ranks), n)
+    b = rng.integers(0, len(ranks), n)
+    a_wins = (ranks[a] < ranks[b]) | ((ranks[a] == ranks[b]) & (crowd[a] >= crowd[b]))
+    return np.where(a_wins, a, b)
+
+
+def survival(F, n):
+    """Indices of the n survivors of F: whole fronts first, the last front cut by crowding distance."""
+    ranks, crowd = rank_and_crowding(F)
+    order = np.lexsort((-crowd, ranks))
+    return order[:n]
+
+
+def run_nsga2(model, variable_inputs, value_keys, fixed_inputs=None, sense=None, pop_size=40, n_gen=50,
+              eta_crossover=15, eta_mutation=20, p_crossover=0.9, p_mutation=None, archive_size=None,
+              parallel=False, num_cpus=None, batch_size=None, pool=None, vectorized=False, cache=None,
+              seed=None, verbose=True):
+    """
+    NSGA-II multi-objective optimization over the inputs in variable_inputs.
+
+    Bounds and options are read the same way as get_scipy_bounds, so mixed continuous and
+    categorical inputs are supported (SBX / polynomial mutation on continuous inputs, uniform
+    crossover / random reset on categorical ones). Each generation is evaluated in one call through
+    MultiObjectiveWrapper, so Ray, a CasePool, a vectorized model and an EvalCache all apply. An
+    archive of the non-dominated cases found in any generation is kept, so the result is the full
+    trade-off surface of the campaign.
+
+    Parameters
+    ----------
+    model : function
+        The model function to evaluate.
+    variable_inputs : dict
+        Input stack entries of the parameters to optimize.
+    value_keys : list of str
+        Output keys to optimize.
+    fixed_inputs : dict, optional
+        Constant parameters.
+    sense : list or dict, optional
+        "min"/"max" per objective. Default all "min".
+    pop_size : int, optional
+        Population size.
+    n_gen : int, optional
+        Number of generations after the initial population.
+    eta_crossover, eta_mutation : float, optional
+        Distribution indices of SBX crossover and polynomial mutation.
+    p_crossover : float, optional
+        Probability that a pair of parents is crossed.
+    p_mutation : float, optional
+        Per-coordinate mutation probability. Defaults to 1 / n_params.
+    archive_size : int, optional
+        Maximum size of the Pareto archive; the most crowded points are dropped first. Default unlimited.
+    parallel, num_cpus, batch_size, pool, vectorized, cache :
+        Evaluation settings passed to MultiObjectiveWrapper.
+    seed : int, optional
+        Random seed.
+
+    Returns
+    -------
+    dict with "front" (DataFrame of the archived Pareto cases), "population" (final population
+    with its "rank") and "out" (every evaluated case with a "generation" column).
+    """
+    rng = np.random.default_rng(seed)
+    fixed_inputs = fixed_inputs if fixed_inputs is not None else {}
+    bounds, cat_map = get_scipy_bounds(variable_inputs)
+    space = MixedSpace(bounds, cat_map)
+    wrapper = MultiObjectiveWrapper(model, value_keys, list(variable_inputs), fixed_inputs, cat_map=cat_map,
+                                    sense=sense, parallel=parallel, num_cpus=num_cpus, batch_size=batch_size,
+                                    vectorized=vectorized, cache=cache, pool=pool)
+    history = []
+
+    def evaluate(X, generation):
+        F, out = wrapper.evaluate_population(X.T, return_outputs=True)
+        out["generation"] = generation
+        history.append(out)
+        return F, out
+
+    def update_archive(archive, F, out):
+        ok = ~(F >= 1e12).any(axis=1)
+        F, out = F[ok], out[ok]
+        if archive is not None:
+            F = np.vstack([archive[0], F])
+            out = pd.concat([archive[1], out], ignore_index=True)
+        out = out.reset_index(drop=True)
+        keep = pareto_mask(F)
+        keep &= ~out[list(wrapper.variable_inputs)].astype(str).duplicated().to_numpy()
+        F, out = F[keep], out[keep].reset_index(drop=True)
+        while archive_size is not None and len(F) > archive_size:
+            drop = int(np.argmin(crowding_distance(F)))
+            F = np.delete(F, drop, axis=0)
+            out = out.drop(index=drop).reset_index(drop=True)
+        return F, out
+
+    X = space.random(pop_size, rng)
+    F, out = evaluate(X, 0)
+    archive = update_archive(None, F, out)
+
+    for gen in range(1, n_gen + 1):
+        ranks, crowd = rank_and_crowding(F)
+        n_pairs = (pop_size + 1) // 2
+        parents = tournament(ranks, crowd, 2 * n_pairs, rng)
+        C1, C2 = sbx_crossover(X[parents[:n_pairs]], X[parents[n_pairs:]], space, rng, eta_crossover,
+                               p_crossover)
+        children = polynomial_mutation(np.vstack([C1, C2])[:pop_size], space, rng, eta_mutation, p_mutation)
+
+        F_child, out_child = evaluate(children, gen)
+        archive = update_archive(archive, F_child, out_child)
+
+        X_all, F_all = np.vstack([X, children]), np.vstack([F, F_child])
+        survivors = survival(F_all, pop_size)
+        X, F = X_all[survivors], F_all[survivors]
+
+        if verbose:
+            print(f"NSGA-II generation {gen}: {len(archive[0])} cases on the Pareto front")
+
+    population = wrapper.decode_population(X.T)
+    population["rank"] = nondominated_sort(F)
+    for j, k in enumerate(wrapper.value_keys):
+        population[k] = np.where(F[:, j] >= 1e12, np.nan, F[:, j] * wrapper.signs[j])
+
+    return {"front": archive[1], "population": population, "out": pd.concat(history, ignore_index=True)}
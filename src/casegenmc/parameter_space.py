@@ -0,0 +1,415 @@
+import numpy as np
+import pandas as pd
+
+# Distributions of continuous parameters, in the order of their group codes (-1: held at the mean)
+UNC_TYPES = ["normal", "uniform", "exponential", "lognormal"]
+
+# Keys rebuilt from the arrays by to_stack(); every other key is kept verbatim
+_NUM_KEYS = {"mean", "unc", "unc_frac", "range", "bounds"}
+_CAT_KEYS = {"mean", "range", "prob"}
+
+
+def _none_or_float(v):
+    return np.nan if v is None else float(v)
+
+
+def _types(v):
+    """Python type of a scalar, or the types of a list's items, so to_stack() gives back the same types."""
+    if isinstance(v, (list, tuple, np.ndarray)):
+        return [type(x) for x in v]
+    return type(v)
+
+
+def _cast(t, v):
+    if v is None or (isinstance(v, float) and np.isnan(v)):
+        return None
+    if isinstance(t, list):
+        return [tt(x) for tt, x in zip(t, v)]
+    return t(v)
+
+
+def _uniform01(rng, size):
+    # np.random / RandomState name it random_sample, a Generator random
+    return rng.random_sample(size) if hasattr(rng, "random_sample") else rng.random(size)
+
+
+class ParameterSpace:
+    """
+    Compiled, array-backed form of a processed input stack.
+
+    Continuous parameters are held as arrays of means, uncertainties, ranges and bounds, grouped by
+    distribution, so a sampler draws each distribution group in one call. Categorical ("options")
+    parameters are integer-coded against a category table per parameter, with the selected range as
+    codes and a padded cumulative probability table. Build it once with ParameterSpace(input_stack)
+    and reuse it wherever a stack is sampled repeatedly; generate_samples and the common random
+    number functions accept either form. to_stack() gives back the dict form.
+    """
+
+    def __init__(self, input_stack):
+        """
+        :param input_stack: Processed input stack (see process_input_stack).
+        """
+        self.names = list(input_stack)
+        self._layout = {k: list(v) for k, v in input_stack.items()}
+
+        self.cat_names = [k for k, v in input_stack.items() if "options" in v]
+        categorical = set(self.cat_names)
+        self.num_names = [k for k in self.names if k not in categorical]
+        self.num_index = {k: i for i, k in enumerate(self.num_names)}
+        self.cat_index = {k: i for i, k in enumerate(self.cat_names)}
+        self._extras = {}
+
+        # continuous parameters
+        num = [input_stack[k] for k in self.num_names]
+        self.mean = np.array([float(v["mean"]) for v in num])
+        self.unc = np.array([_none_or_float(v.get("unc")) for v in num])
+        self.unc_frac = np.array([_none_or_float(v.get("unc_frac")) for v in num])
+        self.range_len = np.array([len(v["range"]) for v in num], dtype=int)
+        self.low = np.array([float(v["range"][0]) for v in num])
+        self.high = np.array([float(v["range"][1] if len(v["range"]) > 1 else v["range"][0]) for v in num])
+        self.bounds = np.array([[np.nan, np.nan] if v.get("bounds") is None else [float(b) for b in v["bounds"][:2]]
+                                for v in num]).reshape(-1, 2)
+        self.dist = np.array([UNC_TYPES.index(v["unc_type"]) if v.get("unc_type") in UNC_TYPES else -1
+                              for v in num], dtype=int)
+        self.grid_n = np.array([v.get("grid_n", 0) for v in num], dtype=int)
+        self.groups = {t: np.flatnonzero(self.dist == i) for i, t in enumerate(UNC_TYPES)}
+        self._num_types = {k: {kk: _types(v.get(kk)) for kk in _NUM_KEYS} for k, v in zip(self.num_names, num)}
+        for k, v in zip(self.num_names, num):
+            extras = {kk: vv for kk, vv in v.items() if kk not in _NUM_KEYS}
+            if len(v["range"]) > 2:
+                extras["range"] = v["range"]
+            self._extras[k] = extras
+
+        # categorical parameters
+        cat = [input_stack[k] for k in self.cat_names]
+        self.categories = [list(v["options"]) if isinstance(v["options"], (list, tuple, np.ndarray))
+                           else [v["options"]] for v in cat]
+        self.range_codes = [np.array([opts.index(r) for r in v["range"]], dtype=int)
+                            for opts, v in zip(self.categories, cat)]
+        self.prob = [np.asarray(v["prob"], dtype=float) for v in cat]
+        self.cat_mean = [v["mean"] for v in cat]
+        self.cat_unc_type = [v.get("unc_type") for v in cat]
+        # string options are carried as pandas Categoricals sharing one dtype (category table) per parameter
+        self.cat_dtypes = [pd.CategoricalDtype(opts) if all(isinstance(o, str) for o in opts)
+                           and len(set(opts)) == len(opts) else None for opts in self.categories]
+        for k, v in zip(self.cat_names, cat):
+            self._extras[k] = {kk: vv for kk, vv in v.items() if kk not in _CAT_KEYS}
+        self._build_cum_prob()
+
+    def _build_cum_prob(self):
+        """Cumulative probabilities over each parameter's range, padded with 1 to a common width."""
+        width = max([len(c) for c in self.range_codes], default=1)
+        self.cum_prob = np.ones((len(self.cat_names), width))
+        for j, p in enumerate(self.prob):
+            self.cum_prob[j, :len(p)] = np.cumsum(p)
+        self.range_size = np.array([len(c) for c in self.range_codes], dtype=int)
+
+    def __len__(self):
+        return len(self.names)
+
+    def __repr__(self):
+        groups = {t: len(g) for t, g in self.groups.items() if len(g)}
+        return f"ParameterSpace({len(self.num_names)} continuous {groups}, {len(self.cat_names)} categorical)"
+
+    # ------------------------------------------------------------------ dict form
+    def std(self, mean=None):
+        """Standard deviation of every continuous parameter: unc_frac * mean if set, else unc (or 0)."""
+        mean = self.mean if mean is None else mean
+        unc = np.where(np.isnan(self.unc), 0.0, self.unc)
+        return np.where(np.isnan(self.unc_frac), unc, self.unc_frac * mean)
+
+    def range_values(self, k):
+        """The selected range of parameter k as a list of values."""
+        if k in self.cat_index:
+            j = self.cat_index[k]
+            return [self.categories[j][c] for c in self.range_codes[j]]
+        if "range" in self._extras[k]:
+            return list(self._extras[k]["range"])
+        i = self.num_index[k]
+        return _cast(self._num_types[k]["range"], [self.low[i], self.high[i]][:self.range_len[i]])
+
+    def mean_value(self, k):
+        """The mean (reference value) of parameter k, with its type in the input stack."""
+        if k in self.cat_index:
+            return self.cat_mean[self.cat_index[k]]
+        return _cast(self._num_types[k]["mean"], self.mean[self.num_index[k]])
+
+    def to_stack(self):
+        """The dict form of the space, equal to the processed input stack it was built from."""
+        stack = {}
+        for k in self.names:
+            extras = self._extras[k]
+            if k in self.cat_index:
+                j = self.cat_index[k]
+                values = {"mean": self.cat_mean[j], "range": self.range_values(k), "prob": self.prob[j].copy()}
+            else:
+                i = self.num_index[k]
+                types = self._num_types[k]
+                values = {
+                    "mean": self.mean_value(k),
+                    "unc": _cast(types["unc"], self.unc[i]),
+                    "unc_frac": _cast(types["unc_frac"], self.unc_frac[i]),
+                    "range": self.range_values(k),
+                    "bounds": None if np.isnan(self.bounds[i, 0]) else _cast(types["bounds"], self.bounds[i]),
+                }
+            stack[k] = {kk: extras[kk] if kk in extras else values[kk] for kk in self._layout[k]}
+        return stack
+
+    # ------------------------------------------------------------------ columns
+    def _mean_column(self, k, n):
+        if k in self.cat_index:
+            j = self.cat_index[k]
+            return self._cat_constant(j, self.cat_mean[j], n)
+        return np.full(n, self.mean_value(k))
+
+    def _cat_constant(self, j, value, n, dtype=None):
+        """Categorical parameter j held at value, coded if value is one of its string options."""
+        if self.cat_dtypes[j] is not None and value in self.categories[j]:
+            return self._cat_column(j, np.full(n, self.categories[j].index(value)))
+        return np.full(n, value, dtype=dtype)
+
+    def _cat_column(self, j, codes):
+        """
+        Values of categorical parameter j for codes into its category table: a pandas Categorical
+        for string options, else an array of the option values.
+        """
+        if self.cat_dtypes[j] is not None:
+            return pd.Categorical.from_codes(codes, dtype=self.cat_dtypes[j])
+        return np.asarray(self.categories[j])[codes]
+
+    def _draw_cat_codes(self, cat_idx, u):
+        """Category codes of categorical parameters cat_idx for uniforms u (k, n), by their probabilities."""
+        idx = (u[:, :, None] >= self.cum_prob[cat_idx][:, None, :]).sum(axis=-1)
+        idx = np.minimum(idx, self.range_size[cat_idx][:, None] - 1)
+        return [self.range_codes[j][i] for j, i in zip(cat_idx, idx)]
+
+    def _float_block(self, num_sel, values, n):
+        """Appends the unsampled float-valued continuous parameters, held at their means, to a float block."""
+        drawn = set(num_sel.tolist())
+        rest = np.array([i for i, k in enumerate(self.num_names)
+                         if i not in drawn and issubclass(self._num_types[k]["mean"], float)], dtype=int)
+        if not len(rest):
+            return num_sel, values
+        return np.r_[num_sel, rest], np.vstack([values, np.broadcast_to(self.mean[rest, None], (len(rest), n))])
+
+    def _fill_means(self, columns, n, num_sel=()):
+        """Adds a mean column for every parameter not in columns nor in the continuous parameters num_sel."""
+        drawn = set(columns) | {self.num_names[i] for i in num_sel}
+        for k in self.names:
+            if k not in drawn:
+                columns[k] = self._mean_column(k, n)
+        return columns
+
+    def _frame(self, columns, first=(), block=None):
+        """
+        DataFrame of the columns, the parameters in first leading and the others in stack order.
+        block is an optional (num_sel, values (k, n)) of continuous parameters, added as one float block.
+        """
+        leading = set(first)
+        order = list(first) + [k for k in self.names if k not in leading]
+        if block is None or not len(block[0]):
+            return pd.DataFrame({k: columns[k] for k in order})
+        df = pd.DataFrame(block[1].T, columns=[self.num_names[i] for i in block[0]], copy=False)
+        if columns:
+            df = pd.concat([df, pd.DataFrame(columns, index=df.index)], axis=1)
+        return df[order]
+
+    def _selection(self, par_to_sample):
+        if par_to_sample is None:
+            return list(self.names)
+        if isinstance(par_to_sample, str):
+            par_to_sample = [par_to_sample]
+        selected = set(par_to_sample)
+        return [k for k in self.names if k in selected]
+
+    # ------------------------------------------------------------------ samplers
+    @staticmethod
+    def _standard_draws(t, rng, size):
+        """Standard normal (normal, lognormal), standard exponential or [0, 1) uniform draws."""
+        if t in ("normal", "lognormal"):
+            return rng.standard_normal(size)
+        if t == "exponential":
+            return rng.standard_exponential(size)
+        return _uniform01(rng, size)
+
+    def _scale(self, t, idx, z, mean, std):
+        """
+        Scales standard draws z (k, n) of the continuous parameters idx, all of distribution t, to
+        their means and standard deviations. A uniform parameter keeps its range width and is shifted
+        by the change of its mean.
+        """
+        m, s = mean[:, None], std[:, None]
+        if t == "normal":
+            return m + s * z
+        if t == "uniform":
+            low, high = self.low[idx, None], self.high[idx, None]
+            return low + (m - self.mean[idx, None]) + (high - low) * z
+        if t == "exponential":
+            return z / m
+        mean_log = np.log(m ** 2 / np.sqrt(s ** 2 + m ** 2))
+        sigma_log = np.sqrt(np.log(s ** 2 / m ** 2 + 1))
+        return np.exp(mean_log + sigma_log * z)
+
+    def sample_unc(self, n, par_to_sample=None, rng=None):
+        """Samples from each parameter's uncertainty distribution (generate_samples type="unc")."""
+        rng = np.random if rng is None else rng
+        sampled = self._selection(par_to_sample)
+        columns = {}
+        num_sel = np.array([self.num_index[k] for k in sampled if k in self.num_index], dtype=int)
+        mean, std, dist = self.mean[num_sel], self.std()[num_sel], self.dist[num_sel]
+
+        values = np.empty((len(num_sel), n))
+        for code, t in enumerate(UNC_TYPES):
+            g = np.flatnonzero(dist == code)
+            if len(g):
+                values[g] = self._scale(t, num_sel[g], self._standard_draws(t, rng, (len(g), n)), mean[g], std[g])
+        values[dist == -1] = mean[dist == -1, None]
+
+        cat_sel = np.array([self.cat_index[k] for k in sampled if k in self.cat_index], dtype=int)
+        if len(cat_sel):
+            codes = self._draw_cat_codes(cat_sel, _uniform01(rng, (len(cat_sel), n)))
+            for j, c in zip(cat_sel, codes):
+                columns[self.cat_names[j]] = self._cat_column(j, c)
+
+        num_sel, values = self._float_block(num_sel, values, n)
+        return self._frame(self._fill_means(columns, n, num_sel), first=sampled, block=(num_sel, values))
+
+    def sample_uniform(self, n, par_to_sample=None, rng=None):
+        """Samples uniformly over each parameter's range (generate_samples type="uniform")."""
+        rng = np.random if rng is None else rng
+        sampled = self._selection(par_to_sample)
+        columns = {}
+        num_sel = np.array([self.num_index[k] for k in sampled if k in self.num_index], dtype=int)
+        low, high = self.low[num_sel, None], self.high[num_sel, None]
+        values = low + (high - low) * _uniform01(rng, (len(num_sel), n))
+
+        cat_sel = np.array([self.cat_index[k] for k in sampled if k in self.cat_index], dtype=int)
+        if len(cat_sel):
+            u = _uniform01(rng, (len(cat_sel), n))
+            idx = np.minimum((u * self.range_size[cat_sel, None]).astype(int), self.range_size[cat_sel, None] - 1)
+            for j, i in zip(cat_sel, idx):
+                columns[self.cat_names[j]] = self._cat_column(j, self.range_codes[j][i])
+
+        num_sel, values = self._float_block(num_sel, values, n)
+        return self._frame(self._fill_means(columns, n, num_sel), first=sampled, block=(num_sel, values))
+
+    def grid_points(self, n, par_to_sample=None, grid_n=None, extremes=False):
+        """
+        Per-parameter value sets of a grid: the selected range of categorical parameters, and
+        linspace over the range (or range and mean for extremes) of continuous ones. The number of
+        points per continuous parameter is its "grid_n", or grid_n, estimated so that the grid has
+        about n points if not given.
+        """
+        sampled = self._selection(par_to_sample)
+        if grid_n is None:
+            option_ns = [self.range_size[self.cat_index[k]] for k in sampled if k in self.cat_index]
+            grid_ns = [self.grid_n[self.num_index[k]] for k in sampled
+                       if k in self.num_index and "grid_n" in self._extras[k]]
+            n_range_0 = sum(1 for k in sampled if k in self.num_index and self.range_len[self.num_index[k]] == 1)
+            n_dim_left = len(sampled) - len(option_ns) - len(grid_ns) - n_range_0
+            if n_dim_left > 0:
+                grid_n = max(2, round((n / (np.prod(option_ns) * np.prod(grid_ns))) ** (1 / n_dim_left)))
+            else:
+                grid_n = 2  # every dimension has its own size, grid_n is unused
+            grid_n = int(grid_n)
+
+        sets = {}
+        for k in sampled:
+            if k in self.cat_index:
+                j = self.cat_index[k]
+                sets[k] = self.range_values(k)
+            elif extremes:
+                sets[k] = np.unique(np.append(self.range_values(k), self.mean_value(k)))
+            else:
+                i = self.num_index[k]
+                if self.low[i] == self.high[i]:
+                    n_k = 1
+                elif "grid_n" in self._extras[k]:
+                    n_k = self.grid_n[i]
+                else:
+                    n_k = grid_n
+                sets[k] = np.linspace(self.low[i], self.high[i], n_k)
+        return sets
+
+    def sample_grid(self, n=1000, par_to_sample=None, grid_n=None, extremes=False):
+        """
+        Full-factorial grid (generate_samples type="grid"/"extremes"), the first parameter varying
+        slowest. A grid starts with the reference (mean) case; extremes do not.
+        """
+        sets = self.grid_points(n, par_to_sample, grid_n=grid_n, extremes=extremes)
+        sampled = list(sets)
+        shape = [len(v) for v in sets.values()]
+        idx = np.indices(shape).reshape(len(shape), -1) if shape else np.zeros((0, 1), dtype=int)
+        n_rows = idx.shape[1]
+        columns = {}
+        for d, k in enumerate(sampled):
+            if k in self.cat_index:
+                j = self.cat_index[k]
+                columns[k] = self._cat_column(j, self.range_codes[j][idx[d]])
+            else:
+                columns[k] = np.asarray(sets[k])[idx[d]]
+        columns = self._fill_means(columns, n_rows)
+
+        if extremes:
+            return self._frame(columns, first=sampled)
+
+        return pd.concat([self.reference_case(), self._frame(columns)], ignore_index=True)
+
+    def reference_case(self):
+        """One-row DataFrame of the means (the "estimate" case)."""
+        return self._frame(self._fill_means({}, 1))
+
+    def sample(self, type="unc", n=1000, par_to_sample=None, grid_n=None, rng=None):
+        """Samples of the given generate_samples type as a DataFrame."""
+        if type == "unc":
+            return self.sample_unc(n, par_to_sample, rng=rng)
+        if type == "uniform":
+            return self.sample_uniform(n, par_to_sample, rng=rng)
+        if type in ["grid", "extremes"]:
+            return self.sample_grid(n, par_to_sample, grid_n=grid_n, extremes=type == "extremes")
+        raise ValueError(f"Invalid type: {type}. Must be one of 'unc', 'uniform', 'grid', or 'extremes'.")
+
+    # ------------------------------------------------------------------ common random numbers
+    def draw_crn(self, n, rng=None):
+        """Standardized draws behind an "unc" sample, one block per distribution group (see draw_common_random_numbers)."""
+        rng = np.random.default_rng(rng)
+        crn = {}
+        normal = np.concatenate([self.groups["normal"], self.groups["lognormal"]])
+        for i, z in zip(normal, rng.standard_normal((len(normal), n))):
+            crn[self.num_names[i]] = z
+        for i, z in zip(self.groups["exponential"], rng.standard_exponential((len(self.groups["exponential"]), n))):
+            crn[self.num_names[i]] = z
+        uniform = [self.num_names[i] for i in self.groups["uniform"]]
+        uniform += [k for j, k in enumerate(self.cat_names) if self.cat_unc_type[j] == "choice"]
+        for k, u in zip(uniform, rng.random((len(uniform), n))):
+            crn[k] = u
+        return {k: crn[k] for k in self.names if k in crn}
+
+    def scale_crn(self, crn, n, means=None):
+        """Samples from common random numbers, with optional mean overrides (see scale_common_random_numbers)."""
+        means = {} if means is None else means
+        mean = self.mean.copy()
+        for k, m in means.items():
+            if k in self.num_index:
+                mean[self.num_index[k]] = m
+        std = self.std(mean)
+
+        samples = {}
+        for t, g in self.groups.items():
+            if len(g):
+                z = np.stack([crn[self.num_names[i]] for i in g])
+                for i, v in zip(g, self._scale(t, g, z, mean[g], std[g])):
+                    samples[self.num_names[i]] = v
+        for i in np.flatnonzero(self.dist == -1):
+            samples[self.num_names[i]] = np.full(n, mean[i])
+
+        draw = [j for j, k in enumerate(self.cat_names) if k not in means and self.cat_unc_type[j] == "choice"]
+        if draw:
+            u = np.stack([crn[self.cat_names[j]] for j in draw])
+            for j, codes in zip(draw, self._draw_cat_codes(np.array(draw), u)):
+                samples[self.cat_names[j]] = (self._cat_column(j, codes) if self.cat_dtypes[j] is not None
+                                              else np.asarray(self.categories[j], dtype=object)[codes])
+        for j, k in enumerate(self.cat_names):
+            if k not in samples:
+                samples[k] = self._cat_constant(j, means.get(k, self.cat_mean[j]), n, dtype=object)
+        return {k: samples[k] for k in self.names}
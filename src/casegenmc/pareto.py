@@ -0,0 +1,214 @@
+import os
+
+import numpy as np
+import pandas as pd
+
+
+def objective_matrix(values, sense=None):
+    """
+    Returns the objectives as a float array (n, m) to be minimized. `sense` is a list of "min"/"max"
+    per column (default all "min"); "max" columns are negated.
+    """
+    values = np.asarray(values, dtype=float)
+    if values.ndim == 1:
+        values = values[:, None]
+    if sense is None:
+        return values
+    if isinstance(sense, str):
+        sense = [sense] * values.shape[1]
+    if len(sense) != values.shape[1]:
+        raise ValueError(f"sense has {len(sense)} entries for {values.shape[1]} objectives")
+    for s in sense:
+        if s not in ["min", "max"]:
+            raise ValueError(f"sense must be 'min' or 'max', got {s}")
+    signs = np.array([-1.0 if s == "max" else 1.0 for s in sense])
+    return values * signs
+
+
+def dominated_by(A, B, block_size=2048):
+    """
+    For minimization arrays A (a, m) and B (b, m), returns a boolean array (b,) that is True where
+    B[j] is dominated by at least one row of A. A is processed in blocks to bound memory.
+    """
+    out = np.zeros(len(B), dtype=bool)
+    if len(A) == 0 or len(B) == 0:
+        return out
+    for start in range(0, len(A), block_size):
+        Ab = A[start:start + block_size, None, :]
+        le = np.all(Ab <= B[None, :, :], axis=-1)
+        lt = np.any(Ab < B[None, :, :], axis=-1)
+        out |= np.any(le & lt, axis=0)
+    return out
+
+
+def pareto_mask_2d(V):
+    """
+    O(n log n) non-dominated filter for two minimization objectives without NaN: sort by the first
+    objective (ties by the second) and keep the points that improve on the best second objective so
+    far. Exact duplicates of a front point are kept too.
+    """
+    order = np.lexsort((V[:, 1], V[:, 0]))
+    f1, f2 = V[order, 0], V[order, 1]
+    prev_min = np.minimum.accumulate(np.r_[np.inf, f2[:-1]])
+    on_front = f2 < prev_min
+
+    # a duplicate takes the status of the first row of its run of identical rows
+    new_run = np.r_[True, (f1[1:] != f1[:-1]) | (f2[1:] != f2[:-1])]
+    run_start = np.maximum.accumulate(np.where(new_run, np.arange(len(f1)), 0))
+    on_front = on_front[run_start]
+
+    mask = np.zeros(len(V), dtype=bool)
+    mask[order[on_front]] = True
+    return mask
+
+
+def pareto_mask(values, sense=None, block_size=2048, n_pivots=64):
+    """
+    Non-dominated filter for any number of objectives.
+
+    A point can only be dominated by a point with a strictly smaller sum of (scaled) objectives. The
+    points are first screened against a few low-sum pivots over the whole array. The survivors are
+    sorted by that sum and swept in blocks (a block-based Kung/skyline pass): each block is checked
+    against the front found so far and against itself, with vectorized comparisons. Rows with NaN
+    are never on the front. Two objectives use a sort-and-sweep pass instead (pareto_mask_2d).
+
+    Parameters
+    ----------
+    values : array_like (n, m)
+        Objective values.
+    sense : list of str, optional
+        "min" or "max" per objective. Default is all "min".
+    block_size : int, optional
+        Number of points per block. Memory scales with block_size**2 * m.
+    n_pivots : int, optional
+        Number of low-sum points used for the initial screening.
+
+    Returns
+    -------
+    np.ndarray of bool (n,), True for the non-dominated rows.
+    """
+    V = objective_matrix(values, sense)
+    n = len(V)
+    mask = np.zeros(n, dtype=bool)
+    valid = np.flatnonzero(~np.isnan(V).any(axis=1))
+    if len(valid) == 0:
+        return mask
+
+    Vv = V[valid]
+    if V.shape[1] == 2:
+        mask[valid[pareto_mask_2d(Vv)]] = True
+        return mask
+    if V.shape[1] == 1:
+        mask[valid[Vv[:, 0] == Vv[:, 0].min()]] = True
+        return mask
+
+    span = Vv.max(axis=0) - Vv.min(axis=0)
+    score = ((Vv - Vv.min(axis=0)) / np.where(span > 0, span, 1.0)).sum(axis=1)
+
+    if len(valid) > max(4 * block_size, n_pivots):
+        pivots = Vv[np.argpartition(score, n_pivots)[:n_pivots]]
+        keep = ~dominated_by(pivots, Vv, block_size)
+        valid, Vv, score = valid[keep], Vv[keep], score[keep]
+
+    order = np.argsort(score, kind="stable")
+    front_idx = []
+    front = np.empty((0, V.shape[1]))
+    for start in range(0, len(order), block_size):
+        idx = order[start:start + block_size]
+        P = Vv[idx]
+        keep = ~dominated_by(front, P, block_size)
+        idx, P = idx[keep], P[keep]
+        keep = ~dominated_by(P, P, block_size)
+        idx, P = idx[keep], P[keep]
+        front_idx.append(idx)
+        front = np.vstack([front, P])
+
+    mask[valid[np.concatenate(front_idx)]] = True
+    return mask
+
+
+def nondominated_sort(values, sense=None, max_rank=None, block_size=2048):
+    """
+    Non-dominated sorting ranks: 0 for the Pareto front, 1 for the front of the remaining points,
+    and so on. Rows with NaN, and rows beyond max_rank if given, get rank -1.
+    """
+    V = objective_matrix(values, sense)
+    ranks = np.full(len(V), -1, dtype=int)
+    remaining = np.flatnonzero(~np.isnan(V).any(axis=1))
+    rank = 0
+    while len(remaining) and (max_rank is None or rank <= max_rank):
+        on_front = pareto_mask(V[remaining], block_size=block_size)
+        ranks[remaining[on_front]] = rank
+        remaining = remaining[~on_front]
+        rank += 1
+    return ranks
+
+
+def crowding_distance(values):
+    """
+    NSGA-II crowding distance of the points of one front (minimization array (n, m)). Boundary
+    points get inf; larger values mean less crowded.
+    """
+    V = np.asarray(values, dtype=float)
+    n, m = V.shape
+    dist = np.zeros(n)
+    if n <= 2:
+        return np.full(n, np.inf)
+    for j in range(m):
+        order = np.argsort(V[:, j], kind="stable")
+        v = V[order, j]
+        span = v[-1] - v[0]
+        dist[order[0]] = dist[order[-1]] = np.inf
+        if span > 0:
+            dist[order[1:-1]] += (v[2:] - v[:-2]) / span
+    return dist
+
+
+def pareto_front_nd(df, objectives, sense=None, block_size=2048):
+    """
+    Pareto front of a DataFrame (e.g. run_cases output) over any number of objective columns.
+
+    :param df: DataFrame containing the objective columns.
+    :param objectives: List of column names.
+    :param sense: "min"/"max" per objective, as a list or a {column: sense} dict. Default all "min".
+    :return: DataFrame of the non-dominated rows.
+    """
+    if isinstance(sense, dict):
+        sense = [sense.get(o, "min") for o in objectives]
+    values = df[objectives].apply(pd.to_numeric, errors="coerce").to_numpy(dtype=float)
+    return df[pareto_mask(values, sense, block_size)]
+
+
+def pareto_front_chunked(source, objectives, sense=None, chunksize=1000000, columns=None, block_size=2048):
+    """
+    Pareto front of a result set too large for memory. Each chunk is reduced to its own front and
+    merged with the running front, so only the front is ever held.
+
+    :param source: Path of a CSV or Parquet file, or an iterable of DataFrames.
+    :param objectives: List of objective column names.
+    :param sense: "min"/"max" per objective, as a list or dict. Default all "min".
+    :param chunksize: Rows per chunk when reading a file.
+    :param columns: Columns to keep in the result (objectives are always read). Default all.
+    :return: DataFrame of the non-dominated rows.
+    """
+    usecols = None if columns is None else list(dict.fromkeys(list(columns) + list(objectives)))
+
+    if isinstance(source, (str, os.PathLike)):
+        if str(source).endswith(".parquet"):
+            import pyarrow.parquet as pq
+
+            pf = pq.ParquetFile(source)
+            chunks = (b.to_pandas() for b in pf.iter_batches(batch_size=chunksize, columns=usecols))
+        else:
+            chunks = pd.read_csv(source, chunksize=chunksize, usecols=usecols)
+    else:
+        chunks = source
+
+    front = None
+    for chunk in chunks:
+        if usecols is not None:
+            chunk = chunk[usecols]
+        chunk_front = pareto_front_nd(chunk, objectives, sense, block_size)
+        merged = chunk_front if front is None else pd.concat([front, chunk_front], ignore_index=True)
+        front = pareto_front_nd(merged, objectives, sense, block_size).reset_index(drop=True)
+    return front
@@ -0,0 +1,173 @@
+import functools
+import hashlib
+import importlib
+import inspect
+import os
+import pickle
+import shutil
+import uuid
+
+import matplotlib.pyplot as plt
+import numpy as np
+import pandas as pd
+
+# Bump to invalidate every cached figure, e.g. after changing a plotting helper outside plotting_base.
+PLOT_CACHE_VERSION = 1
+
+# Modules whose helpers (label formatting, styles) every figure goes through; their sources are part
+# of every key, next to the package version.
+HELPER_MODULES = ("casegenmc.util", "casegenmc.tex_plots", "casegenmc.plotting_base")
+
+
+@functools.lru_cache(maxsize=None)
+def _source_digest(path):
+    with open(path, "rb") as f:
+        return hashlib.blake2b(f.read(), digest_size=16).hexdigest()
+
+
+@functools.lru_cache(maxsize=None)
+def _helpers_digest():
+    from casegenmc import __version__
+    h = hashlib.blake2b(__version__.encode(), digest_size=16)
+    for name in HELPER_MODULES:
+        src = inspect.getsourcefile(importlib.import_module(name))
+        if src is not None:
+            h.update(_source_digest(src).encode())
+    return h.hexdigest()
+
+
+def _update_hash(h, obj):
+    if isinstance(obj, pd.DataFrame):
+        h.update(repr((list(obj.columns), [str(t) for t in obj.dtypes])).encode())
+        try:
+            h.update(pd.util.hash_pandas_object(obj, index=True).to_numpy().tobytes())
+        except TypeError:  # unhashable cells, e.g. lists
+            h.update(pickle.dumps(obj))
+    elif isinstance(obj, pd.Series):
+        _update_hash(h, obj.to_frame())
+    elif isinstance(obj, np.ndarray):
+        h.update(repr((obj.dtype.str, obj.shape)).encode())
+        h.update(np.ascontiguousarray(obj).tobytes() if obj.dtype != object else pickle.dumps(obj))
+    elif isinstance(obj, (list, tuple)):
+        h.update(f"{type(obj).__name__}{len(obj)}".encode())
+        for o in obj:
+            _update_hash(h, o)
+    elif isinstance(obj, dict):
+        h.update(f"dict{len(obj)}".encode())
+        for k, v in obj.items():
+            _update_hash(h, k)
+            _update_hash(h, v)
+    else:
+        h.update(repr(obj).encode())
+
+
+def plot_job_key(func, args, data_folder=None):
+    """
+    Content hash of a figure job (func, args): the function, the source file it is defined in and
+    those of the HELPER_MODULES, the package version, the data and parameters passed to it (the
+    output folder excluded), the current matplotlib rcParams and PLOT_CACHE_VERSION.
+    """
+    h = hashlib.blake2b(digest_size=20)
+    h.update(f"{PLOT_CACHE_VERSION}:{func.__module__}.{func.__qualname__}".encode())
+    h.update(_helpers_digest().encode())
+    src = inspect.getsourcefile(func)
+    if src is not None:
+        h.update(_source_digest(src).encode())
+    _update_hash(h, [None if isinstance(a, str) and a == data_folder else a for a in args])
+    h.update(repr(sorted((k, repr(v)) for k, v in plt.rcParams.items() if k != "backend")).encode())
+    return h.hexdigest()
+
+
+def _replace_folder(args, data_folder, folder):
+    return tuple(folder if isinstance(a, str) and a == data_folder else a for a in args)
+
+
+def _copy_files(src, dst):
+    os.makedirs(dst, exist_ok=True)
+    for name in os.listdir(src):
+        shutil.copy2(os.path.join(src, name), os.path.join(dst, name))
+
+
+def render_to_cache(func, args, data_folder, entry):
+    """
+    Runs a figure job with its output folder redirected to a new cache entry, then copies the saved
+    files to data_folder. Module level, so it can run in a PlotRenderer worker.
+    """
+    tmp = f"{entry}.tmp-{uuid.uuid4().hex}"
+    os.makedirs(tmp)
+    try:
+        func(*_replace_folder(args, data_folder, tmp))
+    except BaseException:
+        shutil.rmtree(tmp, ignore_errors=True)
+        raise
+    finally:
+        plt.close("all")
+    try:
+        os.rename(tmp, entry)
+    except OSError:  # the same figure was rendered concurrently; keep the first one
+        shutil.rmtree(tmp, ignore_errors=True)
+    _copy_files(entry, data_folder)
+
+
+class PlotCache:
+    """
+    Content-addressed store of rendered figures.
+
+    Every figure job is keyed on its input columns, parameters and style settings (plot_job_key).
+    When a job's key is already stored its files are copied into the output folder instead of being
+    drawn again. The cache lives outside the analysis folders (run_analysis wipes those), by default
+    in <data_folder>/.plot_cache.
+    """
+
+    def __init__(self, cache_dir):
+        self.cache_dir = cache_dir
+        os.makedirs(cache_dir, exist_ok=True)
+        self.hits = 0
+        self.misses = 0
+
+    def entry(self, key):
+        return os.path.join(self.cache_dir, key)
+
+    def run(self, jobs, data_folder, renderer=None):
+        """
+        Runs figure jobs that all write to data_folder, reusing cached figures. Jobs that miss the
+        cache are drawn here or, with a renderer, queued to its workers.
+
+        :return: Number of figures reused from the cache.
+        """
+        os.makedirs(data_folder, exist_ok=True)
+        misses = []
+        reused = 0
+        for func, args in jobs:
+            entry = self.entry(plot_job_key(func, args, data_folder))
+            if os.path.isdir(entry):
+                _copy_files(entry, data_folder)
+                reused += 1
+            else:
+                misses.append((render_to_cache, (func, args, data_folder, entry)))
+        self.hits += reused
+        self.misses += len(misses)
+
+        if renderer is not None:
+            renderer.submit(misses)
+        else:
+            for func, args in misses:
+                func(*args)
+        return reused
+
+    def clear(self):
+        """Deletes every cached figure."""
+        shutil.rmtree(self.cache_dir, ignore_errors=True)
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+
+def get_plot_cache(cache, data_folder):
+    """
+    Resolves the plot_cache argument of run_analysis: a PlotCache, a cache directory, True for
+    <data_folder>/.plot_cache, or None/False for no cache.
+    """
+    if cache is None or cache is False or isinstance(cache, PlotCache):
+        return cache or None
+    if cache is True:
+        cache = os.path.join(data_folder, ".plot_cache")
+    return PlotCache(cache)
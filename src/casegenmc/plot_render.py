@@ -0,0 +1,93 @@
+import os
+import warnings
+from concurrent.futures import ProcessPoolExecutor, wait
+
+import matplotlib
+import matplotlib.pyplot as plt
+
+
+def _init_plot_worker(rc_params):
+    matplotlib.use("Agg")
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore")
+        for k, v in rc_params.items():
+            try:
+                plt.rcParams[k] = v
+            except (KeyError, ValueError):
+                pass
+
+
+def _run_plot_job(func, args):
+    try:
+        func(*args)
+    finally:
+        plt.close("all")
+
+
+class PlotRenderer:
+    """
+    Process pool that draws queued figure jobs with the Agg backend.
+
+    Jobs are (func, args) tuples of module-level plotting functions, e.g. from basic_plot_jobs.
+    The workers start with the caller's rcParams (fonts, figure size, usetex), so the figures look
+    the same as when drawn in the calling process. submit() returns immediately; wait() blocks
+    until all queued figures are saved and re-raises the first failure.
+    """
+
+    def __init__(self, n_workers=None):
+        """
+        :param n_workers: Number of worker processes. Defaults to the CPU count.
+        """
+        self.n_workers = n_workers if n_workers else os.cpu_count()
+        rc_params = {k: v for k, v in plt.rcParams.items() if k != "backend"}
+        self.executor = ProcessPoolExecutor(max_workers=self.n_workers, initializer=_init_plot_worker,
+                                            initargs=(rc_params,))
+        self.futures = []
+
+    def submit(self, jobs):
+        for func, args in jobs:
+            self.futures.append(self.executor.submit(_run_plot_job, func, args))
+
+    @property
+    def pending(self):
+        return sum(not f.done() for f in self.futures)
+
+    def wait(self, verbose=True):
+        """Blocks until every submitted figure is drawn. Re-raises the first failed job."""
+        if verbose and self.pending:
+            print(f"Waiting for {self.pending} plot jobs...")
+        futures, self.futures = self.futures, []
+        wait(futures)
+        for f in futures:
+            if f.exception() is not None:
+                raise f.exception()
+
+    def close(self):
+        if self.executor is not None:
+            self.wait(verbose=False)
+            self.executor.shutdown()
+            self.executor = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+# Renderer shared by run_analysis calls, so asynchronous plots can be awaited later.
+_RENDERER = None
+
+
+def get_plot_renderer(n_workers=None):
+    """Returns the shared PlotRenderer, starting it on first use."""
+    global _RENDERER
+    if _RENDERER is None or _RENDERER.executor is None:
+        _RENDERER = PlotRenderer(n_workers=n_workers)
+    return _RENDERER
+
+
+def wait_for_plots(verbose=True):
+    """Blocks until every figure queued by run_analysis(..., async_plots=True) is saved."""
+    if _RENDERER is not None:
+        _RENDERER.wait(verbose=verbose)
@@ -14,10 +14,64 @@ from jinja2 import Template
 from casegenmc.plotting_util import generate_xticks
 from casegenmc.plotting_util import *
 from casegenmc.tex_plots import str_latex, set_latex_labels
+from casegenmc.results_io import load_results
 from os.path import join as pjoin
 
 
-def par2_contours(df, x_name, y_name, z_names, zero_lvl="value", **kwargs):
+def grid_xyz(x_data, y_data, z_data, bins=None, agg="mean"):
+    """
+    Scatters (x, y, z) samples into a 2D grid for imshow/contour.
+
+    With bins=None the grid axes are the unique x and y values (a regular-grid analysis) and every
+    sample goes to its cell through np.unique(..., return_inverse=True). For scattered, non-grid
+    samples pass bins (int, (nx, ny), or "auto") to aggregate z over equal-width bins instead; the
+    axes are then the bin centers. Cells with several samples are aggregated with agg ("mean", "min",
+    "max" or "count"); empty cells are NaN.
+
+    :return: xi_lin (nx,), yi_lin (ny,), zi (ny, nx)
+    """
+    x_data = np.asarray(x_data, dtype=float)
+    y_data = np.asarray(y_data, dtype=float)
+    z_data = np.asarray(z_data, dtype=float)
+
+    if isinstance(bins, str) and bins == "auto":
+        n_x, n_y = len(np.unique(x_data)), len(np.unique(y_data))
+        # a full grid has about one sample per cell; scattered samples would leave it mostly empty
+        bins = None if n_x * n_y <= 4 * len(x_data) else max(2, int(np.sqrt(len(x_data) / 4)))
+
+    if bins is None:
+        xi_lin, ix = np.unique(x_data, return_inverse=True)
+        yi_lin, iy = np.unique(y_data, return_inverse=True)
+    else:
+        nbx, nby = (bins, bins) if np.isscalar(bins) else bins
+        x_edges = np.linspace(np.nanmin(x_data), np.nanmax(x_data), nbx + 1)
+        y_edges = np.linspace(np.nanmin(y_data), np.nanmax(y_data), nby + 1)
+        xi_lin, yi_lin = 0.5 * (x_edges[1:] + x_edges[:-1]), 0.5 * (y_edges[1:] + y_edges[:-1])
+        ix = np.clip(np.searchsorted(x_edges, x_data, side="right") - 1, 0, nbx - 1)
+        iy = np.clip(np.searchsorted(y_edges, y_data, side="right") - 1, 0, nby - 1)
+
+    nx, ny = len(xi_lin), len(yi_lin)
+    ok = ~np.isnan(z_data)
+    flat = (iy * nx + ix)[ok]
+    z_ok = z_data[ok]
+    count = np.bincount(flat, minlength=nx * ny)
+
+    if agg == "mean":
+        zi = np.bincount(flat, weights=z_ok, minlength=nx * ny) / np.where(count > 0, count, 1)
+    elif agg == "count":
+        zi = count.astype(float)
+    elif agg in ["min", "max"]:
+        zi = np.full(nx * ny, np.inf if agg == "min" else -np.inf)
+        (np.minimum if agg == "min" else np.maximum).at(zi, flat, z_ok)
+    else:
+        raise ValueError("agg must be 'mean', 'min', 'max' or 'count'")
+
+    if agg != "count":
+        zi = np.where(count > 0, zi, np.nan)
+    return xi_lin, yi_lin, zi.reshape(ny, nx)
+
+
+def par2_contours(df, x_name, y_name, z_names, zero_lvl="value", bins=None, agg="mean", **kwargs):
     """
     Plot contours of a 2D parameter space. The first element must be the reference point.
 
@@ -26,6 +80,8 @@ def par2_contours(df, x_name, y_name, z_names, zero_lvl="value", **kwargs):
     :param y_name: Name of the column in the DataFrame representing the y-axis data.
     :param z_names: List of names of the columns in the DataFrame representing the z-axis data.
     :param zero_lvl: Method to normalize z data. Options: "value", "mean", "median", "0-ref". Default: "value".
+    :param bins: None to grid on the unique x and y values, or int, (nx, ny) or "auto" to bin scattered samples (see grid_xyz).
+    :param agg: Aggregation of samples sharing a cell: "mean", "min", "max" or "count". Default: "mean".
     :param kwargs: Additional keyword arguments to pass to the plotting function.
     :return: Tuple containing the figure and axis of the contour plot.
 
@@ -51,8 +107,6 @@ def par2_contours(df, x_name, y_name, z_names, zero_lvl="value", **kwargs):
     linestyles = ['solid', 'dashed', 'dashdot', 'dotted']
     if len(z_names) > len(linestyles):
         raise ValueError('Too many z_names to plot. Not enough linestyles.')
-    samples = len(np.unique(x_data))
-
     for iz, z_name in enumerate(z_names):
         z_data = df[z_name].values
         z_data = vectorized_roundSF(z_data, 5)
@@ -62,42 +116,8 @@ def par2_contours(df, x_name, y_name, z_names, zero_lvl="value", **kwargs):
 
         ax = plt.gca()
 
-        # Create a grid to interpolate the data onto
-        if 1 == 0:
-
-            xi_lin, yi_lin = np.linspace(x_data.min(), x_data.max(), samples), np.linspace(y_data.min(),
-                                                                                           y_data.max(),
-                                                                                           samples)
-
-            xi, yi = np.meshgrid(xi_lin, yi_lin)
-
-            # Interpolate the z_data onto the grid
-            zi = scipy.interpolate.griddata((x_data, y_data), z_data, (xi, yi),
-                                            method='linear')
-        else:
-            # create the image by arranging the data in a grid
-            # drop the reference point
-            xi_lin, yi_lin = np.unique(x_data), np.unique(y_data)
-
-            # convert the x_data and y_data to
-
-            # sort the xi_lin and yi_lin
-            xi_lin = np.sort(xi_lin)
-            yi_lin = np.sort(yi_lin)
-
-            xi, yi = np.meshgrid(xi_lin, yi_lin)
-            zi = np.zeros((len(xi_lin), len(yi_lin)))
-
-            for i, x in enumerate(xi_lin):
-                for j, y in enumerate(yi_lin):
-                    # print(x, y)
-                    # print(z_data[(x_data == roundSF(x,5)) & (y_data == roundSF(y,5))])
-
-                    found_element = z_data[(x_data == roundSF(
-                        x, 5)) & (y_data == roundSF(y, 5))]
-                    if len(found_element) == 0:
-                        found_element = np.nan
-                    zi[j, i] = found_element
+        # Arrange the data in a grid
+        xi_lin, yi_lin, zi = grid_xyz(x_data, y_data, z_data, bins=bins, agg=agg)
 
         # Create the contour plot
         if zero_lvl == "value":
@@ -108,14 +128,14 @@ def par2_contours(df, x_name, y_name, z_names, zero_lvl="value", **kwargs):
 
             vmin, vmax = np.nanpercentile(zi, 4), np.nanpercentile(zi, 96)
         elif zero_lvl == 'mean':
-            zi = np.divide(zi - np.mean(zi), np.mean(zi))
+            zi = np.divide(zi - np.nanmean(zi), np.nanmean(zi))
             max_val = np.max(
                 np.abs([np.nanpercentile(zi, 5), np.nanpercentile(zi, 95)]))
             cmap_type = 'RdBu_r'
             color_labl = "Fractional from mean point"
             vmin, vmax = -max_val, max_val
         elif zero_lvl == 'median':
-            zi = np.divide(zi - np.median(zi), np.median(zi))
+            zi = np.divide(zi - np.nanmedian(zi), np.nanmedian(zi))
             max_val = np.max(
                 np.abs([np.nanpercentile(zi, 5), np.nanpercentile(zi, 95)]))
             cmap_type = 'RdBu_r'
@@ -149,8 +169,8 @@ def par2_contours(df, x_name, y_name, z_names, zero_lvl="value", **kwargs):
                 plt.gcf().subplots_adjust(bottom=0.3, top=.7)
 
                 # set the x and y limits
-                plt.xlim(0, samples - 2)
-                plt.ylim(0, samples - 2)
+                plt.xlim(0, len(xi_lin) - 1)
+                plt.ylim(0, len(yi_lin) - 1)
 
             else:
                 line1 = mlines.Line2D([], [], color='k', linewidth=0.5, linestyle=linestyles[iz], label=str_latex(
@@ -266,16 +286,99 @@ def minYforBinnedX(dfS, x, y, num_bins=20):
     return min_y_for_each_bin
 
 
-def scatterGroupedColor(df, x, y, group_by=None, logx=True, logy=True, pareto=True, **kwargs):
+# Above this many rows, scatter plots are drawn as density images (see density_scatter).
+DENSITY_SCATTER_ROWS = 200000
+
+
+def use_density(n_rows, density=None, *columns):
+    """
+    density=None switches to density rendering above DENSITY_SCATTER_ROWS rows. Density images need
+    numeric axes, so it is off if any of the given columns (e.g. a string option) is not numeric.
+    """
+    if not all(pd.api.types.is_numeric_dtype(c) for c in columns):
+        return False
+    return n_rows > DENSITY_SCATTER_ROWS if density is None else density
+
+
+def density_scatter(ax, xs, ys, colors, bins=400, logx=False, logy=False, log_density=True):
+    """
+    Draws one or more point clouds as a binned density image instead of individual markers, so the
+    cost scales with the number of pixels rather than rows.
+
+    Each cloud (group) is binned with np.histogram2d on shared edges. A cell's color is the mix of the
+    group colors weighted by their counts, and its opacity grows with the total count (log-scaled
+    by default). Empty cells are transparent.
+
+    :param ax: Axes to draw on.
+    :param xs, ys: Lists of x and y arrays, one pair per group.
+    :param colors: One matplotlib color per group.
+    :param bins: Number of bins per axis, or (nx, ny).
+    :param logx, logy: Use log-spaced bins (for log axes); non-positive values are dropped.
+    :param log_density: Scale opacity with log(1 + count) instead of count.
+    :return: The image artist.
+    """
+    from matplotlib.colors import to_rgba
+
+    xs = [np.asarray(x, dtype=float) for x in xs]
+    ys = [np.asarray(y, dtype=float) for y in ys]
+    keep = [np.isfinite(x) & np.isfinite(y) & ((x > 0) if logx else True) & ((y > 0) if logy else True)
+            for x, y in zip(xs, ys)]
+    xs = [x[k] for x, k in zip(xs, keep)]
+    ys = [y[k] for y, k in zip(ys, keep)]
+    all_x, all_y = np.concatenate(xs), np.concatenate(ys)
+    if len(all_x) == 0:
+        return None
+
+    nbx, nby = (bins, bins) if np.isscalar(bins) else bins
+
+    def edges(v, n, log):
+        lo, hi = v.min(), v.max()
+        if hi == lo:
+            lo, hi = (lo / 2, hi * 2) if log else (lo - 0.5, hi + 0.5)
+        return np.geomspace(lo, hi, n + 1) if log else np.linspace(lo, hi, n + 1)
+
+    x_edges, y_edges = edges(all_x, nbx, logx), edges(all_y, nby, logy)
+
+    counts = np.stack([np.histogram2d(x, y, bins=[x_edges, y_edges])[0] for x, y in zip(xs, ys)])
+    total = counts.sum(axis=0)
+    rgb = np.array([to_rgba(c)[:3] for c in colors])
+    mix = np.einsum("gij,gc->ijc", counts, rgb) / np.where(total > 0, total, 1)[..., None]
+    dens = np.log1p(total) / np.log1p(total.max()) if log_density else total / total.max()
+    alpha = np.where(total > 0, 0.25 + 0.75 * dens, 0.0)
+    rgba = np.concatenate([mix, alpha[..., None]], axis=-1).transpose(1, 0, 2)  # (ny, nx, 4)
+
+    try:
+        im = ax.pcolormesh(x_edges, y_edges, rgba, shading="flat")
+    except (TypeError, ValueError):
+        # Matplotlib < 3.8 has no RGBA pcolormesh; fall back to an image (exact on linear axes)
+        im = ax.imshow(rgba, origin="lower", aspect="auto", interpolation="nearest",
+                       extent=(x_edges[0], x_edges[-1], y_edges[0], y_edges[-1]))
+    if logx:
+        ax.set_xscale("log")
+    if logy:
+        ax.set_yscale("log")
+    return im
+
+
+def scatterGroupedColor(df, x, y, group_by=None, logx=True, logy=True, pareto=True, density=None, bins=400,
+                        **kwargs):
     """
     Plot a histogram of all the columns of a 2D array.
+
+    With density=True (automatic above DENSITY_SCATTER_ROWS rows) the points are drawn as a binned
+    density image with one color channel per group, see density_scatter.
     """
+    density = use_density(len(df), density, df[x], df[y])
 
     fig, ax = plt.subplots(figsize=(4, 4))
 
     if group_by is None:
         fig, ax = plt.subplots()
-        ax.scatter(df[x].values, df[y].values, **kwargs)
+        if density:
+            density_scatter(ax, [df[x].values], [df[y].values], [kwargs.get("color", kwargs.get("c", "k"))],
+                            bins=bins, logx=logx, logy=logy)
+        else:
+            ax.scatter(df[x].values, df[y].values, **kwargs)
         plt.xlabel(str_latex(x))
     else:
         group_unq = df[group_by].unique()
@@ -293,10 +396,20 @@ def scatterGroupedColor(df, x, y, group_by=None, logx=True, logy=True, pareto=Tr
         elif len(group_unq) <= 3:
             colors = ["r", "b", "g"]
 
+        if density:
+            group_codes = pd.Categorical(df[group_by], categories=group_unq).codes
+            density_scatter(ax, [df[x].values[group_codes == i] for i in range(len(group_unq))],
+                            [df[y].values[group_codes == i] for i in range(len(group_unq))], colors[:len(group_unq)],
+                            bins=bins, logx=logx, logy=logy)
+
         for i, group in enumerate(group_unq):
             df_selection = df[df[group_by] == group]
-            ax.scatter(df_selection[x].values, df_selection[y].values, label=group_by + ": " + str(group), color=colors[i], s=.2,
-                       marker='o', **kwargs)
+            if density:
+                # empty scatter keeps the legend entry of the group
+                ax.scatter([], [], label=group_by + ": " + str(group), color=colors[i], s=.2, marker='o')
+            else:
+                ax.scatter(df_selection[x].values, df_selection[y].values, label=group_by + ": " + str(group),
+                           color=colors[i], s=.2, marker='o', **kwargs)
 
             # if pareto: # find the pareto front
             # sort the data by x
@@ -308,10 +421,10 @@ def scatterGroupedColor(df, x, y, group_by=None, logx=True, logy=True, pareto=Tr
                                                                                                                    'Minimum'),
                     lw=2)
 
-        plt.legend(fontsize=8)
+        # loc="best" scans every mesh cell of a density image
+        plt.legend(fontsize=8, loc="upper left" if density else "best")
 
-        set_latex_labels(ax, str_latex(x), str_latex(
-            y), str_latex("Grouped by: " + str_latex(group_by)))
+        set_latex_labels(ax, x, y, "Grouped by: " + group_by)
 
         if logx:
             plt.xscale("log")
@@ -491,62 +604,143 @@ def subselect_df_ND(df: pd.DataFrame, columns_to_exclude: list) -> pd.DataFrame:
 
 
 def load_summary_data(data_folder):
-    df = pd.read_csv(pjoin(data_folder, "summary.csv"))
-    # create a dictionary for the head data (variable name, function, unit)
-    if df.loc[0, "Data Type"] == "Function":
-        col_data = df.iloc[[0, 1]]
-    else:
+    file_path = pjoin(data_folder, "summary.csv")
+    # the head data (variable name, function, unit) are the two rows under the header
+    col_data = pd.read_csv(file_path, nrows=2)
+    if col_data.loc[0, "Data Type"] != "Function":
         raise ValueError(
             "The summary.csv does not contain Function and Unit information.")
 
-    # drop the "Function" and "Unit" rows
-    df = df.drop([0, 1]).reset_index(drop=True)
-
-    # convert all the data to float where possible
-    for col in df.columns:
-        try:
-            df[col] = df[col].astype(float)
-        except:
-            pass
+    # the data rows are parsed on their own, so numeric columns come out as float directly
+    df = load_results(file_path, skiprows=[1, 2])
 
     return df, col_data
 
 
-def load_summary_data_fast(data_folder, metadata_rows=0, file_name="summary.csv"):
+def load_summary_data_fast(data_folder, metadata_rows=0, file_name="summary.csv", key_column="Energy System LCOE",
+                           sort_by="_id", columns=None, dtypes=None):
+    """
+    Loads a summary file with load_results, skipping the two metadata rows under the header.
+
+    :param metadata_rows: Number of leading lines returned, split on commas, as metadata.
+    :param key_column: Output whose inf rows (failed cases) are reported and dropped. Skipped if absent.
+    :param sort_by: Column to sort the rows by. Skipped if absent.
+    :param columns: Columns to read. Default all.
+    :param dtypes: {column: dtype} of the columns, see load_results.
+    :return: DataFrame and list of metadata rows.
+    """
     file_path = pjoin(data_folder, file_name)
 
-    # Load the CSV file skipping metadata rows
-    df = pd.read_csv(file_path, skiprows=[
-                     1, 2], header=0, engine='c', on_bad_lines='skip')
-    print(df.head())
-    # Read the metadata rows separately
     metadata = []
-    with open(file_path, "r") as file:
-        for i, line in enumerate(file):
-            if i < metadata_rows:
+    if metadata_rows:
+        with open(file_path, "r") as file:
+            for i, line in zip(range(metadata_rows), file):
                 metadata.append(line.strip().split(','))
-            else:
-                break
 
-    summary_data = {"infs": np.sum(np.isinf(df['Energy System LCOE'].values)),
-                    "nans": np.sum(np.isnan(df['Energy System LCOE'].values)),
-                    "total": len(df['Energy System LCOE'].values)}
+    # Load the CSV file skipping metadata rows
+    df = load_results(file_path, columns=columns, dtypes=dtypes, skiprows=[1, 2], on_bad_lines='skip')
+    print(df.head())
 
-    # sort by _id
-    df = df.sort_values(by=['_id'], ).reset_index(drop=True)
+    if sort_by in df.columns:
+        df = df.sort_values(by=[sort_by], ).reset_index(drop=True)
 
-    if np.any(df['Energy System LCOE'] == np.inf):
-        print("Summary Data")
-        print(summary_data)
-        print("DROPPING infs - errors likely")
-        df = df[df['Energy System LCOE'] != np.inf]
+    if key_column in df.columns:
+        key_values = df[key_column].to_numpy(dtype=float)
+        summary_data = {"infs": np.sum(np.isinf(key_values)),
+                        "nans": np.sum(np.isnan(key_values)),
+                        "total": len(key_values)}
+
+        if np.any(key_values == np.inf):
+            print("Summary Data")
+            print(summary_data)
+            print("DROPPING infs - errors likely")
+            df = df[df[key_column] != np.inf]
     return df, metadata
 
 
-def parallel_coordinates_plot(df, columnsToDisplay=None, colorBy=None, log_color=False, colorscale='Viridis', **kwargs):
+# Default row cap of the parallel coordinates HTML written by basic_plot_set.
+PARCOORDS_MAX_ROWS = 20000
+
+
+def downsample_rows(df, max_rows, columns=None, stratify_by=None, objectives=None, sense=None, n_strata=20, seed=0):
+    """
+    Selects at most max_rows row positions of df for display, keeping what matters in a sweep.
+
+    Always kept: the first row (the reference case), the rows holding the min and max of every numeric
+    column in `columns`, and the Pareto front of `objectives` (thinned by crowding distance if it alone
+    exceeds half the cap). The rest of the budget is a stratified random sample over quantile bins of
+    `stratify_by`, so its distribution is preserved.
+
+    :return: Sorted array of row positions.
+    """
+    from casegenmc.pareto import pareto_mask, crowding_distance
+
+    n = len(df)
+    if n <= max_rows:
+        return np.arange(n)
+    rng = np.random.default_rng(seed)
+    columns = list(df.columns) if columns is None else list(columns)
+
+    keep = np.zeros(n, dtype=bool)
+    keep[0] = True
+    for col in columns:
+        vals = pd.to_numeric(df[col], errors="coerce").to_numpy(dtype=float) if pd.api.types.is_numeric_dtype(
+            df[col]) else None
+        if vals is not None and np.isfinite(vals).any():
+            keep[np.nanargmin(vals)] = keep[np.nanargmax(vals)] = True
+
+    if objectives:
+        if isinstance(sense, dict):
+            sense = [sense.get(o, "min") for o in objectives]
+        values = df[list(objectives)].apply(pd.to_numeric, errors="coerce").to_numpy(dtype=float)
+        front = np.flatnonzero(pareto_mask(values, sense))
+        if len(front) > max_rows // 2:
+            signs = np.array([-1.0 if s == "max" else 1.0 for s in (sense or ["min"] * len(objectives))])
+            crowd = crowding_distance(values[front] * signs)
+            front = front[np.argsort(-crowd, kind="stable")[:max_rows // 2]]
+        keep[front] = True
+
+    budget = max_rows - keep.sum()
+    rest = np.flatnonzero(~keep)
+    if budget > 0 and len(rest):
+        if stratify_by is not None and pd.api.types.is_numeric_dtype(df[stratify_by]):
+            ranks = df[stratify_by].iloc[rest].rank(method="first").to_numpy()
+            strata = np.where(np.isnan(ranks), n_strata, np.floor((ranks - 1) * n_strata / len(rest))).astype(int)
+        elif stratify_by is not None:
+            strata = pd.Categorical(df[stratify_by].iloc[rest]).codes.astype(int)
+        else:
+            strata = np.zeros(len(rest), dtype=int)
+
+        # proportional allocation: the same fraction of every stratum, in random order within it
+        order = np.lexsort((rng.random(len(rest)), strata))
+        sizes = np.bincount(strata)
+        quota = np.floor(sizes * budget / len(rest)).astype(int)
+        position = np.arange(len(rest)) - np.repeat(np.cumsum(sizes) - sizes, sizes)
+        picked = order[position < quota[strata[order]]]
+        keep[rest[picked]] = True
+
+    return np.flatnonzero(keep)
+
 
+def parallel_coordinates_plot(df, columnsToDisplay=None, colorBy=None, log_color=False, colorscale='Viridis',
+                              max_rows=None, pareto=None, sense=None, seed=0, **kwargs):
+    """
+    Plotly parallel coordinates figure of the columns colored by one column.
+
+    With max_rows the figure holds at most that many rows (see downsample_rows: reference row,
+    extremes and the Pareto front of the `pareto` columns are kept, the rest is stratified over colorBy),
+    so the HTML size is bounded. Values are stored as float32 and categorical columns as small integer
+    codes with one tick label per category.
+    """
+    if columnsToDisplay is None:
+        columnsToDisplay = list(df.columns)
     if colorBy is not None:
-        columnsToDisplay = columnsToDisplay + [colorBy]
+        columnsToDisplay = list(dict.fromkeys(list(columnsToDisplay) + [colorBy]))
+
+    if max_rows is not None and len(df) > max_rows:
+        rows = downsample_rows(df, max_rows, columns=columnsToDisplay, stratify_by=colorBy, objectives=pareto,
+                               sense=sense, seed=seed)
+        df = df.iloc[rows]
 
     df_filtered = df[columnsToDisplay].copy()
 
@@ -558,19 +752,22 @@ def parallel_coordinates_plot(df, columnsToDisplay=None, colorBy=None, log_color
         include=['object', 'category']).columns
     cat_mappings = {}
     for col in cat_columns:
-        df_filtered[col] = df_filtered[col].astype('category').cat.codes
-        cat_mappings[col] = dict(
-            enumerate(df[col].astype('category').cat.categories))
+        categorical = df_filtered[col].astype('category')
+        df_filtered[col] = categorical.cat.codes
+        cat_mappings[col] = dict(enumerate(categorical.cat.categories))
+
+    values = {col: df_filtered[col].to_numpy(dtype=np.int32 if col in cat_mappings else np.float32)
+              for col in df_filtered.columns}
 
     if colorBy is not None:
         # Create a dictionary of line properties for each category
         linedict = dict(
-            color=df_filtered[colorBy],
+            color=values[colorBy],
             colorscale=colorscale,
 
             showscale=True,
-            cmin=df_filtered[colorBy].min(),
-            cmax=df_filtered[colorBy].max(),
+            cmin=np.nanmin(values[colorBy]),
+            cmax=np.nanmax(values[colorBy]),
         )
     else:
         linedict = dict(
@@ -582,9 +779,9 @@ def parallel_coordinates_plot(df, columnsToDisplay=None, colorBy=None, log_color
         dimensions=[
             {
                 'label': col,
-                'values': df_filtered[col],
+                'values': values[col],
                 'tickvals': list(cat_mappings[col].keys()) if col in cat_mappings else None,
-                'ticktext': list(cat_mappings[col].values()) if col in cat_mappings else None,
+                'ticktext': [str(v) for v in cat_mappings[col].values()] if col in cat_mappings else None,
             }
             for col in df_filtered.columns
         ]
@@ -709,17 +906,16 @@ def sensitivity1d(data_folder, par=[], parz='Energy System LCOE', file_name="sum
             "slope": slope_at_xref_rel}
 
 
-def basic_plot_set(df, par, parz_list, data_folder, df0=None):
-    """
-    Standard routine for plotting outputs from population of designs.
-    Compatible with Python 3.7 and older Matplotlib versions.
-    """
-    box_props = dict(facecolor='white', alpha=0.8, edgecolor='black')
+BOX_PROPS = dict(facecolor='white', alpha=0.8, edgecolor='black')
+
+
+def hist_bins(df):
+    return max(min(25, len(df) // 20), 20)
 
-    # -------------------------------
-    # 1) Histograms in subplots
-    # -------------------------------
-    bins = max(min(25, len(df) // 20), 20)
+
+def plot_hist_subplots(df, parz_list, data_folder, df0=None):
+    """Histograms of the outputs in subplots, with statistics boxes. Saves hist_subplots.png."""
+    bins = hist_bins(df)
 
     fig, axes = plt.subplots(nrows=len(parz_list), ncols=1, sharex=False)
     fig.subplots_adjust(hspace=0.0)
@@ -769,109 +965,169 @@ def basic_plot_set(df, par, parz_list, data_folder, df0=None):
         # REMOVED transform argument
         at = AnchoredText(f"Histogram: {parz}", loc='upper left',
                           prop=dict(fontsize=8), frameon=True, pad=0.4, borderpad=0.0)
-        at.patch.set(**box_props)
+        at.patch.set(**BOX_PROPS)
         ax.add_artist(at)
 
     fig.tight_layout()
     fig.savefig(pjoin(data_folder, "hist_subplots.png"))
     plt.close(fig)
 
-    # -------------------------------
-    # 2) Line plots in subplots if len(par) == 1
-    # -------------------------------
-    if len(par) == 1:
-        fig, axes = plt.subplots(nrows=len(parz_list), ncols=1, sharex=False)
-        fig.subplots_adjust(hspace=0.0)
 
-        if len(parz_list) == 1: axes = [axes]
+def plot_line_subplots(df, p, parz_list, data_folder):
+    """Line plots of each output against one swept parameter. Saves line_subplots.png."""
+    fig, axes = plt.subplots(nrows=len(parz_list), ncols=1, sharex=False)
+    fig.subplots_adjust(hspace=0.0)
 
-        for i, parz in enumerate(parz_list):
-            ax = axes[i]
-            ax.plot(df[par[0]][1:], df[parz][1:], 'ko-', linewidth=1, markersize=3)
-            ax.scatter(df[par[0]].iloc[0], df[parz].iloc[0], c='r', marker='*', s=40, zorder=5)
-            ax.set_xlabel(par[0])
+    if len(parz_list) == 1: axes = [axes]
 
-            # REMOVED transform argument
-            at = AnchoredText(f"Line: {par[0]} vs {parz}", loc='upper left',
-                              prop=dict(fontsize=8), frameon=True, pad=0.4, borderpad=0.0)
-            at.patch.set(**box_props)
-            ax.add_artist(at)
+    for i, parz in enumerate(parz_list):
+        ax = axes[i]
+        ax.plot(df[p][1:], df[parz][1:], 'ko-', linewidth=1, markersize=3)
+        ax.scatter(df[p].iloc[0], df[parz].iloc[0], c='r', marker='*', s=40, zorder=5)
+        ax.set_xlabel(p)
 
-        fig.savefig(pjoin(data_folder, "line_subplots.png"))
-        plt.close(fig)
+        # REMOVED transform argument
+        at = AnchoredText(f"Line: {p} vs {parz}", loc='upper left',
+                          prop=dict(fontsize=8), frameon=True, pad=0.4, borderpad=0.0)
+        at.patch.set(**BOX_PROPS)
+        ax.add_artist(at)
 
-    # -------------------------------
-    # 3) If len(par) == 2, revert to ORIGINAL 2D code
-    # -------------------------------
-    if len(par) == 2:
-        for parz in parz_list:
-            parz_str = parz.replace("_", " ").replace("/", " per ")
+    fig.savefig(pjoin(data_folder, "line_subplots.png"))
+    plt.close(fig)
 
-            # Assuming par2_contours is defined elsewhere
-            fig, ax = par2_contours(df, par[0], par[1], [parz], zero_lvl="0-ref")
-            fig.savefig(pjoin(data_folder, f"contour{parz_str}_ref_.png"))
 
-            fig, ax = par2_contours(df, par[0], par[1], [parz], zero_lvl="value")
-            fig.savefig(pjoin(data_folder, f"contour{parz_str}_value_.png"))
+def plot_contour_pair(df, par, parz, data_folder):
+    """Reference-normalized and value contours of one output over two parameters."""
+    parz_str = parz.replace("_", " ").replace("/", " per ")
 
-    # -------------------------------
-    # 4) If len(par) > 2 => parallel coords & stacked hist
-    # -------------------------------
-    if len(par) > 2:
+    fig, ax = par2_contours(df, par[0], par[1], [parz], zero_lvl="0-ref")
+    fig.savefig(pjoin(data_folder, f"contour{parz_str}_ref_.png"))
+    plt.close(fig)
+
+    fig, ax = par2_contours(df, par[0], par[1], [parz], zero_lvl="value")
+    fig.savefig(pjoin(data_folder, f"contour{parz_str}_value_.png"))
+    plt.close(fig)
+
+
+def plot_parallel_html(df, par, parz, data_folder, pareto=None, sense=None):
+    """
+    Parallel coordinates of the parameters colored by one output. Saves parallel_<parz>.html.
+    When downsampled, the Pareto front of the `pareto` outputs (with `sense`) is kept.
+    """
+    fig = parallel_coordinates_plot(df, columnsToDisplay=par, colorBy=parz, log_color=True,
+                                    max_rows=PARCOORDS_MAX_ROWS, pareto=pareto, sense=sense)
+    try:
+        fig.write_html(pjoin(data_folder, f"parallel_{parz}.html"))
+    except AttributeError:
+        # older plotly versions or missing libraries might fail here
+        pass
+
+
+def plot_stacked_hist(df, p, parz, data_folder, bins=20):
+    """Histogram of one output stacked by one parameter. Saves hist_stacked_<parz>_<p>.png."""
+    fig, ax = stacked_hist(df, parz, p, num_bins=bins, zmax=100)
+    safe_parz = parz.replace("/", "_per_")
+    safe_p = p.replace("/", "_per_")
+
+    # REMOVED transform argument
+    at = AnchoredText(f"Stacked Hist: {safe_p} vs {safe_parz}", loc='upper left',
+                      prop=dict(fontsize=8), frameon=True, pad=0.4, borderpad=0.0)
+    at.patch.set(**BOX_PROPS)
+    ax.add_artist(at)
+
+    fig.savefig(pjoin(data_folder, f"hist_stacked_{safe_parz}_{safe_p}.png"))
+    plt.close(fig)
+
+
+def plot_scatter_subplots(df, p, parz_list, data_folder, density=None):
+    """
+    Scatter plots of each output against one parameter. Saves scatter_<p>.png.
+    Above DENSITY_SCATTER_ROWS rows (or with density=True) the points are drawn as a density image.
+    """
+    fig, axes = plt.subplots(nrows=len(parz_list), ncols=1)
+    fig.subplots_adjust(hspace=0.0)
+
+    if len(parz_list) == 1: axes = [axes]
+
+    for i, parz in enumerate(parz_list):
+        ax = axes[i]
+        if use_density(len(df), density, df[p], df[parz]):
+            density_scatter(ax, [df[p].values], [df[parz].values], ['k'])
+        else:
+            ax.scatter(df[p], df[parz], s=5, c='k', alpha=0.7)
+        ax.scatter(df[p].iloc[0], df[parz].iloc[0], marker='*', color='r', s=20)
+        ax.set_xlabel(p)
+        ax.set_ylabel(parz)
+
+        # FIXED: Removed transform, Added add_artist, Added styling
+        at = AnchoredText(f"Scatter: {p} vs {parz}", loc='upper left',
+                          prop=dict(fontsize=8), frameon=True, pad=0.4, borderpad=0.0)
+        at.patch.set(**BOX_PROPS)  # added styling
+        ax.add_artist(at)  # added missing artist add
+
+    safe_p = p.replace("/", "_per_")
+    fig.tight_layout()
+    fig.savefig(pjoin(data_folder, f"scatter_{safe_p}.png"))
+    plt.close(fig)
+
+
+def basic_plot_jobs(df, par, parz_list, data_folder, df0=None, sense=None):
+    """
+    The figures of basic_plot_set as a list of independent jobs (func, args). Each job gets only the
+    columns it draws, so it is cheap to send to a worker process. sense ("min"/"max" per numeric
+    output, or a {output: sense} dict; default all "min") defines the Pareto front that downsampled
+    parallel coordinates keep.
+    """
+    par, parz_list = list(par), list(parz_list)
+    jobs = [(plot_hist_subplots, (df[parz_list], parz_list, data_folder, df0))]
+
+    # Line plots in subplots if len(par) == 1
+    if len(par) == 1:
+        jobs.append((plot_line_subplots, (df[list(dict.fromkeys(par + parz_list))], par[0], parz_list, data_folder)))
+
+    # If len(par) == 2, 2D contours
+    if len(par) == 2:
         for parz in parz_list:
-            # Assuming parallel_coordinates_plot is defined elsewhere
-            fig = parallel_coordinates_plot(df, columnsToDisplay=par, colorBy=parz, log_color=True)
-            try:
-                fig.write_html(pjoin(data_folder, f"parallel_{parz}.html"))
-            except AttributeError:
-                # older plotly versions or missing libraries might fail here
-                pass
+            jobs.append((plot_contour_pair, (df[list(dict.fromkeys(par + [parz]))], par, parz, data_folder)))
 
-        # Stacked hist
+    # If len(par) > 2 => parallel coords & stacked hist
+    if len(par) > 2:
+        objectives = [c for c in parz_list if pd.api.types.is_numeric_dtype(df[c])]
+        for parz in parz_list:
+            jobs.append((plot_parallel_html, (df[list(dict.fromkeys(par + [parz] + objectives))], par, parz,
+                                              data_folder, objectives, sense)))
         for p in par:
             for parz in parz_list:
-                # Assuming stacked_hist is defined elsewhere
-                fig, ax = stacked_hist(df, parz, p, num_bins=bins, zmax=100)
-                safe_parz = parz.replace("/", "_per_")
-                safe_p = p.replace("/", "_per_")
-
-                # REMOVED transform argument
-                at = AnchoredText(f"Stacked Hist: {safe_p} vs {safe_parz}", loc='upper left',
-                                  prop=dict(fontsize=8), frameon=True, pad=0.4, borderpad=0.0)
-                at.patch.set(**box_props)
-                ax.add_artist(at)
-
-                fig.savefig(pjoin(data_folder, f"hist_stacked_{safe_parz}_{safe_p}.png"))
-                plt.close(fig)
-
-    # -------------------------------
-    # 5) Scatter plots if len(par) == 2 or len(par) > 3
-    # -------------------------------
+                jobs.append((plot_stacked_hist, (df[list(dict.fromkeys([p, parz]))], p, parz, data_folder, hist_bins(df))))
+
+    # Scatter plots if len(par) == 2 or len(par) > 3
     if len(par) == 2 or len(par) > 3:
         for p in par:
-            fig, axes = plt.subplots(nrows=len(parz_list), ncols=1)
-            fig.subplots_adjust(hspace=0.0)
-
-            if len(parz_list) == 1: axes = [axes]
+            jobs.append((plot_scatter_subplots, (df[list(dict.fromkeys([p] + parz_list))], p, parz_list,
+                                                 data_folder)))
+    return jobs
 
-            for i, parz in enumerate(parz_list):
-                ax = axes[i]
-                ax.scatter(df[p], df[parz], s=5, c='k', alpha=0.7)
-                ax.scatter(df[p].iloc[0], df[parz].iloc[0], marker='*', color='r', s=20)
-                ax.set_xlabel(p)
-                ax.set_ylabel(parz)
 
-                # FIXED: Removed transform, Added add_artist, Added styling
-                at = AnchoredText(f"Scatter: {p} vs {parz}", loc='upper left',
-                                  prop=dict(fontsize=8), frameon=True, pad=0.4, borderpad=0.0)
-                at.patch.set(**box_props)  # added styling
-                ax.add_artist(at)  # added missing artist add
-
-            safe_p = p.replace("/", "_per_")
-            fig.tight_layout()
-            fig.savefig(pjoin(data_folder, f"scatter_{safe_p}.png"))
-            plt.close(fig)
+def basic_plot_set(df, par, parz_list, data_folder, df0=None, renderer=None, cache=None, sense=None):
+    """
+    Standard routine for plotting outputs from population of designs.
+    Compatible with Python 3.7 and older Matplotlib versions.
 
+    With a renderer (see casegenmc.plot_render.PlotRenderer) the figures are queued as jobs and
+    drawn in worker processes; otherwise they are drawn here, one after the other. With a cache
+    (casegenmc.plot_cache.PlotCache) figures whose data, parameters and style are unchanged since
+    the last render are copied from the cache instead of being drawn. sense: see basic_plot_jobs.
+    """
+    jobs = basic_plot_jobs(df, par, parz_list, data_folder, df0=df0, sense=sense)
+    if cache is not None:
+        cache.run(jobs, data_folder, renderer=renderer)
+        return
+    if renderer is not None:
+        renderer.submit(jobs)
+        return
+
+    for func, args in jobs:
+        func(*args)
     plt.close("all")
     return
 
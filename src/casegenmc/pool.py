@@ -0,0 +1,443 @@
+import numbers
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+try:
+    import ray
+except ImportError:
+    ray = None  # Flag that Ray is not available
+
+
+def init_ray(num_cpus=None, address=None):
+    """
+    Starts Ray if it is not running yet. With an address ("auto", "ray://host:10001" or host:port,
+    also taken from the RAY_ADDRESS environment variable) the driver connects to that existing,
+    possibly multi-node, cluster; otherwise a local single-node instance with num_cpus is started.
+    """
+    if ray is None:
+        raise ImportError("Ray is not installed.")
+    if ray.is_initialized():
+        return
+    address = address or os.environ.get("RAY_ADDRESS")
+    if address:
+        ray.init(address=address)
+    else:
+        ray.init(num_cpus=num_cpus)
+
+
+def run_chunk(model, fixed_inputs, cases, fail_safe=False):
+    """
+    Runs the model on a list of (partial) cases merged with the fixed inputs.
+    With fail_safe=True a failing case returns {} instead of raising.
+    """
+    results = []
+    for case in cases:
+        full_case = {**fixed_inputs, **case}
+        if fail_safe:
+            try:
+                results.append(model(full_case))
+            except Exception:
+                results.append({})
+        else:
+            results.append(model(full_case))
+    return results
+
+
+# State of a process pool worker, set once by the initializer.
+_WORKER_STATE = {}
+
+
+def _init_process_worker(model, fixed_inputs):
+    _WORKER_STATE["model"] = model
+    _WORKER_STATE["fixed_inputs"] = fixed_inputs
+
+
+def _process_run_chunk(cases, fail_safe):
+    return run_chunk(_WORKER_STATE["model"], _WORKER_STATE["fixed_inputs"], cases, fail_safe)
+
+
+def pack_columns(columns):
+    """
+    Splits input columns (dict of name: array-like) into plain numeric arrays, for shared memory or
+    an object store, and the decoding information. Categorical and other hashable non-numeric
+    columns are sent as integer codes with their table of values; columns that cannot be coded
+    (e.g. lists) are returned apart, to be sent as lists.
+
+    :return: (arrays, decoders, other): {name: np.ndarray}, {name: list of values}, {name: list}
+    """
+    arrays, decoders, other = {}, {}, {}
+    for k, col in columns.items():
+        if isinstance(getattr(col, "dtype", None), pd.CategoricalDtype):
+            arrays[k] = np.asarray(col.codes if isinstance(col, pd.Categorical) else col.cat.codes)
+            decoders[k] = list(col.categories if isinstance(col, pd.Categorical) else col.cat.categories)
+            continue
+        values = np.asarray(col)
+        if values.dtype.kind in "biuf" and values.ndim == 1:
+            arrays[k] = values
+            continue
+        try:
+            codes, uniques = pd.factorize(values)
+        except TypeError:  # unhashable values
+            other[k] = list(values)
+            continue
+        decoders[k] = list(uniques)
+        missing = codes < 0
+        if missing.any():  # missing values get a code of their own, so None stays None
+            codes[missing] = len(uniques)
+            decoders[k].append(values[missing][0])
+        arrays[k] = codes
+    return arrays, decoders, other
+
+
+def column_slices(arrays, decoders, other, start, stop):
+    """Rows start:stop of packed columns as {name: list of Python values}, decoded."""
+    cols = {}
+    for k, arr in arrays.items():
+        part = arr[start:stop].tolist()
+        if k in decoders:
+            table = decoders[k]
+            part = [table[c] if c >= 0 else np.nan for c in part]
+        cols[k] = part
+    for k, vals in other.items():
+        cols[k] = vals[start:stop]
+    return cols
+
+
+def _value_kind(v):
+    """"b", "i" or "f" for a scalar that fits a float result buffer, else None."""
+    if isinstance(v, (bool, np.bool_)):
+        return "b"
+    if isinstance(v, numbers.Integral):
+        return "i"
+    if isinstance(v, numbers.Real):
+        return "f"
+    return None
+
+
+def run_rows(model, fixed_inputs, cols, rows, out, key_index, fail_safe=False):
+    """
+    Runs the model on the cases given as columns (lists of equal length) and writes the scalar
+    numeric outputs of case i to out[rows[i], key_index[key]]. The other outputs are returned.
+
+    :return: (extras, kinds): {row: {key: value}} of the outputs not written to out, and the
+        {key: set of "b"/"i"/"f"} kinds written, so the driver can restore int and bool columns.
+    """
+    names = list(cols)
+    extras, kinds = {}, {}
+    records = zip(*cols.values()) if cols else [()] * len(rows)
+    for row, values in zip(rows, records):
+        case = {**fixed_inputs, **dict(zip(names, values))}
+        try:
+            res = model(case)
+        except Exception:
+            if not fail_safe:
+                raise
+            continue
+        for k, v in res.items():
+            j = key_index.get(k)
+            kind = _value_kind(v) if j is not None else None
+            if kind is None:
+                extras.setdefault(row, {})[k] = v
+            else:
+                out[row, j] = v
+                kinds.setdefault(k, set()).add(kind)
+    return extras, kinds
+
+
+def _shared_memory():
+    try:
+        from multiprocessing import shared_memory
+    except ImportError:
+        raise ImportError("shared_memory=True requires multiprocessing.shared_memory (Python 3.8+).") from None
+    return shared_memory
+
+
+def _shared_arrays(shm, layout):
+    return {k: np.ndarray(shape, dtype=np.dtype(dtype), buffer=shm.buf, offset=offset)
+            for k, (dtype, shape, offset) in layout.items()}
+
+
+def _process_run_shared(in_spec, out_spec, start, stop, other, fail_safe):
+    """
+    Process worker side of CasePool.map_columns: runs rows start:stop of the inputs in shared
+    memory (other: the rows of the columns that are sent as lists) into the shared result buffer.
+    """
+    # workers share the parent's resource tracker, so attaching does not hand the blocks over to them
+    shared_memory = _shared_memory()
+    in_shm = shared_memory.SharedMemory(name=in_spec["name"])
+    out_shm = shared_memory.SharedMemory(name=out_spec["name"])
+    try:
+        arrays = _shared_arrays(in_shm, in_spec["layout"])
+        out = _shared_arrays(out_shm, out_spec["layout"])["out"]
+        cols = {**column_slices(arrays, in_spec["decoders"], {}, start, stop), **other}
+        result = run_rows(_WORKER_STATE["model"], _WORKER_STATE["fixed_inputs"], cols, range(start, stop), out,
+                          out_spec["keys"], fail_safe)
+        del arrays, out  # release the buffer views before closing
+        return result
+    finally:
+        in_shm.close()
+        out_shm.close()
+
+
+class CaseWorker:
+    """Ray actor body. Holds the model and fixed inputs for its lifetime."""
+
+    def __init__(self, model, fixed_inputs):
+        self.model = model
+        self.fixed_inputs = fixed_inputs
+
+    def run_chunk(self, cases, fail_safe=False):
+        return run_chunk(self.model, self.fixed_inputs, cases, fail_safe)
+
+    def run_slice(self, arrays, decoders, other, start, stop, key_index, fail_safe=False):
+        """Runs rows start:stop of packed columns held in the object store; returns (out, extras, kinds)."""
+        cols = {**column_slices(arrays, decoders, {}, start, stop), **other}
+        out = np.full((stop - start, max(len(key_index), 1)), np.nan)
+        extras, kinds = run_rows(self.model, self.fixed_inputs, cols, range(stop - start), out, key_index, fail_safe)
+        return out, {start + i: v for i, v in extras.items()}, kinds
+
+
+def _ray_slots(options):
+    """Number of actors with the resource requests of options (as for .options()) the Ray cluster can hold."""
+    total = ray.cluster_resources()
+    request = {"CPU": options.get("num_cpus", 1), "GPU": options.get("num_gpus", 0),
+               "memory": options.get("memory", 0), **options.get("resources", {})}
+    slots = [total.get(k, 0) // v for k, v in request.items() if v]
+    return max(1, int(min(slots))) if slots else os.cpu_count()
+
+
+def _merge_kinds(kinds, new):
+    for k, v in new.items():
+        kinds.setdefault(k, set()).update(v)
+
+
+def _result_columns(out, keys, extras, kinds, n):
+    """
+    Output columns from a result buffer (ints restored where every value was one, bools always) and
+    extras. Also returns the keys not in keys whose first value is a scalar number.
+    """
+    cols, new_keys = {}, []
+    for j, k in enumerate(keys):
+        if k not in kinds:
+            continue
+        col = out[:, j].copy()
+        missing = np.isnan(col)
+        if kinds[k] <= {"b"}:
+            col = col.astype(bool)
+            if missing.any():  # True/False objects and NaN, as map() returns them
+                col = col.astype(object)
+                col[missing] = np.nan
+        elif not missing.any() and kinds[k] <= {"i", "b"}:
+            col = col.astype(np.int64)
+        cols[k] = col
+    for row in sorted(extras):
+        for k, v in extras[row].items():
+            col = cols.get(k)
+            if col is None:
+                col = cols[k] = [np.nan] * n
+                if _value_kind(v) is not None:
+                    new_keys.append(k)
+            elif isinstance(col, np.ndarray):
+                col = cols[k] = col.astype(object).tolist()
+            col[row] = v
+    return cols, new_keys
+
+
+class CasePool:
+    """
+    Persistent pool of workers that receive the model and the fixed inputs once, at startup.
+
+    Afterwards only the varying part of each case is sent to the workers, so a whole population
+    costs one parallel round-trip and no re-pickling of the model. Use as a context manager or
+    call close() when done.
+
+    backend="process" uses a local ProcessPoolExecutor, backend="ray" a set of Ray actors.
+
+    With shared_memory=True, map_columns (used by run_cases for DataFrame inputs) does not pickle
+    cases at all: the input columns of a call are written once to a multiprocessing.shared_memory
+    block (the Ray object store for backend="ray"), workers get (start, stop) row ranges, and the
+    scalar numeric outputs are written into a shared result buffer. Only outputs that are not
+    scalar numbers are sent back pickled.
+    """
+
+    def __init__(self, model, fixed_inputs=None, n_workers=None, backend="process", chunks_per_worker=4,
+                 shared_memory=False, ray_address=None, ray_options=None):
+        """
+        :param model: The model function to evaluate.
+        :param fixed_inputs: Dictionary of constant parameters merged into every case.
+        :param n_workers: Number of worker processes or actors. Defaults to the CPU count.
+        :param backend: "process" or "ray".
+        :param chunks_per_worker: Cases are split into n_workers * chunks_per_worker chunks per map call.
+        :param shared_memory: Pass case batches through shared memory (see map_columns).
+        :param ray_address: Address of an existing Ray cluster to place the actors on (see init_ray).
+        :param ray_options: Resources of each actor, passed to .options(), e.g.
+            {"num_cpus": 1, "memory": 2 * 1024**3, "resources": {"solver": 1}} to place the actors
+            only on nodes started with --resources='{"solver": N}'. With backend="ray" and no
+            n_workers, as many actors are started as the cluster's CPUs allow.
+        """
+        if backend not in ["process", "ray"]:
+            raise ValueError("backend must be 'process' or 'ray'")
+
+        self.model = model
+        self.fixed_inputs = fixed_inputs if fixed_inputs is not None else {}
+        self.n_workers = n_workers if n_workers else os.cpu_count()
+        self.ray_options = ray_options if ray_options is not None else {}
+        self.backend = backend
+        self.chunks_per_worker = chunks_per_worker
+        self.shared_memory = shared_memory
+        if shared_memory and backend != "ray":
+            _shared_memory()  # fail at startup rather than at the first batch
+        self.output_keys = None  # numeric output names, learned from the first case
+
+        if backend == "ray":
+            if ray is None:
+                raise ImportError("backend='ray' requires ray to be installed.")
+            init_ray(n_workers, ray_address)
+            if not n_workers:
+                self.n_workers = _ray_slots(self.ray_options)
+            actor_cls = ray.remote(CaseWorker).options(**self.ray_options)
+            model_ref = ray.put(model)
+            fixed_ref = ray.put(self.fixed_inputs)
+            self.actors = [actor_cls.remote(model_ref, fixed_ref) for _ in range(self.n_workers)]
+            self.executor = None
+        else:
+            self.actors = None
+            self.executor = ProcessPoolExecutor(max_workers=self.n_workers, initializer=_init_process_worker,
+                                                initargs=(model, self.fixed_inputs))
+
+    def split(self, cases):
+        n_chunks = max(1, min(len(cases), self.n_workers * self.chunks_per_worker))
+        return [list(c) for c in np.array_split(np.arange(len(cases)), n_chunks) if len(c)]
+
+    def map(self, cases, fail_safe=False):
+        """
+        Evaluates a list of case dicts in parallel and returns the list of output dicts, in order.
+        With fail_safe=True failing cases return {} instead of raising.
+        """
+        cases = list(cases)
+        if not cases:
+            return []
+        chunks = self.split(cases)
+        chunk_cases = [[cases[i] for i in chunk] for chunk in chunks]
+
+        if self.backend == "ray":
+            futures = [self.actors[j % len(self.actors)].run_chunk.remote(c, fail_safe)
+                       for j, c in enumerate(chunk_cases)]
+            chunk_results = ray.get(futures)
+        else:
+            chunk_results = list(self.executor.map(_process_run_chunk, chunk_cases, [fail_safe] * len(chunk_cases)))
+
+        results = [None] * len(cases)
+        for chunk, res in zip(chunks, chunk_results):
+            for i, r in zip(chunk, res):
+                results[i] = r
+        return results
+
+    def map_columns(self, columns, fail_safe=False):
+        """
+        Evaluates the cases given as columns ({name: array-like}, e.g. a DataFrame's columns) and
+        returns the outputs as columns ({name: array or list}), in order. Missing outputs are NaN.
+        Uses the shared memory transport if the pool was made with shared_memory=True, else map().
+        """
+        n = len(next(iter(columns.values()))) if columns else 0
+        if n == 0:
+            return {}
+        if not self.shared_memory:
+            names = list(columns)
+            records = [dict(zip(names, values)) for values in zip(*(pd.Series(c).tolist() for c in columns.values()))]
+            results = self.map(records, fail_safe)
+            out = {}
+            for i, res in enumerate(results):
+                for k, v in res.items():
+                    out.setdefault(k, [np.nan] * n)[i] = v
+            return out
+
+        arrays, decoders, other = pack_columns(columns)
+        rows, first = (0, n), None
+        if not self.output_keys:
+            # the first case tells which outputs get a column in the result buffer
+            _, first, _ = self._run_shared(arrays, decoders, other, n, [(0, 1)], [], fail_safe)
+            self.output_keys = [k for k, v in first.get(0, {}).items() if _value_kind(v) is not None]
+            rows = (1, n)
+        n_chunks = max(1, min(rows[1] - rows[0], self.n_workers * self.chunks_per_worker))
+        chunks = [(int(c[0]), int(c[-1]) + 1) for c in np.array_split(np.arange(*rows), n_chunks) if len(c)]
+        out, extras, kinds = self._run_shared(arrays, decoders, other, n, chunks, self.output_keys, fail_safe)
+        for k, v in (first or {}).get(0, {}).items():
+            if k in self.output_keys:
+                out[0, self.output_keys.index(k)] = v
+                kinds.setdefault(k, set()).add(_value_kind(v))
+            else:
+                extras.setdefault(0, {})[k] = v
+        cols, new_keys = _result_columns(out, self.output_keys, extras, kinds, n)
+        self.output_keys += new_keys  # numeric outputs first seen in this call get a buffer column next time
+        return cols
+
+    def _run_shared(self, arrays, decoders, other, n, chunks, keys, fail_safe):
+        """Runs row ranges of packed columns; returns (out (n, len(keys)), extras, kinds)."""
+        out = np.full((n, len(keys)), np.nan)
+        extras, kinds = {}, {}
+        if not chunks:
+            return out, extras, kinds
+        key_index = {k: j for j, k in enumerate(keys)}
+        other_parts = [{k: v[start:stop] for k, v in other.items()} for start, stop in chunks]
+
+        if self.backend == "ray":
+            arrays_ref = ray.put(arrays)
+            futures = [self.actors[j % len(self.actors)].run_slice.remote(arrays_ref, decoders, o, start, stop,
+                                                                         key_index, fail_safe)
+                       for j, ((start, stop), o) in enumerate(zip(chunks, other_parts))]
+            for (start, stop), (part, e, kd) in zip(chunks, ray.get(futures)):
+                out[start:stop] = part[:, :len(keys)]
+                extras.update(e)
+                _merge_kinds(kinds, kd)
+            return out, extras, kinds
+
+        layout, offset = {}, 0
+        for k, arr in arrays.items():
+            layout[k] = (arr.dtype.str, arr.shape, offset)
+            offset += -(-arr.nbytes // 8) * 8  # keep every array 8-byte aligned
+        out_layout = {"out": ("<f8", out.shape, 0)}
+        shared_memory = _shared_memory()
+        in_shm = shared_memory.SharedMemory(create=True, size=max(offset, 1))
+        out_shm = shared_memory.SharedMemory(create=True, size=max(out.nbytes, 1))
+        try:
+            views = _shared_arrays(in_shm, layout)
+            for k in views:
+                views[k][:] = arrays[k]
+            out_view = _shared_arrays(out_shm, out_layout)["out"]
+            out_view[:] = np.nan
+            in_spec = {"name": in_shm.name, "layout": layout, "decoders": decoders}
+            out_spec = {"name": out_shm.name, "layout": out_layout, "keys": key_index}
+            args = [(in_spec, out_spec, start, stop, o, fail_safe) for (start, stop), o in zip(chunks, other_parts)]
+            for e, kd in self.executor.map(_process_run_shared, *zip(*args)):
+                extras.update(e)
+                _merge_kinds(kinds, kd)
+            out[:] = out_view
+            del views, out_view  # release the buffer views before closing
+            return out, extras, kinds
+        finally:
+            in_shm.close()
+            in_shm.unlink()
+            out_shm.close()
+            out_shm.unlink()
+
+    def close(self):
+        if self.executor is not None:
+            self.executor.shutdown()
+            self.executor = None
+        if self.actors is not None:
+            for actor in self.actors:
+                ray.kill(actor)
+            self.actors = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def __getstate__(self):
+        raise TypeError("CasePool holds live workers and cannot be pickled.")
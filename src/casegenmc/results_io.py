@@ -0,0 +1,364 @@
+import glob
+import hashlib
+import json
+import os
+import pickle
+
+import numpy as np
+import pandas as pd
+
+try:
+    import pyarrow
+except ImportError:
+    pyarrow = None  # CSV falls back to the C parser; Parquet/Feather need pyarrow
+
+RESULT_FILES = ["outputs.parquet", "outputs.feather", "outputs.csv"]
+
+
+def input_dtypes(input_stack, float_dtype="float64"):
+    """
+    Column dtypes of the input parameters of a processed input stack: float_dtype for numeric
+    inputs, bool for flags and a pandas Categorical over the declared options for string inputs.
+    Inputs with mixed-type options are left to the parser.
+    """
+    dtypes = {}
+    for k, v in input_stack.items():
+        if v["type"] != "options":
+            dtypes[k] = float_dtype
+            continue
+        options = list(v["options"])
+        if all(isinstance(o, (bool, np.bool_)) for o in options):
+            dtypes[k] = "bool"
+        elif all(isinstance(o, (int, float, np.number)) and not isinstance(o, bool) for o in options):
+            dtypes[k] = float_dtype
+        elif all(isinstance(o, str) for o in options):
+            dtypes[k] = pd.CategoricalDtype(options)
+    return dtypes
+
+
+def result_file(path):
+    """Resolves a results folder to the first outputs.parquet/.feather/.csv in it; files pass through."""
+    if os.path.isdir(path):
+        for name in RESULT_FILES:
+            if os.path.exists(os.path.join(path, name)):
+                return os.path.join(path, name)
+        raise FileNotFoundError(f"No {', '.join(RESULT_FILES)} in {path}")
+    return path
+
+
+def _apply_dtypes(df, dtypes):
+    dtypes = {k: v for k, v in dtypes.items() if k in df.columns and str(df[k].dtype) != str(v)}
+    return df.astype(dtypes) if dtypes else df
+
+
+def _arrow_to_pandas(table, dtypes):
+    # categorical columns are decoded straight into pandas Categoricals
+    categories = [k for k, v in dtypes.items() if isinstance(v, pd.CategoricalDtype) and k in table.column_names]
+    return _apply_dtypes(table.to_pandas(categories=categories), dtypes)
+
+
+def load_results(path, columns=None, dtypes=None, input_stack=None, chunksize=None, engine=None, memory_map=True,
+                 skiprows=None, **csv_kwargs):
+    """
+    Loads run_cases / run_analysis results with declared column types.
+
+    CSV files are parsed with the declared dtypes (no per-column inference or later conversion)
+    by the multithreaded pyarrow parser when available. Parquet and Feather files are read with
+    pyarrow, memory-mapped by default, so only the selected columns are paged in.
+
+    Parameters
+    ----------
+    path : str
+        A results file (.csv, .parquet, .feather/.arrow) or an analysis folder holding outputs.*.
+    columns : list of str, optional
+        Columns to read. Default all.
+    dtypes : dict, optional
+        {column: dtype}. Takes precedence over the types derived from input_stack.
+    input_stack : dict, optional
+        Processed input stack; its parameters get the types of input_dtypes.
+    chunksize : int, optional
+        Return an iterator of DataFrames of this many rows instead of one DataFrame.
+    engine : str, optional
+        CSV parser, "pyarrow" or "c". Default pyarrow when installed and chunksize is None.
+    memory_map : bool, optional
+        Memory-map the file. Default True.
+    skiprows : list of int, optional
+        CSV rows to skip (e.g. metadata rows under the header). Forces the C parser.
+    csv_kwargs :
+        Passed on to pd.read_csv.
+
+    Returns
+    -------
+    pd.DataFrame, or an iterator of DataFrames if chunksize is given.
+    """
+    path = result_file(path)
+    declared = input_dtypes(input_stack) if input_stack is not None else {}
+    declared.update(dtypes or {})
+    if columns is not None:
+        declared = {k: v for k, v in declared.items() if k in columns}
+
+    if path.endswith(".parquet"):
+        import pyarrow.parquet as pq
+
+        if chunksize is not None:
+            pf = pq.ParquetFile(path, memory_map=memory_map)
+            return (_arrow_to_pandas(pyarrow.Table.from_batches([b]), declared)
+                    for b in pf.iter_batches(batch_size=chunksize, columns=columns))
+        return _arrow_to_pandas(pq.read_table(path, columns=columns, memory_map=memory_map), declared)
+
+    if path.endswith((".feather", ".arrow")):
+        import pyarrow.feather as feather
+
+        table = feather.read_table(path, columns=columns, memory_map=memory_map)
+        if chunksize is not None:
+            # slices of a memory-mapped table are zero-copy; only each chunk is converted
+            return (_arrow_to_pandas(table.slice(start, chunksize), declared)
+                    for start in range(0, table.num_rows, chunksize))
+        return _arrow_to_pandas(table, declared)
+
+    if engine is None:
+        engine = "pyarrow" if pyarrow is not None and chunksize is None and skiprows is None else "c"
+    kwargs = dict(usecols=columns, dtype=declared or None, engine=engine, **csv_kwargs)
+    if engine == "c":
+        kwargs.update(memory_map=memory_map, chunksize=chunksize, skiprows=skiprows)
+    elif chunksize is not None or skiprows is not None:
+        raise ValueError("The pyarrow CSV engine supports neither chunksize nor skiprows; use engine='c'")
+    return pd.read_csv(path, **kwargs)
+
+
+def write_results(df, path):
+    """
+    Writes results in the format given by the extension: .parquet, .feather/.arrow (uncompressed,
+    so load_results can memory-map it) or .csv.
+    """
+    if path.endswith(".parquet"):
+        df.to_parquet(path, index=False)
+    elif path.endswith((".feather", ".arrow")):
+        df.reset_index(drop=True).to_feather(path, compression="uncompressed")
+    else:
+        df.to_csv(path, index=False)
+
+
+class ResultArrays:
+    """
+    Preallocated, memory-mapped numeric outputs of a fixed set of cases, written by case index.
+
+    A run directory holds one flat array file per numeric output (NaN until its case is done),
+    a done mask, the inputs (inputs.feather, or inputs.csv without pyarrow) and meta.json with
+    the output names and kinds (int and bool outputs are stored as floats and restored by
+    column/to_frame). Arrays for outputs that first appear later in a run are added then.
+    Outputs that are not scalar numbers (strings, lists, ...) are pickled per written batch to
+    rest_<n>.pkl files, so a resumed run returns them too.
+    Because every row has a fixed place, an interrupted run is resumed by running the cases that
+    are not done, and other processes can open the arrays (read-only, zero-copy) while a run
+    is still writing them.
+
+    e.g.
+        run_cases(cases, model, memmap_dir="runs/grid")
+        res = open_result_arrays("runs/grid")
+        res["y0"][res.done].mean()
+    """
+
+    def __init__(self, path, mode="r"):
+        """
+        :param path: Run directory made by ResultArrays.create.
+        :param mode: "r" to read, "r+" to write results.
+        """
+        self.path = path
+        self.mode = mode
+        self._arrays = {}
+        self.refresh()
+        self.done = np.memmap(os.path.join(path, "done.bool"), dtype=bool, mode=mode, shape=(self.n_cases,))
+
+    @classmethod
+    def create(cls, path, inputs, dtype="float64"):
+        """Creates (or overwrites) a run directory for the cases of the DataFrame inputs."""
+        os.makedirs(path, exist_ok=True)
+        for name in os.listdir(path):
+            if name.endswith((".dat", ".bool")) or name.startswith(("inputs.", "rest_")):
+                os.remove(os.path.join(path, name))
+        n_cases = len(inputs)
+        np.memmap(os.path.join(path, "done.bool"), dtype=bool, mode="w+", shape=(n_cases,)).flush()
+        write_results(inputs, os.path.join(path, "inputs.feather" if pyarrow is not None else "inputs.csv"))
+        _write_meta(path, {"n_cases": n_cases, "dtype": np.dtype(dtype).name, "inputs_hash": inputs_hash(inputs),
+                           "outputs": [], "kinds": {}, "columns": []})
+        return cls(path, mode="r+")
+
+    @classmethod
+    def open_or_create(cls, path, inputs, dtype="float64", verbose=True):
+        """
+        Opens the run directory for writing if it was made for the same inputs and dtype, so its
+        done cases are kept, or creates it anew.
+        """
+        try:
+            with open(os.path.join(path, "meta.json")) as f:
+                meta = json.load(f)
+        except (OSError, ValueError):
+            meta = None
+        if meta is not None and meta["inputs_hash"] == inputs_hash(inputs) and meta["dtype"] == np.dtype(dtype).name:
+            return cls(path, mode="r+")
+        if meta is not None and verbose:
+            print(f"Inputs or dtype differ from the run in {path}; starting it over")
+        return cls.create(path, inputs, dtype=dtype)
+
+    def refresh(self):
+        """Re-reads meta.json, e.g. to see the outputs added by a run that is still going."""
+        with open(os.path.join(self.path, "meta.json")) as f:
+            self.meta = json.load(f)
+        self.n_cases = self.meta["n_cases"]
+        self.dtype = np.dtype(self.meta["dtype"])
+        self.meta.setdefault("kinds", {})
+        self.meta.setdefault("columns", list(self.meta["outputs"]))
+
+    @property
+    def outputs(self):
+        return list(self.meta["outputs"])
+
+    def keys(self):
+        return self.outputs
+
+    def __contains__(self, key):
+        return key in self.meta["outputs"]
+
+    def __len__(self):
+        return self.n_cases
+
+    def __getitem__(self, key):
+        """The memory-mapped array (n_cases,) of an output."""
+        if key not in self._arrays:
+            if key not in self.meta["outputs"]:
+                raise KeyError(key)
+            file = os.path.join(self.path, f"out_{self.meta['outputs'].index(key)}.dat")
+            self._arrays[key] = np.memmap(file, dtype=self.dtype, mode=self.mode, shape=(self.n_cases,))
+        return self._arrays[key]
+
+    def _add_output(self, key):
+        file = os.path.join(self.path, f"out_{len(self.meta['outputs'])}.dat")
+        arr = np.memmap(file, dtype=self.dtype, mode="w+", shape=(self.n_cases,))
+        arr[:] = np.nan
+        arr.flush()
+        self.meta["outputs"].append(key)
+        _write_meta(self.path, self.meta)
+        self._arrays[key] = np.memmap(file, dtype=self.dtype, mode="r+", shape=(self.n_cases,))
+
+    def write(self, indices, columns):
+        """
+        Writes the output columns of the cases at indices. An output gets an array if its first
+        values are scalar numbers (or bools); the other columns are pickled to a rest_<n>.pkl file
+        and returned.
+        """
+        rest = {}
+        changed = False
+        for k, vals in columns.items():
+            if k not in self.meta["columns"]:
+                self.meta["columns"].append(k)
+                changed = True
+            values = np.asarray(vals)
+            if k not in self.meta["outputs"]:
+                if values.dtype.kind not in "biuf" or values.ndim != 1:
+                    rest[k] = vals
+                    continue
+                self._add_output(k)
+            try:
+                self[k][indices] = np.asarray(vals, dtype=float)
+            except (TypeError, ValueError):
+                raise ValueError(f"Output {k} is stored as a numeric array but got non-numeric values") from None
+            # an output stays int (or bool) only while every batch is; anything else makes it float
+            if values.dtype.kind == "O":  # e.g. bools with NaN for failed cases
+                values = np.asarray([v for v in vals if not (isinstance(v, float) and np.isnan(v))])
+            kind = values.dtype.kind if values.dtype.kind in "bi" else "f"
+            old = self.meta["kinds"].get(k, kind)
+            if old != kind:
+                kind = "f"
+            if self.meta["kinds"].get(k) != kind:
+                self.meta["kinds"][k] = kind
+                changed = True
+        if changed:
+            _write_meta(self.path, self.meta)
+        if rest:
+            n = len(glob.glob(os.path.join(self.path, "rest_*.pkl")))
+            file = os.path.join(self.path, f"rest_{n:06d}.pkl")
+            with open(file + ".tmp", "wb") as f:
+                pickle.dump({"indices": np.asarray(indices), "columns": rest}, f)
+            os.replace(file + ".tmp", file)
+        return rest
+
+    def mark_done(self, indices):
+        """Flushes the outputs, then flags the cases at indices as done."""
+        self.flush()
+        self.done[indices] = True
+        self.done.flush()
+
+    def flush(self):
+        for arr in self._arrays.values():
+            arr.flush()
+
+    def inputs(self):
+        """The DataFrame of the input cases."""
+        for name in ["inputs.feather", "inputs.csv"]:
+            if os.path.exists(os.path.join(self.path, name)):
+                return load_results(os.path.join(self.path, name))
+        raise FileNotFoundError(f"No inputs file in {self.path}")
+
+    def column(self, key):
+        """
+        Copy of the array of an output, as int or bool if it was written as such and no case is
+        missing (bool outputs with missing cases are objects with NaN, as in run_cases).
+        """
+        values = np.array(self[key])
+        kind = self.meta["kinds"].get(key, "f")
+        missing = np.isnan(values)
+        if kind == "i" and not missing.any():
+            return values.astype(np.int64)
+        if kind == "b":
+            if not missing.any():
+                return values.astype(bool)
+            out = values.astype(bool).astype(object)
+            out[missing] = np.nan
+            return out
+        return values
+
+    def rest_columns(self):
+        """The outputs that are not scalar numbers, as {name: list (n_cases,)}, NaN where not written."""
+        columns = {}
+        for file in sorted(glob.glob(os.path.join(self.path, "rest_*.pkl"))):
+            with open(file, "rb") as f:
+                part = pickle.load(f)
+            for k, vals in part["columns"].items():
+                col = columns.setdefault(k, [np.nan] * self.n_cases)
+                for i, v in zip(part["indices"].tolist(), vals):
+                    col[i] = v
+        return columns
+
+    def output_columns(self):
+        """Every output (see column and rest_columns), in the order the model first returned them."""
+        rest = self.rest_columns()
+        return {k: self.column(k) if k in self.meta["outputs"] else rest[k]
+                for k in self.meta["columns"] if k in self.meta["outputs"] or k in rest}
+
+    def to_frame(self, done_only=False):
+        """DataFrame of the inputs and the stored outputs (a copy of the arrays)."""
+        df = self.inputs().assign(**self.output_columns())
+        return df[np.asarray(self.done)].reset_index(drop=True) if done_only else df
+
+    def __repr__(self):
+        return f"ResultArrays({self.path!r}, cases={self.n_cases}, done={int(self.done.sum())}, outputs={self.outputs})"
+
+
+def _write_meta(path, meta):
+    tmp = os.path.join(path, "meta.json.tmp")
+    with open(tmp, "w") as f:
+        json.dump(meta, f)
+    os.replace(tmp, os.path.join(path, "meta.json"))  # readers never see a partial file
+
+
+def inputs_hash(inputs):
+    """Hash of the values and columns of a DataFrame of input cases, to tell whether a run is resumable."""
+    h = hashlib.blake2b(repr(list(inputs.columns)).encode(), digest_size=16)
+    h.update(pd.util.hash_pandas_object(inputs.reset_index(drop=True), index=False).to_numpy().tobytes())
+    return h.hexdigest()
+
+
+def open_result_arrays(path):
+    """Opens the memory-mapped results of a run_cases(..., memmap_dir=path) run for reading."""
+    return ResultArrays(path, mode="r")
@@ -0,0 +1,272 @@
+import hashlib
+import json
+import sqlite3
+import time
+
+import numpy as np
+import pandas as pd
+
+# Bound parameters per SQLite statement (the library default limit is 999 on older builds)
+_MAX_VARS = 900
+
+
+def _q(name):
+    """Quotes an SQL identifier."""
+    return '"' + str(name).replace('"', '""') + '"'
+
+
+def case_key(case, tol=None):
+    """
+    Hash of one input case (dict), independent of the column order. Numbers are compared as floats,
+    rounded to multiples of tol if given, so 1 and 1.0 are the same point.
+    """
+    items = []
+    for k in sorted(case):
+        v = case[k]
+        if isinstance(v, np.generic):
+            v = v.item()
+        if isinstance(v, (int, float)) and not isinstance(v, bool):
+            v = float(v)
+            if tol and np.isfinite(v):
+                v = int(np.round(v / tol))
+        elif not isinstance(v, (str, bool)) and v is not None:
+            v = repr(v)
+        items.append((k, v))
+    return hashlib.blake2b(repr(items).encode(), digest_size=12).hexdigest()
+
+
+def _sql_values(series):
+    """Column values as SQLite-storable Python objects; non-scalars are stored as JSON/repr text."""
+    if series.dtype.kind in "biuf":
+        return series.to_numpy().tolist()
+
+    def conv(v):
+        if isinstance(v, np.generic):
+            return v.item()
+        if v is None or isinstance(v, (str, int, float, bool)):
+            return v
+        if isinstance(v, np.ndarray):
+            v = v.tolist()
+        try:
+            return json.dumps(v)
+        except TypeError:
+            return repr(v)
+    return [conv(v) for v in series.astype(object)]
+
+
+class ResultsStore:
+    """
+    Embedded SQLite store of evaluated cases across campaigns.
+
+    Every row holds one case (inputs and outputs) with the campaign it was run in and a hash of its
+    inputs. Input columns are indexed, so range/equality queries across campaigns do not load the
+    whole store, and already-evaluated input points can be found before running them again.
+    Columns are added as new inputs and outputs appear. Non-scalar outputs are stored as JSON text.
+
+    e.g.
+        store = ResultsStore("results.db")
+        run_cases(cases, model, store=store, campaign="grid_v1")
+        store.query(x0=(1, 2), x4="b")
+    """
+
+    def __init__(self, path, tol=None):
+        """
+        :param path: SQLite file, created if missing. ":memory:" for a temporary store.
+        :param tol: Tolerance of the input matching (see case_key). Keep it fixed for a given file.
+        """
+        self.path = path
+        self.tol = tol
+        self.conn = sqlite3.connect(path)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        with self.conn:
+            self.conn.execute("CREATE TABLE IF NOT EXISTS results "
+                              "(_case_id INTEGER PRIMARY KEY, _campaign TEXT NOT NULL, _key TEXT NOT NULL)")
+            self.conn.execute("CREATE TABLE IF NOT EXISTS columns (name TEXT PRIMARY KEY, role TEXT)")
+            self.conn.execute("CREATE TABLE IF NOT EXISTS campaigns "
+                              "(name TEXT PRIMARY KEY, created REAL, updated REAL, n_cases INTEGER)")
+            self.conn.execute("CREATE INDEX IF NOT EXISTS ix__key ON results (_key)")
+            self.conn.execute("CREATE INDEX IF NOT EXISTS ix__campaign ON results (_campaign, _key)")
+        self._load_columns()
+
+    def _load_columns(self):
+        self.columns = dict(self.conn.execute("SELECT name, role FROM columns").fetchall())
+
+    @property
+    def input_columns(self):
+        return [k for k, r in self.columns.items() if r == "input"]
+
+    @property
+    def output_columns(self):
+        return [k for k, r in self.columns.items() if r == "output"]
+
+    def _add_columns(self, names, role):
+        for name in names:
+            if name in self.columns:
+                continue
+            self.conn.execute(f"ALTER TABLE results ADD COLUMN {_q(name)}")
+            self.conn.execute("INSERT INTO columns VALUES (?, ?)", (name, role))
+            if role == "input":
+                self.conn.execute(f"CREATE INDEX {_q('ix_' + name)} ON results ({_q(name)})")
+            self.columns[name] = role
+
+    def _check_names(self, names):
+        """Raises if a new column name equals another one up to case (SQLite names are case-insensitive)."""
+        seen = {c.lower(): c for c in list(self.columns) + ["_case_id", "_campaign", "_key"]}
+        for name in names:
+            if name in self.columns:
+                continue
+            other = seen.setdefault(str(name).lower(), name)
+            if other != name:
+                raise ValueError(f"Column {name!r} clashes with column {other!r}: the results store cannot hold "
+                                 f"names that differ only in case.")
+
+    def keys(self, inputs):
+        """case_key of every row of a DataFrame of inputs."""
+        return [case_key(c, self.tol) for c in inputs.to_dict("records")]
+
+    def append(self, df, campaign, input_columns):
+        """
+        Adds evaluated cases to a campaign.
+
+        :param df: DataFrame of inputs and outputs, e.g. run_cases(...)["out"].
+        :param campaign: Campaign name.
+        :param input_columns: Columns of df that are inputs; the others are stored as outputs.
+        :return: Number of rows added.
+        """
+        if len(df) == 0:
+            return 0
+        input_columns = [c for c in input_columns if c in df.columns]
+        output_columns = [c for c in df.columns if c not in input_columns]
+        self._check_names(df.columns)
+        keys = self.keys(df[input_columns])
+        now = time.time()
+        names = ["_campaign", "_key"] + list(df.columns)
+        values = [[campaign] * len(df), keys] + [_sql_values(df[c]) for c in df.columns]
+
+        with self.conn:
+            self._add_columns(input_columns, "input")
+            self._add_columns(output_columns, "output")
+            self.conn.executemany(
+                f"INSERT INTO results ({', '.join(_q(n) for n in names)}) VALUES ({', '.join('?' * len(names))})",
+                zip(*values))
+            self.conn.execute("INSERT INTO campaigns VALUES (?, ?, ?, ?) ON CONFLICT(name) DO UPDATE SET "
+                              "updated = excluded.updated, n_cases = n_cases + excluded.n_cases",
+                              (campaign, now, now, len(df)))
+        return len(df)
+
+    def query(self, campaign=None, columns=None, where=None, params=(), limit=None, **conditions):
+        """
+        Cases matching all conditions, as a DataFrame with a "_campaign" column.
+
+        Conditions are column=value pairs: a (low, high) tuple is an inclusive range (None for an
+        open end), a list is a set of allowed values, None matches missing values, anything else
+        is an equality. e.g. store.query(x0=(1, 2), x4="b", campaign="grid_v1")
+
+        :param campaign: Campaign name or list of names. Default all campaigns.
+        :param columns: Columns to return. Default all.
+        :param where: Extra SQL condition, with "?" placeholders filled from params.
+        :param limit: Maximum number of rows.
+        """
+        clauses, args = [], []
+        if campaign is not None:
+            conditions["_campaign"] = [campaign] if isinstance(campaign, str) else list(campaign)
+        for name, cond in conditions.items():
+            if name not in self.columns and name != "_campaign":
+                raise KeyError(f"Column {name} is not in the results store")
+            col = _q(name)
+            if cond is None:
+                clauses.append(f"{col} IS NULL")
+            elif isinstance(cond, tuple):
+                low, high = cond
+                if low is not None:
+                    clauses.append(f"{col} >= ?")
+                    args.append(low)
+                if high is not None:
+                    clauses.append(f"{col} <= ?")
+                    args.append(high)
+            elif isinstance(cond, (list, set, np.ndarray)):
+                cond = list(cond)
+                clauses.append(f"{col} IN ({', '.join('?' * len(cond))})")
+                args.extend(cond)
+            else:
+                clauses.append(f"{col} = ?")
+                args.append(cond)
+        if where:
+            clauses.append(f"({where})")
+            args.extend(params)
+
+        if columns is None:
+            columns = list(self.columns)
+        sql = f"SELECT {', '.join(_q(c) for c in ['_campaign'] + list(columns))} FROM results"
+        if clauses:
+            sql += " WHERE " + " AND ".join(clauses)
+        sql += " ORDER BY _case_id"
+        if limit is not None:
+            sql += f" LIMIT {int(limit)}"
+        args = [a.item() if isinstance(a, np.generic) else a for a in args]
+        return pd.read_sql_query(sql, self.conn, params=args)
+
+    def lookup(self, inputs, campaign=None, columns=None):
+        """
+        Finds already-evaluated input points.
+
+        :param inputs: DataFrame (or list of dicts) of input cases.
+        :param campaign: Only match cases of this campaign (or list of campaigns). Default any.
+        :param columns: Output columns to return. Default all outputs.
+        :return: (found, results): a boolean array over the rows of inputs, and a DataFrame of the
+            stored outputs with one row per input row (NaN where not found). The most recent
+            evaluation of a point is used.
+        """
+        inputs = pd.DataFrame(inputs).reset_index(drop=True)
+        keys = self.keys(inputs)
+        columns = self.output_columns if columns is None else list(columns)
+        cols = ", ".join(["_key"] + [_q(c) for c in columns])
+        if isinstance(campaign, str):
+            campaign = [campaign]
+
+        frames = []
+        unique_keys = list(dict.fromkeys(keys))
+        n_camp = len(campaign) if campaign is not None else 0
+        step = _MAX_VARS - n_camp
+        for start in range(0, len(unique_keys), step):
+            chunk = unique_keys[start:start + step]
+            sql = f"SELECT {cols} FROM results WHERE _key IN ({', '.join('?' * len(chunk))})"
+            if campaign is not None:
+                sql += f" AND _campaign IN ({', '.join('?' * n_camp)})"
+            frames.append(pd.read_sql_query(sql + " ORDER BY _case_id", self.conn,
+                                            params=chunk + (list(campaign) if campaign else [])))
+        stored = pd.concat(frames, ignore_index=True) if frames else pd.DataFrame(columns=["_key"] + columns)
+        stored = stored.drop_duplicates("_key", keep="last").set_index("_key")
+
+        found = pd.Index(keys).isin(stored.index)
+        results = stored.reindex(keys).reset_index(drop=True)
+        return found, results
+
+    def campaigns(self):
+        """DataFrame of the campaigns with their creation/update times and case counts."""
+        df = pd.read_sql_query("SELECT * FROM campaigns ORDER BY created", self.conn)
+        for c in ["created", "updated"]:
+            df[c] = pd.to_datetime(df[c], unit="s")
+        return df
+
+    def delete_campaign(self, campaign):
+        with self.conn:
+            self.conn.execute("DELETE FROM results WHERE _campaign = ?", (campaign,))
+            self.conn.execute("DELETE FROM campaigns WHERE name = ?", (campaign,))
+
+    def __len__(self):
+        return self.conn.execute("SELECT COUNT(*) FROM results").fetchone()[0]
+
+    def __repr__(self):
+        n_camp = self.conn.execute("SELECT COUNT(*) FROM campaigns").fetchone()[0]
+        return f"ResultsStore({self.path!r}, cases={len(self)}, campaigns={n_camp})"
+
+    def close(self):
+        self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -1,3 +1,4 @@
+import functools
 import re
 import shutil
 import numpy as np
@@ -6,8 +7,11 @@ def setup_tex_plots(fontsize=12, usetex=True, style='default',texfonts=True,figs
     """
     e.g. setup_text_plots(fontsize=14, usetex=True,style='default')
 
+    With usetex=False the same Computer Modern look is drawn by matplotlib's mathtext and its
+    bundled cmr10 font, without a LaTeX run per label. Use it for bulk plot generation.
+
     :param fontsize:
-    :param usetex:
+    :param usetex: True to render text with LaTeX, False for mathtext.
     :param style:
     :return: setup for nice plotting
     """
@@ -25,11 +29,17 @@ def setup_tex_plots(fontsize=12, usetex=True, style='default',texfonts=True,figs
     # use latex font
     if usetex:
         matplotlib.rcParams['text.usetex'] = True
+        serif = ['Computer Modern']
+    else:
+        matplotlib.rcParams['text.usetex'] = False
+        # cmr10 has no minus glyph, so tick labels go through mathtext
+        matplotlib.rcParams['axes.formatter.use_mathtext'] = True
+        serif = ['cmr10', 'Computer Modern Serif', 'DejaVu Serif']
 
     matplotlib.rc('font', size=fontsize, family='serif',
                   style='normal', variant='normal',
                   stretch='normal', weight='normal',
-                  serif=['Computer Modern'])
+                  serif=serif)
 
     # default scatter plot marker size
     matplotlib.rcParams['lines.markersize'] = 5
@@ -56,9 +66,38 @@ def setup_tex_plots(fontsize=12, usetex=True, style='default',texfonts=True,figs
     return
 
 
+@functools.lru_cache(maxsize=None)
+def latex_available():
+    """Whether a latex executable is on the PATH. Looked up once per process."""
+    return shutil.which("latex") is not None
+
+
 def str_latex(s):
-    if not shutil.which("latex"):
+    """
+    Escapes a label for the active text renderer: TeX special characters when text.usetex is on
+    and LaTeX is installed. In the cmr10 mathtext mode of setup_tex_plots(usetex=False) only "_"
+    outside $...$ is replaced, so math in labels still renders and escaping twice changes nothing.
+    Otherwise labels are returned unchanged. Results are memoized.
+    """
+    import matplotlib
+
+    if matplotlib.rcParams['text.usetex'] and latex_available():
+        mode = "tex"
+    elif matplotlib.rcParams['font.serif'][:1] == ['cmr10'] and 'serif' in matplotlib.rcParams['font.family']:
+        mode = "mathtext"
+    else:
         return s
+    return _escape_label(s, mode)
+
+
+@functools.lru_cache(maxsize=4096)
+def _escape_label(s, mode):
+    if mode == "mathtext":
+        parts = s.split("$")
+        if len(parts) % 2 == 0:  # an odd number of "$" is drawn as plain text
+            return s
+        # cmr10 draws a bare "_" as a dot accent; the math-mode underscore is the real glyph
+        return "$".join(p.replace("_", r"$\_$") if i % 2 == 0 else p for i, p in enumerate(parts))
     latex_replacements = {
         "&": r"\&",
         "_": r"\_",
@@ -85,7 +85,18 @@ def roundSF(x, sig=1):
     return round(x, sig - int(math.floor(math.log10(abs(x)))) - 1)
 
 
-vectorized_roundSF = np.vectorize(roundSF)
+def vectorized_roundSF(x, sig=1):
+    """
+    Array version of roundSF, computed with NumPy instead of a Python loop. Zeros and non-finite
+    values are returned unchanged.
+    """
+    x = np.asarray(x, dtype=float)
+    with np.errstate(divide="ignore", invalid="ignore", over="ignore"):
+        decimals = sig - 1 - np.floor(np.log10(np.abs(x)))
+        decimals = np.where(np.isfinite(decimals), decimals, 0)
+        scale = 10.0 ** np.abs(decimals)
+        out = np.where(decimals >= 0, np.round(x * scale) / scale, np.round(x / scale) * scale)
+    return np.where((x == 0) | ~np.isfinite(x), x, out)
 
 
 def format_float(value, sig_figs=3, scientific_notation=False):
@@ -1,4 +1,199 @@
+import pickle
+from collections import OrderedDict
+
 import numpy as np
+import pandas as pd
+
+from casegenmc.core import run_cases
+
+
+class FailSafeModel:
+    """
+    Picklable model wrapper that returns an empty result instead of raising, so one failing case
+    does not stop a batch. The missing outputs show up as NaN and are scored as failures.
+    """
+
+    def __init__(self, ff):
+        self.ff = ff
+
+    def __call__(self, case):
+        try:
+            return self.ff(case)
+        except Exception:
+            return {}
+
+
+class EvalCache:
+    """
+    LRU cache of model outputs keyed on the decoded input case.
+
+    Many optimizer vectors decode to the same case (rounded categorical indices, NEORL grid
+    variables), so the model only needs to run once per case. Pass the same instance to several
+    wrappers or optimizer restarts to share it, or save()/load() it between sessions.
+    """
+
+    def __init__(self, maxsize=100000, tol=None):
+        """
+        :param maxsize: Maximum number of cases kept. The least recently used case is dropped first.
+        :param tol: If given, continuous values are rounded to multiples of tol when building the key.
+        """
+        self.maxsize = maxsize
+        self.tol = tol
+        self.data = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def key(self, case):
+        items = []
+        for k in sorted(case):
+            v = case[k]
+            if isinstance(v, (float, np.floating)):
+                v = int(np.round(v / self.tol)) if self.tol else float(v)
+            elif isinstance(v, np.generic):
+                v = v.item()
+            elif isinstance(v, (list, np.ndarray, dict)):
+                v = repr(v)
+            items.append((k, v))
+        return tuple(items)
+
+    def get(self, case):
+        """Returns the cached output dict for the case, or None."""
+        key = self.key(case)
+        output = self.data.get(key)
+        if output is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self.data.move_to_end(key)
+        return output
+
+    def put(self, case, output):
+        key = self.key(case)
+        self.data[key] = output
+        self.data.move_to_end(key)
+        while len(self.data) > self.maxsize:
+            self.data.popitem(last=False)
+
+    @property
+    def hit_rate(self):
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def __len__(self):
+        return len(self.data)
+
+    def __repr__(self):
+        return f"EvalCache(size={len(self)}, hits={self.hits}, misses={self.misses}, hit_rate={self.hit_rate:.2f})"
+
+    def clear(self):
+        self.data.clear()
+        self.hits = 0
+        self.misses = 0
+
+    def save(self, path):
+        with open(path, "wb") as f:
+            pickle.dump(self, f)
+
+    @classmethod
+    def load(cls, path):
+        with open(path, "rb") as f:
+            return pickle.load(f)
+
+
+def evaluate_case(ff, case, cache=None):
+    """Runs ff on one case, through the cache if one is given. Failed runs are not cached."""
+    if cache is None:
+        return ff(case)
+    output = cache.get(case)
+    if output is None:
+        output = ff(case)
+        cache.put(case, output)
+    return output
+
+
+def cache_lookup(cases, cache=None):
+    """
+    Looks a list of case dicts up in the cache. Returns (outputs, todo): outputs in case order, None
+    for the cases to run, and todo, a list of index lists, one per distinct case to run. Copies of a
+    case within the batch are run once and count as cache hits.
+    """
+    outputs = [None] * len(cases)
+    if cache is None:
+        return outputs, [[i] for i in range(len(cases))]
+    groups = {}
+    for i, case in enumerate(cases):
+        key = cache.key(case)
+        if key in groups:
+            groups[key].append(i)
+            cache.hits += 1
+            continue
+        outputs[i] = cache.get(case)
+        if outputs[i] is None:
+            groups[key] = [i]
+    return outputs, list(groups.values())
+
+
+def evaluate_cases_cached(ff, cases, cache=None, vectorized=False, **run_kwargs):
+    """
+    Evaluates a DataFrame of cases with run_cases, skipping the ones already in the cache and
+    running repeated cases once. Returns a list of output dicts in case order ({} for failed cases).
+    """
+    records = cases.to_dict("records")
+    outputs, todo = cache_lookup(records, cache)
+    if todo:
+        res = run_cases(cases.iloc[[idx[0] for idx in todo]], ff if vectorized else FailSafeModel(ff),
+                        vectorized=vectorized, verbose=False, **run_kwargs)["out"]
+        out_cols = [c for c in res.columns if c not in cases.columns]
+        for idx, row in zip(todo, res[out_cols].to_dict("records")):
+            row = {k: v for k, v in row.items() if not (isinstance(v, float) and np.isnan(v))}
+            for i in idx:
+                outputs[i] = row
+            if cache is not None and row:
+                cache.put(records[idx[0]], row)
+    return outputs
+
+
+def evaluate_cases_on_pool(pool, cases, variable_inputs, cache=None):
+    """
+    Evaluates a list of case dicts on a CasePool, skipping the ones already in the cache and
+    running repeated cases once. Only the variable_inputs of each case are sent; the pool holds the
+    fixed inputs. Returns a list of output dicts in case order ({} for failed cases).
+    """
+    outputs, todo = cache_lookup(cases, cache)
+    variable_cases = [{name: cases[idx[0]][name] for name in variable_inputs} for idx in todo]
+    for idx, out in zip(todo, pool.map(variable_cases, fail_safe=True)):
+        for i in idx:
+            outputs[i] = out
+        if cache is not None and out:
+            cache.put(cases[idx[0]], out)
+    return outputs
+
+
+class EvalHistory:
+    """
+    Record of every evaluation made through a wrapper: inputs, outputs, objective value and the
+    batch (generation) it belonged to. Use to_frame() for analysis after the run.
+    """
+
+    def __init__(self):
+        self.rows = []
+        self.n_batches = 0
+
+    def record(self, cases, outputs, values):
+        batch = self.n_batches
+        self.n_batches += 1
+        for case, output, value in zip(cases, outputs, values):
+            self.rows.append({**case, **output, "objective": value, "batch": batch, "eval_id": len(self.rows)})
+
+    def __len__(self):
+        return len(self.rows)
+
+    def to_frame(self):
+        return pd.DataFrame(self.rows)
+
+    def to_csv(self, path):
+        self.to_frame().to_csv(path, index=False)
+
 
 class NeorlWrapper:
     """
@@ -8,20 +203,32 @@ class NeorlWrapper:
     - Decodes NEORL vectors back to dictionary inputs.
     - Handles Maximization vs Minimization (standardizes on Minimization).
     - Robust error handling.
+    - Population evaluation in one parallel call, optionally on a persistent CasePool.
     """
 
-    def __init__(self, ff, value_key, variable_inputs, fixed_inputs, mode='minimize'):
+    def __init__(self, ff, value_key, variable_inputs, fixed_inputs, mode='minimize', cache=None, pool=None,
+                 history=None, parallel=False, num_cpus=None):
         """
         :param ff: The model function to evaluate.
         :param value_key: The dictionary key of the result to optimize.
         :param variable_inputs: List of variable names in the order NEORL sees them.
         :param fixed_inputs: Dictionary of constant parameters.
         :param mode: 'maximize' (default) or 'minimize'.
+        :param cache: Optional EvalCache shared between wrappers and restarts.
+        :param pool: Optional CasePool built with the same model and fixed_inputs. Populations are
+            evaluated on it, sending only the variable inputs.
+        :param history: Optional EvalHistory that records every evaluation.
+        :param parallel, num_cpus: run_cases settings used for population evaluation without a pool.
         """
         self.ff = ff
         self.value_key = value_key
-        self.variable_inputs = variable_inputs
+        self.variable_inputs = list(variable_inputs)
         self.fixed_inputs = fixed_inputs
+        self.cache = cache
+        self.pool = pool
+        self.history = history
+        self.parallel = parallel
+        self.num_cpus = num_cpus
 
         if mode not in ['maximize', 'minimize']:
             raise ValueError("mode must be 'maximize' or 'minimize'")
@@ -44,19 +251,58 @@ class NeorlWrapper:
 
         return all_inputs
 
+    def evaluate_population(self, population):
+        """
+        Evaluates a list of NEORL individuals (shape (S, n_params)) in one parallel call and returns
+        the list of signed objective values. Failed cases score 1e12.
+        """
+        cases = [self.decode(x) for x in population]
+        if self.pool is not None:
+            variable = [name for name in self.variable_inputs if name not in self.fixed_inputs]
+            outputs = evaluate_cases_on_pool(self.pool, cases, variable, self.cache)
+        else:
+            outputs = evaluate_cases_cached(self.ff, pd.DataFrame(cases), cache=self.cache, parallel=self.parallel,
+                                            num_cpus=self.num_cpus)
+
+        values = []
+        for out in outputs:
+            val = out.get(self.value_key)
+            try:
+                val = float(val) * self.sign
+            except (TypeError, ValueError):
+                val = np.nan
+            values.append(1e12 if np.isnan(val) else val)
+
+        if self.history is not None:
+            self.history.record(cases, outputs, values)
+        return values
+
     def __call__(self, x):
+        if np.ndim(x) == 2:
+            return self.evaluate_population(x)
+        if self.pool is not None:
+            return self.evaluate_population([x])[0]
+
         inputs = self.decode(x)
         try:
-            output = self.ff(inputs)
-            val = output[self.value_key]
-            return val * self.sign
-
+            output = evaluate_case(self.ff, inputs, self.cache)
+            val = output[self.value_key] * self.sign
         except Exception:
-            return 1e12
+            output, val = {}, 1e12
+
+        if self.history is not None:
+            self.history.record([inputs], [output], [val])
+        return val
 
+    def __getstate__(self):
+        # A live pool cannot be sent to NEORL's ncores subprocesses; they evaluate locally instead.
+        state = self.__dict__.copy()
+        state["pool"] = None
+        return state
 
-def create_NEORL_funwrap(ff, value_key, variable_inputs, fixed_inputs, mode='maximize'):
-    return NeorlWrapper(ff, value_key, variable_inputs, fixed_inputs, mode)
+
+def create_NEORL_funwrap(ff, value_key, variable_inputs, fixed_inputs, mode='maximize', **kwargs):
+    return NeorlWrapper(ff, value_key, variable_inputs, fixed_inputs, mode, **kwargs)
 
 
 def NEORL_getbounds(input_stack):
@@ -95,20 +341,121 @@ def NEORL_getbounds(input_stack):
     return BOUNDS
 
 
+def run_es_batched(fit, bounds, lambda_=60, mu=30, cxpb=0.7, mutpb=0.2, ngen=200, alpha=0.1, smin=0.01,
+                   smax=0.5, seed=None, verbose=True):
+    """
+    (mu, lambda) evolution strategy with the operators of NEORL's ES (blend crossover, log-normal
+    self-adaptive mutation, comma selection), run generation by generation so that the lambda_
+    individuals of a generation are evaluated in one fit.evaluate_population call, e.g. on a CasePool.
+
+    :param fit: NeorlWrapper, or any object whose evaluate_population(list of vectors) returns the
+        values to minimize.
+    :param bounds: NEORL bounds dict, as from NEORL_getbounds ('float', 'int' and 'grid' variables).
+    :param lambda_, mu, cxpb, mutpb: Offspring and parent counts, crossover and mutation probabilities.
+    :param ngen: Number of generations after the initial population.
+    :param alpha: Extent of the blend crossover.
+    :param smin, smax: Bounds of the mutation strengths, as fractions of each variable's range.
+    :param seed: Random seed.
+    :return: (x_best, y_best, hist), hist with the best value of each generation ("local_fitness")
+        and the best so far ("global_fitness").
+    """
+    rng = np.random.default_rng(seed)
+    specs = list(bounds.values())
+    lb = np.array([0.0 if s[0] == 'grid' else float(s[1]) for s in specs])
+    ub = np.array([len(s[1]) - 1.0 if s[0] == 'grid' else float(s[2]) for s in specs])
+    span = np.where(ub > lb, ub - lb, 1.0)
+    d = len(specs)
+
+    def decode(X):
+        population = []
+        for x in X:
+            ind = []
+            for v, s in zip(x, specs):
+                if s[0] == 'grid':
+                    ind.append(s[1][int(np.rint(v))])
+                elif s[0] == 'int':
+                    ind.append(int(np.rint(v)))
+                else:
+                    ind.append(float(v))
+            population.append(ind)
+        return population
+
+    def evaluate(X):
+        return np.asarray(fit.evaluate_population(decode(X)), dtype=float)
+
+    X = lb + rng.random((lambda_, d)) * (ub - lb)
+    S = rng.uniform(smin, smax, (lambda_, d)) * span
+    F = evaluate(X)
+    best = int(np.argmin(F))
+    x_best, y_best = decode(X[best:best + 1])[0], F[best]
+    hist = {"local_fitness": [], "global_fitness": []}
+
+    tau, tau0 = 1 / np.sqrt(2 * d), 1 / np.sqrt(2 * np.sqrt(d))
+    for gen in range(1, ngen + 1):
+        parents = np.argsort(F, kind="stable")[:mu]
+        X, S = X[parents], S[parents]
+
+        # each offspring comes from crossover, mutation or reproduction of random parents
+        i, j = rng.integers(0, len(X), lambda_), rng.integers(0, len(X), lambda_)
+        X_child, S_child = X[i].copy(), S[i].copy()
+        op = rng.random(lambda_)
+        cx = op < cxpb
+        gamma = (1 + 2 * alpha) * rng.random((cx.sum(), d)) - alpha
+        X_child[cx] = (1 - gamma) * X[i[cx]] + gamma * X[j[cx]]
+        S_child[cx] = (1 - gamma) * S[i[cx]] + gamma * S[j[cx]]
+        mut = (op >= cxpb) & (op < cxpb + mutpb)
+        noise = rng.standard_normal((mut.sum(), d))
+        S_child[mut] *= np.exp(tau0 * rng.standard_normal((mut.sum(), 1)) + tau * noise)
+        X_child[mut] += S_child[mut] * rng.standard_normal((mut.sum(), d))
+
+        X = np.clip(X_child, lb, ub)
+        S = np.clip(np.abs(S_child), smin * span, smax * span)
+        F = evaluate(X)
+
+        best = int(np.argmin(F))
+        if F[best] < y_best:
+            x_best, y_best = decode(X[best:best + 1])[0], F[best]
+        hist["local_fitness"].append(F[best])
+        hist["global_fitness"].append(y_best)
+        if verbose:
+            print(f"ES generation {gen}: best {F[best]:.6g}, best so far {y_best:.6g}")
+
+    return x_best, y_best, hist
 
 
 class ScipyWrapper:
     """
     A wrapper class for Scipy optimization.
     Now includes a helper to decode raw results back to model inputs.
+
+    Also accepts a whole population of shape (n_params, S), as passed by
+    differential_evolution(..., vectorized=True), and evaluates it in one parallel round-trip.
+    Holds only picklable state, so it can be used with workers= when ff is a module-level function.
     """
 
-    def __init__(self, ff, value_key, variable_inputs, fixed_inputs, cat_map=None, mode='maximize'):
+    def __init__(self, ff, value_key, variable_inputs, fixed_inputs, cat_map=None, mode='maximize',
+                 parallel=False, num_cpus=None, batch_size=None, vectorized=False, cache=None):
+        """
+        :param ff: The model function to evaluate.
+        :param value_key: The dictionary key of the result to optimize.
+        :param variable_inputs: List of variable names in the order of the optimizer vector.
+        :param fixed_inputs: Dictionary of constant parameters.
+        :param cat_map: {index: [option1, option2, ...]} for discrete vars (see get_scipy_bounds).
+        :param mode: 'maximize' (default) or 'minimize'.
+        :param parallel, num_cpus, batch_size: run_cases settings used for population evaluation.
+        :param vectorized: ff accepts a dict of input arrays (see run_cases).
+        :param cache: Optional EvalCache shared between wrappers and restarts.
+        """
         self.ff = ff
         self.value_key = value_key
-        self.variable_inputs = variable_inputs
+        self.variable_inputs = list(variable_inputs)
         self.fixed_inputs = fixed_inputs
         self.cat_map = cat_map if cat_map is not None else {}
+        self.parallel = parallel
+        self.num_cpus = num_cpus
+        self.batch_size = batch_size
+        self.vectorized = vectorized
+        self.cache = cache
 
         if mode not in ['maximize', 'minimize']:
             raise ValueError("mode must be 'maximize' or 'minimize'")
@@ -136,20 +483,137 @@ class ScipyWrapper:
 
         return param_dict
 
+    def decode_population(self, X):
+        """
+        Decodes a population array of shape (n_params, S), one candidate per column, into a
+        DataFrame of S cases. Categorical coordinates are rounded and clipped column-wise.
+        """
+        X = np.asarray(X)
+        columns = {}
+        for i, name in enumerate(self.variable_inputs):
+            if i in self.cat_map:
+                options = np.asarray(self.cat_map[i], dtype=object)
+                idx = np.clip(np.rint(X[i]).astype(int), 0, len(options) - 1)
+                columns[name] = options[idx]
+            else:
+                columns[name] = X[i]
+
+        df = pd.DataFrame(columns)
+        for name, value in self.fixed_inputs.items():
+            df[name] = [value] * len(df)
+        return df
+
+    def evaluate_population(self, X):
+        """
+        Evaluates every column of X in one run_cases call (Ray or vectorized model) and returns
+        the signed objective values, shape (S,). Failed cases score 1e12.
+        """
+        cases = self.decode_population(X)
+        try:
+            outputs = evaluate_cases_cached(self.ff, cases, cache=self.cache, vectorized=self.vectorized,
+                                            parallel=self.parallel, num_cpus=self.num_cpus,
+                                            batch_size=self.batch_size)
+        except Exception:
+            return np.full(len(cases), 1e12)
+
+        vals = pd.to_numeric(pd.Series([out.get(self.value_key) for out in outputs], dtype=object),
+                             errors="coerce").to_numpy(dtype=float) * self.sign
+        return np.where(np.isnan(vals), 1e12, vals)
+
     def __call__(self, x):
+        # (n_params, S) populations come from differential_evolution(..., vectorized=True)
+        if np.ndim(x) == 2:
+            return self.evaluate_population(x)
+
         # Use the internal decode method to get parameters
         param_dict = self.decode(x)
 
         try:
-            output = self.ff(param_dict)
+            output = evaluate_case(self.ff, param_dict, self.cache)
             val = output[self.value_key]
             return val * self.sign
         except Exception:
             return 1e12
 
 
-def create_scipy_funwrap(ff, value_key, variable_inputs, fixed_inputs, cat_map=None, mode='maximize'):
-    return ScipyWrapper(ff, value_key, variable_inputs, fixed_inputs, cat_map, mode)
+class MultiObjectiveWrapper(ScipyWrapper):
+    """
+    Multi-objective counterpart of ScipyWrapper: evaluates several output keys at once.
+
+    Optimizer vectors use the get_scipy_bounds layout. Objectives are returned as a matrix in
+    minimization form (columns with sense "max" are negated), one row per candidate, so they can be
+    passed directly to nondominated_sort. Failed cases score 1e12 on every objective.
+    """
+
+    def __init__(self, ff, value_keys, variable_inputs, fixed_inputs, cat_map=None, sense=None,
+                 parallel=False, num_cpus=None, batch_size=None, vectorized=False, cache=None, pool=None):
+        """
+        :param ff: The model function to evaluate.
+        :param value_keys: List of output keys to optimize.
+        :param variable_inputs: List of variable names in the order of the optimizer vector.
+        :param fixed_inputs: Dictionary of constant parameters.
+        :param cat_map: {index: [option1, option2, ...]} for discrete vars (see get_scipy_bounds).
+        :param sense: "min"/"max" per objective, as a list or a {key: sense} dict. Default all "min".
+        :param parallel, num_cpus, batch_size: run_cases settings used for population evaluation.
+        :param vectorized: ff accepts a dict of input arrays (see run_cases).
+        :param cache: Optional EvalCache shared between wrappers and restarts.
+        :param pool: Optional CasePool built with the same model and fixed_inputs.
+        """
+        super().__init__(ff, None, variable_inputs, fixed_inputs, cat_map=cat_map, mode='minimize',
+                         parallel=parallel, num_cpus=num_cpus, batch_size=batch_size, vectorized=vectorized,
+                         cache=cache)
+        self.value_keys = list(value_keys)
+        if isinstance(sense, dict):
+            sense = [sense.get(k, "min") for k in self.value_keys]
+        elif sense is None or isinstance(sense, str):
+            sense = [sense or "min"] * len(self.value_keys)
+        for s in sense:
+            if s not in ["min", "max"]:
+                raise ValueError(f"sense must be 'min' or 'max', got {s}")
+        self.sense = list(sense)
+        self.signs = np.array([-1.0 if s == "max" else 1.0 for s in self.sense])
+        self.pool = pool
+
+    def evaluate_outputs(self, cases):
+        """Returns the list of output dicts for a DataFrame of cases ({} for failed cases)."""
+        if self.pool is None:
+            return evaluate_cases_cached(self.ff, cases, cache=self.cache, vectorized=self.vectorized,
+                                         parallel=self.parallel, num_cpus=self.num_cpus,
+                                         batch_size=self.batch_size)
+
+        return evaluate_cases_on_pool(self.pool, cases.to_dict("records"), self.variable_inputs, self.cache)
+
+    def objectives(self, outputs):
+        """Objective matrix (S, n_objectives) in minimization form from a list of output dicts."""
+        F = np.column_stack([
+            pd.to_numeric(pd.Series([out.get(k) for out in outputs], dtype=object), errors="coerce")
+            .to_numpy(dtype=float) for k in self.value_keys])
+        F = F * self.signs
+        return np.where(np.isnan(F), 1e12, F)
+
+    def evaluate_population(self, X, return_outputs=False):
+        """
+        Evaluates every column of X (shape (n_params, S)) in one parallel call and returns the
+        objective matrix (S, n_objectives). With return_outputs=True also returns the DataFrame of
+        cases and outputs in run_cases layout.
+        """
+        cases = self.decode_population(X)
+        outputs = self.evaluate_outputs(cases)
+        F = self.objectives(outputs)
+        if not return_outputs:
+            return F
+        out = pd.concat([cases, pd.DataFrame(outputs, index=cases.index)], axis=1)
+        out = out.loc[:, ~out.columns.duplicated(keep="last")]
+        return F, out
+
+    def __call__(self, x):
+        if np.ndim(x) == 2:
+            return self.evaluate_population(x)
+        return self.evaluate_population(np.asarray(x)[:, None])[0]
+
+
+def create_scipy_funwrap(ff, value_key, variable_inputs, fixed_inputs, cat_map=None, mode='maximize', **kwargs):
+    return ScipyWrapper(ff, value_key, variable_inputs, fixed_inputs, cat_map, mode, **kwargs)
 
 
 def get_scipy_bounds(input_stack):
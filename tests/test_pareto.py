@@ -0,0 +1,59 @@
+import numpy as np
+import pytest
+
+from casegenmc.pareto import nondominated_sort, pareto_mask
+
+
+def brute_force_mask(V):
+    """True for the rows of V (minimization, no NaN) that no other row dominates."""
+    le = np.all(V[:, None, :] <= V[None, :, :], axis=-1)
+    lt = np.any(V[:, None, :] < V[None, :, :], axis=-1)
+    return ~np.any(le & lt, axis=0)
+
+
+def brute_force_ranks(V):
+    ranks = np.full(len(V), -1)
+    remaining = np.arange(len(V))
+    rank = 0
+    while len(remaining):
+        on_front = brute_force_mask(V[remaining])
+        ranks[remaining[on_front]] = rank
+        remaining = remaining[~on_front]
+        rank += 1
+    return ranks
+
+
+@pytest.mark.parametrize("m", [1, 2, 3, 5])
+@pytest.mark.parametrize("seed", range(3))
+def test_pareto_mask_matches_brute_force(m, seed):
+    rng = np.random.default_rng(seed)
+    # rounded values give ties and exact duplicates
+    V = np.round(rng.random((400, m)), 1)
+    assert np.array_equal(pareto_mask(V), brute_force_mask(V))
+
+
+def test_pareto_mask_blocks_and_pivots():
+    rng = np.random.default_rng(0)
+    V = rng.random((3000, 3))
+    assert np.array_equal(pareto_mask(V, block_size=64, n_pivots=16), brute_force_mask(V))
+
+
+def test_pareto_mask_sense_and_nan():
+    rng = np.random.default_rng(1)
+    V = rng.random((200, 3))
+    V[::17, 1] = np.nan
+    sense = ["min", "max", "min"]
+    expected = np.zeros(len(V), dtype=bool)
+    valid = ~np.isnan(V).any(axis=1)
+    expected[valid] = brute_force_mask(V[valid] * [1, -1, 1])
+    assert np.array_equal(pareto_mask(V, sense), expected)
+
+
+@pytest.mark.parametrize("m", [2, 3])
+def test_nondominated_sort_matches_brute_force(m):
+    rng = np.random.default_rng(m)
+    V = np.round(rng.random((300, m)), 1)
+    assert np.array_equal(nondominated_sort(V), brute_force_ranks(V))
+    ranks = nondominated_sort(V, max_rank=1)
+    expected = brute_force_ranks(V)
+    assert np.array_equal(ranks, np.where(expected <= 1, expected, -1))
@@ -0,0 +1,48 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from casegenmc import open_result_arrays, run_cases
+
+
+@pytest.fixture
+def cases():
+    return pd.DataFrame({"x0": np.linspace(0, 2, 60), "m": ["a", "b", "c"] * 20})
+
+
+def model(case):
+    return {"y": case["x0"] * 2, "n": 3, "ok": case["x0"] > 1, "tag": case["m"] + "!"}
+
+
+def test_memmap_matches_in_memory(cases, tmp_path):
+    ref = run_cases(cases, model, verbose=False)["out"]
+    out = run_cases(cases, model, memmap_dir=str(tmp_path / "run"), batch_size=25, verbose=False)["out"]
+    pd.testing.assert_frame_equal(out, ref)
+    pd.testing.assert_frame_equal(open_result_arrays(str(tmp_path / "run")).to_frame(), ref)
+
+
+def test_memmap_resume_after_crash(cases, tmp_path):
+    calls = []
+
+    def crashing(case):
+        calls.append(1)
+        if len(calls) > 30:
+            raise RuntimeError("crash")
+        return model(case)
+
+    path = str(tmp_path / "run")
+    with pytest.raises(RuntimeError):
+        run_cases(cases, crashing, memmap_dir=path, batch_size=10, verbose=False)
+    arrays = open_result_arrays(path)
+    n_done = int(arrays.done.sum())
+    assert 0 < n_done < len(cases)
+    assert np.isnan(arrays["y"][~np.asarray(arrays.done)]).all()
+
+    def counting(case):
+        calls.append(1)
+        return model(case)
+
+    calls.clear()
+    resumed = run_cases(cases, counting, memmap_dir=path, batch_size=10, verbose=False)["out"]
+    assert len(calls) == len(cases) - n_done
+    pd.testing.assert_frame_equal(resumed, run_cases(cases, model, verbose=False)["out"])
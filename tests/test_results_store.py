@@ -0,0 +1,41 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from casegenmc.results_store import ResultsStore
+
+
+@pytest.fixture
+def store():
+    with ResultsStore(":memory:") as s:
+        yield s
+
+
+def test_lookup_round_trip(store):
+    df = pd.DataFrame({"x0": [1.0, 2.0, 3.0], "m": ["a", "b", "a"], "y": [10.0, 20.0, 30.0], "tag": ["p", "q", "r"]})
+    store.append(df, "c1", ["x0", "m"])
+
+    # 1 and 1.0 are the same point; column order does not matter
+    inputs = pd.DataFrame({"m": ["a", "a", "b"], "x0": [3, 5, 2]}, index=[7, 8, 9])
+    found, stored = store.lookup(inputs)
+    assert found.tolist() == [True, False, True]
+    assert stored["y"].tolist()[0] == 30.0 and np.isnan(stored["y"].tolist()[1])
+    assert stored["tag"].tolist()[2] == "q"
+
+
+def test_lookup_campaign_and_latest(store):
+    inputs = pd.DataFrame({"x0": [1.0, 2.0]})
+    store.append(inputs.assign(y=[1.0, 2.0]), "c1", ["x0"])
+    store.append(inputs.iloc[:1].assign(y=[5.0]), "c2", ["x0"])
+
+    found, stored = store.lookup(inputs, campaign="c2")
+    assert found.tolist() == [True, False]
+    found, stored = store.lookup(inputs)
+    assert found.all() and stored["y"].tolist() == [5.0, 2.0]
+    assert set(store.campaigns()["name"]) == {"c1", "c2"}
+
+
+def test_append_rejects_case_clashes(store):
+    store.append(pd.DataFrame({"x0": [1.0], "y": [1.0]}), "c1", ["x0"])
+    with pytest.raises(ValueError):
+        store.append(pd.DataFrame({"X0": [1.0], "y": [1.0]}), "c1", ["X0"])